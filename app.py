@@ -1,76 +1,92 @@
 import streamlit as st
+from dashboard.cached_data import load_cashflow, load_income_report, load_ledger
+from dashboard.debug_panel import debug_panel_enabled, get_rerun_profiler, render_profile_panel, render_trace_panel
 from dashboard.detail_financialinvestment import detail_investmentplan
 from dashboard.financial_report import generate_financial_dashboard
 from dashboard.savingandinvest import savings_and_investing_tab
-from dashboard.taxandcomp import tax_optimization_tab
+from dashboard.taxandcomp import get_answer_cache, tax_optimization_tab
+from utils.anomaly_detector import get_anomaly_detector
+from utils.budgets import get_budget_tracker
+from utils.category_classifier import get_category_classifier
 from utils.income_manager import IncomeManager
+from utils.job_queue import get_job_queue
+from utils.receipts import PREDEFINED_CATEGORIES, map_category_to_predefined, parse_receipt_date
 from utils.snowflake_conn import init_db
+from utils.search_index import get_search_index
 from utils.snowflake_helpers import TransactionManager
+from utils.subscriptions import get_subscription_detector
 from utils.together_client import TogetherClient
+from utils.tracing import start_metrics_server
 import os
 from datetime import datetime
 import pandas as pd
-import numpy as np
-
-def map_category_to_predefined(category, predefined_categories):
-    """
-    Maps any category to the most relevant predefined category.
-    Uses keyword matching to find the best fit.
-    """
-    if not category:
-        return "Other"
-    
-    category_lower = category.lower()
-    
-    # Define mapping rules for common categories
-    category_mappings = {
-        # Meals & Food
-        "food": "Meals", "restaurant": "Meals", "dining": "Meals", "cafe": "Meals", 
-        "coffee": "Meals", "lunch": "Meals", "dinner": "Meals", "breakfast": "Meals",
-        "groceries": "Meals", "meal": "Meals", "catering": "Meals",
-        
-        # Travel
-        "travel": "Travel", "transport": "Travel", "uber": "Travel", "lyft": "Travel",
-        "taxi": "Travel", "flight": "Travel", "hotel": "Travel", "airbnb": "Travel",
-        "gas": "Travel", "fuel": "Travel", "parking": "Travel", "rental": "Travel",
-        "car": "Travel", "bus": "Travel", "train": "Travel", "subway": "Travel",
-        
-        # Office & Business
-        "office": "Office", "business": "Office", "work": "Office", "professional": "Office",
-        "meeting": "Office", "conference": "Office", "workspace": "Office", "coworking": "Office",
-        "equipment": "Office", "supplies": "Office", "stationery": "Office",
-        
-        # Software & Technology
-        "software": "Software", "cloud": "Software", "saas": "Software", "subscription": "Software",
-        "app": "Software", "platform": "Software", "service": "Software", "digital": "Software",
-        "online": "Software", "web": "Software", "internet": "Software", "hosting": "Software",
-        "domain": "Software", "website": "Software", "api": "Software", "tool": "Software",
-        "development": "Software", "programming": "Software", "tech": "Software",
-        
-        # Rent & Real Estate
-        "rent": "Rent", "lease": "Rent", "property": "Rent", "real estate": "Rent",
-        "apartment": "Rent", "house": "Rent", "accommodation": "Rent", "lodging": "Rent",
-        
-        # Utilities
-        "utility": "Utilities", "electricity": "Utilities", "water": "Utilities", 
-        "gas": "Utilities", "internet": "Utilities", "phone": "Utilities", 
-        "telephone": "Utilities", "mobile": "Utilities", "cable": "Utilities",
-        "tv": "Utilities", "television": "Utilities", "wifi": "Utilities",
-        "broadband": "Utilities", "energy": "Utilities", "power": "Utilities"
-    }
-    
-    # Check for exact matches first
-    for keyword, mapped_category in category_mappings.items():
-        if keyword in category_lower:
-            return mapped_category
-    
-    # Check if the category is already in predefined list
-    if category in predefined_categories:
-        return category
-    
-    # If no match found, return "Other"
-    return "Other"
 
+def _render_job_progress(job_id):
+    """Show progress for a queued bulk job and load its results when it finishes"""
+    queue = get_job_queue()
+    status = queue.status(job_id)
+    if status is None:
+        st.warning("Batch job not found; it may have been cleared.")
+        # The polling fragment can tick again before the rerun, so never assume the key is still set
+        st.session_state.pop("bulk_job_id", None)
+        st.query_params.pop("job", None)
+        st.rerun()
+
+    processed = status['completed'] + status['failed']
+    st.progress(processed / max(status['total'], 1),
+                text=f"Batch job: {processed}/{status['total']} documents processed")
+    if not status['finished']:
+        return
+
+    for failure in queue.failures(job_id):
+        st.warning(f"⚠️ {failure['name']}: {failure['error']}")
+    st.session_state.bulk_results = queue.results(job_id)
+    st.session_state.bulk_processing = True
+    st.session_state.pop("bulk_job_id", None)
+    st.query_params.pop("job", None)
+    st.rerun()
+
+
+# Poll without blocking the rest of the page where fragments are available
+if hasattr(st, "fragment"):
+    render_bulk_job_status = st.fragment(run_every=2)(_render_job_progress)
+else:
+    def render_bulk_job_status(job_id):
+        _render_job_progress(job_id)
+        st.button("🔄 Refresh batch status", key="refresh_bulk_job")
+
+
+TABS = {
+    "upload": "📄 Smart Document Scanner | Expenses",
+    "income": "💰 Revenue Tracker | Income",
+    "transactions": "📊 Transaction History",
+    "dashboard": "📈 Financial Analytics",
+    "tax": "🧾 Tax Optimizer",
+    "savings": "🎯 Wealth Builder",
+    "investment": "📈 Market Intelligence"
+}
+
+
+def select_tab() -> str:
+    """Tab navigation; the choice is kept in ?tab= so a refresh returns to it"""
+    if st.session_state.get("active_tab") not in TABS:
+        requested = st.query_params.get("tab")
+        # A queued batch job (?job=) is tracked on the upload tab
+        if requested not in TABS or st.query_params.get("job"):
+            requested = "upload"
+        st.session_state.active_tab = requested
+
+    if hasattr(st, "segmented_control"):
+        choice = st.segmented_control("Navigation", list(TABS), format_func=TABS.get,
+                                      key="active_tab", label_visibility="collapsed")
+    else:
+        choice = st.radio("Navigation", list(TABS), format_func=TABS.get,
+                          key="active_tab", horizontal=True, label_visibility="collapsed")
+    # Clicking the selected segment clears it; stay on the current tab
+    if choice not in TABS:
+        choice = st.query_params.get("tab") if st.query_params.get("tab") in TABS else "upload"
+    st.query_params["tab"] = choice
+    return choice
 
 
 st.set_page_config(layout="wide", page_title="FinAI", page_icon="🧾")
@@ -164,6 +180,16 @@ transaction_manager = TransactionManager()
 def initialize_database():
     try:
         init_db()
+        # Budget alerts come from the insert listener, so register it before any write
+        get_budget_tracker()
+        # Expense anomalies are scored by the same listener, so the detector must exist before any write
+        get_anomaly_detector()
+        # Subscriptions are folded in by the same listener; reconciles rows written elsewhere
+        get_subscription_detector()
+        # Loads (or first trains) the category model and starts learning from corrections
+        get_category_classifier()
+        # Starts answering the common tax questions in the background, before any tab is opened
+        get_answer_cache()
         return True
     except Exception as e:
         st.error(f"Failed to initialize database: {e}")
@@ -171,6 +197,12 @@ def initialize_database():
 
 if not initialize_database():
     st.stop()
+
+# Prometheus /metrics endpoint when FINAI_METRICS_PORT is set (started once per process)
+start_metrics_server()
+
+# Opt-in per-tab profiling: ?profile=1 (timings), ?profile=cprofile or ?profile=pyinstrument (dumps)
+rerun_profiler = get_rerun_profiler()
     
 
 
@@ -183,18 +215,10 @@ if 'receipt_data' not in st.session_state:
     st.session_state.receipt_data = None
 st.markdown('<div class="main-header"><h1>🚀 FinAI - Your AI-Powered Financial Companion</h1></div>', unsafe_allow_html=True)
 
-# Tab interface with updated names and styling
-tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
-    "📄 Smart Document Scanner | Expenses", 
-    "💰 Revenue Tracker | Income",
-    "📊 Transaction History", 
-    "📈 Financial Analytics", 
-    "🧾 Tax Optimizer", 
-    "🎯 Wealth Builder", 
-    "📈 Market Intelligence"
-])
-
-with tab1:
+# Only the selected tab is rendered, so hidden tabs run no queries on a rerun
+active_tab = select_tab()
+
+def render_upload_tab():
     # Create two columns for layout
     col1, col2 = st.columns([1, 1])
     
@@ -273,27 +297,31 @@ with tab1:
         
         if st.button("Process Batch Documents", type="primary", key="process_bulk"):
             if bulk_files:
-                with st.spinner(f"🧠 Analyzing {len(bulk_files)} documents..."):
-                    try:
-                        # Process files in bulk
-                        files_to_process = []
-                        for uploaded_file in bulk_files:
-                            file_bytes = uploaded_file.read()
-                            file_ext = os.path.splitext(uploaded_file.name)[1].lower()[1:]
-                            files_to_process.append((file_bytes, file_ext))
-                            
-                        results = together_client.process_bulk_receipts(files=files_to_process)
-                        
-                        # Store in session state
-                        st.session_state.bulk_results = results
-                        st.session_state.bulk_processing = True
-                        st.rerun()
+                try:
+                    # Queue files in the background job system so the run survives reruns/refreshes
+                    files_to_process = []
+                    for uploaded_file in bulk_files:
+                        file_bytes = uploaded_file.read()
+                        file_ext = os.path.splitext(uploaded_file.name)[1].lower()[1:]
+                        files_to_process.append((uploaded_file.name, file_bytes, file_ext))
                         
-                    except Exception as e:
-                        st.error(f"❌ Bulk processing failed: {str(e)}")
+                    job_id = get_job_queue().submit(files_to_process)
+                    st.session_state.bulk_job_id = job_id
+                    st.query_params["job"] = job_id
+                    st.rerun()
+                    
+                except Exception as e:
+                    st.error(f"❌ Bulk processing failed: {str(e)}")
             else:
                 st.warning("Please upload at least one file")
 
+        # Resume a queued job, including after a browser refresh (job id is in the URL)
+        if 'bulk_job_id' not in st.session_state and st.query_params.get("job"):
+            st.session_state.bulk_job_id = st.query_params["job"]
+
+        if st.session_state.get('bulk_job_id'):
+            render_bulk_job_status(st.session_state.bulk_job_id)
+
     # Display results based on processing mode
     if st.session_state.get('bulk_processing', False) and 'bulk_results' in st.session_state:
         st.subheader("📊 Batch Processing Results")
@@ -325,9 +353,15 @@ with tab1:
             if st.button("Save All to Database", key="save_all_bulk"):
                 with st.spinner(f"Saving {len(st.session_state.bulk_results)} transactions..."):
                     try:
-                        transaction_ids = transaction_manager.log_bulk_receipts(st.session_state.bulk_results)
+                        results = transaction_manager.log_bulk_receipts(st.session_state.bulk_results)
+                        transaction_ids = [i for i in results if i is not None]
 
                         st.success(f"✅ Successfully saved {len(transaction_ids)} transactions!")
+                        if len(transaction_ids) < len(results):
+                            st.warning(f"{len(results) - len(transaction_ids)} receipts could not be saved")
+                        for alert in get_budget_tracker().alerts(transaction_ids).itertuples():
+                            st.toast(f"⚠️ {alert.category} {alert.period}ly budget {alert.threshold:.0%} used "
+                                     f"(${alert.spent:,.2f} of ${alert.amount_limit:,.2f})")
                         del st.session_state.bulk_results
                         del st.session_state.bulk_processing
                         st.rerun()
@@ -350,7 +384,7 @@ with tab1:
                                     key=f"merchant_{i}"
                                 )
                                 # Map category to predefined list to avoid ValueError
-                                predefined_categories = ["Meals", "Travel", "Office", "Software", "Rent", "Utilities", "Other"]
+                                predefined_categories = PREDEFINED_CATEGORIES
                                 original_category = result['category']['value']
                                 mapped_category = map_category_to_predefined(original_category, predefined_categories)
                                 
@@ -365,23 +399,7 @@ with tab1:
                                     key=f"category_{i}"
                                 )
                                 # Handle different date formats safely for bulk processing
-                                date_value = result['date']['value']
-                                try:
-                                    if date_value:
-                                        # Try multiple date formats
-                                        for fmt in ['%Y-%m-%d', '%d-%b-%Y', '%d/%m/%Y', '%m/%d/%Y', '%Y/%m/%d']:
-                                            try:
-                                                parsed_date = datetime.strptime(date_value, fmt).date()
-                                                break
-                                            except ValueError:
-                                                continue
-                                        else:
-                                            # If no format matches, use current date
-                                            parsed_date = datetime.now().date()
-                                    else:
-                                        parsed_date = datetime.now().date()
-                                except:
-                                    parsed_date = datetime.now().date()
+                                parsed_date = parse_receipt_date(result['date']['value'])
                                 
                                 date = st.date_input(
                                     "Date",
@@ -506,7 +524,7 @@ with tab1:
                 )
 
                 # Map category to predefined list to avoid ValueError
-                predefined_categories = ["Meals", "Travel", "Office", "Software", "Rent", "Utilities", "Other"]
+                predefined_categories = PREDEFINED_CATEGORIES
                 original_category = str(category_value) if category_value else "Other"
                 mapped_category = map_category_to_predefined(original_category, predefined_categories)
                 
@@ -521,23 +539,7 @@ with tab1:
                 )
 
                 # Handle different date formats safely
-                date_value = str(date_value) if date_value else None
-                try:
-                    if date_value:
-                        # Try multiple date formats
-                        for fmt in ['%Y-%m-%d', '%d-%b-%Y', '%d/%m/%Y', '%m/%d/%Y', '%Y/%m/%d']:
-                            try:
-                                parsed_date = datetime.strptime(date_value, fmt).date()
-                                break
-                            except ValueError:
-                                continue
-                        else:
-                            # If no format matches, use current date
-                            parsed_date = datetime.now().date()
-                    else:
-                        parsed_date = datetime.now().date()
-                except:
-                    parsed_date = datetime.now().date()
+                parsed_date = parse_receipt_date(date_value)
                 
                 date = st.date_input(
                     "Date",
@@ -569,12 +571,15 @@ with tab1:
             st.markdown('</div>', unsafe_allow_html=True)
         else:
             st.success(f"✅ Transaction {st.session_state.last_transaction_id} saved successfully!")
+            for alert in get_budget_tracker().alerts([st.session_state.last_transaction_id]).itertuples():
+                st.warning(f"⚠️ {alert.category} {alert.period}ly budget {alert.threshold:.0%} used "
+                           f"(${alert.spent:,.2f} of ${alert.amount_limit:,.2f})")
             if st.button("➕ New Transaction"):
                 del st.session_state.receipt_data
                 st.session_state.form_submitted = False
                 del st.session_state.last_transaction_id
                 st.rerun()
-with tab2:
+def render_income_tab():
     st.header("💰 Revenue Tracker")
     
     # Income entry form
@@ -599,6 +604,11 @@ with tab2:
                 "Tags",
                 options=["Recurring", "Bonus", "Taxable", "Non-Taxable"]
             )
+            recurrence = st.selectbox(
+                "Recurrence",
+                options=["one-time", "weekly", "monthly", "annual"],
+                format_func=str.capitalize
+            )
         
         description = st.text_area("Description/Notes")
         
@@ -612,7 +622,8 @@ with tab2:
                     "payment_method": payment_method,
                     "category": category,
                     "tags": tags,
-                    "description": description
+                    "description": description,
+                    "recurrence": recurrence
                 }
                 transaction_id = IncomeManager.log_income(income_data)
                 st.success(f"Income recorded successfully! Transaction ID: {transaction_id}")
@@ -622,7 +633,7 @@ with tab2:
     # Revenue history and reports
     st.subheader("Revenue History")
     
-    income_report = IncomeManager.get_income_report()
+    income_report = load_income_report()
     if income_report:
         col1, col2 = st.columns(2)
         with col1:
@@ -631,22 +642,76 @@ with tab2:
         
         with col2:
             st.write("**Top Revenue Sources**")
-            for source, amount in income_report['top_sources'].items():
-                st.write(f"- {source}: ${amount:,.2f}")
+            for row in income_report['by_source'].head(5).itertuples():
+                st.write(f"- {row.source}: ${row.amount:,.2f}")
         
         st.subheader("Monthly Revenue Trend")
-        monthly_df = pd.DataFrame.from_dict(
-            income_report['income_by_month'],
-            orient='index',
-            columns=['Amount']
-        )
+        monthly_df = income_report['by_time'].set_index('date').rename(columns={'amount': 'Amount'})
         st.line_chart(monthly_df)
     else:
         st.info("No income records found")
+
+    st.subheader("Cash-Flow Calendar")
+    starting_balance = st.number_input("Current Balance", value=0.0, step=100.0, format="%.2f",
+                                       key="cashflow_balance")
+    try:
+        cashflow = load_cashflow(starting_balance)
+        calendar = cashflow['calendar']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Expected Income (12 mo)", f"${calendar['income'].sum():,.2f}")
+        col2.metric("Expected Spending (12 mo)", f"${calendar['expenses'].sum():,.2f}")
+        col3.metric("Lowest Balance", f"${cashflow['lowest_balance']:,.2f}",
+                    help=f"Projected for {cashflow['lowest_date']:%b %d, %Y}")
+        st.line_chart(calendar.set_index('date')[['balance']].rename(columns={'balance': 'Projected Balance'}))
+
+        upcoming = cashflow['occurrences'].head(20)
+        if not upcoming.empty:
+            st.write("**Upcoming Recurring Income**")
+            st.dataframe(
+                upcoming[['date', 'source', 'recurrence', 'amount']],
+                column_config={
+                    "date": st.column_config.DateColumn("Expected Date"),
+                    "source": "Source",
+                    "recurrence": "Recurrence",
+                    "amount": st.column_config.NumberColumn("Amount", format="$%.2f")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+    except Exception as e:
+        st.error(f"Error projecting cash flow: {str(e)}")
         
-with tab3:
+def render_transactions_tab():
     st.header("📊 Transaction History")
     
+    search_query = st.text_input(
+        "🔍 Search transactions",
+        placeholder="Merchant, description or item (prefixes and small typos match)",
+        key="transaction_search"
+    )
+    if search_query.strip():
+        try:
+            with st.spinner("Searching..."):
+                results = get_search_index().search(search_query, limit=200)
+            if results.empty:
+                st.info("No transactions match your search")
+            else:
+                st.caption(f"{len(results)} best matches")
+                st.dataframe(
+                    results[['date', 'merchant', 'amount', 'snippet']],
+                    column_config={
+                        "date": st.column_config.DateColumn("Transaction Date"),
+                        "merchant": "Merchant",
+                        "amount": st.column_config.NumberColumn("Amount", format="$%.2f"),
+                        "snippet": "Match"
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+        except Exception as e:
+            st.error(f"Search failed: {str(e)}")
+        return
+
     view_type = st.radio(
         "Transaction Type:",
         options=["All Transactions", "Expenses Only", "Revenue Only"],
@@ -655,51 +720,11 @@ with tab3:
     )
     
     try:
-        # Initialize empty DataFrames
-        expenses_df = pd.DataFrame()
-        income_df = pd.DataFrame()
-        combined_df = pd.DataFrame()
-
-        # Get expenses data with duplicate column handling
-        try:
-            expenses_data = transaction_manager.get_recent_transactions(200)
-            if isinstance(expenses_data, pd.DataFrame) and not expenses_data.empty:
-                expenses_df = pd.DataFrame(expenses_data)
-                # Clean column names
-                expenses_df.columns = [str(col).lower() for col in expenses_df.columns]
-                expenses_df = expenses_df.loc[:, ~expenses_df.columns.duplicated()]
-                
-                # Prepare expense-specific columns
-                if not expenses_df.empty:
-                    expenses_df['type'] = 'expense'
-                    if 'amount' in expenses_df.columns:
-                        expenses_df['amount_display'] = np.abs(expenses_df['amount'])
-                    if 'date' in expenses_df.columns:
-                        expenses_df['date'] = pd.to_datetime(expenses_df['date'])
-        except Exception as e:
-            st.error(f"Error loading expenses: {str(e)}")
-
-        # Get income data with duplicate column handling
-        try:
-            income_df = IncomeManager.get_income_for_transactions_view(200)
-        except Exception as e:
-            st.error(f"Error loading income: {str(e)}")
-            income_df = pd.DataFrame()
-
-        # Combine data based on view type
-        dfs_to_combine = []
-        if view_type in ["All Transactions", "Expenses Only"] and not expenses_df.empty:
-            dfs_to_combine.append(expenses_df)
-        if view_type in ["All Transactions", "Revenue Only"] and not income_df.empty:
-            dfs_to_combine.append(income_df)
-
-        if dfs_to_combine:
-            try:
-                combined_df = pd.concat(dfs_to_combine, ignore_index=True)
-                if not combined_df.empty and 'date' in combined_df.columns:
-                    combined_df = combined_df.sort_values('date', ascending=False)
-            except Exception as e:
-                st.error(f"Error combining data: {str(e)}")
+        # One ledger query covers both kinds; amounts are signed, so display their size
+        entry_types = {"Expenses Only": ("expense",), "Revenue Only": ("income",)}.get(view_type)
+        combined_df = load_ledger(400, types=entry_types)
+        if not combined_df.empty:
+            combined_df['amount_display'] = combined_df['amount'].abs()
 
         if not combined_df.empty:
             # Display the transactions table
@@ -707,7 +732,7 @@ with tab3:
             display_columns = [col for col in display_columns if col in combined_df.columns]
             
             st.dataframe(
-                combined_df[display_columns].style.applymap(
+                combined_df[display_columns].style.map(
                     lambda x: 'color: green' if x == 'income' else 'color: red', 
                     subset=['type']
                 ),
@@ -734,7 +759,7 @@ with tab3:
             
     except Exception as e:
         st.error(f"Failed to load transactions: {str(e)}")
-with tab4:
+def render_dashboard_tab():
     st.header("📈 Financial Analytics")   
         # Time period selector
     time_period = st.selectbox(
@@ -743,10 +768,29 @@ with tab4:
             index=1
         )
     generate_financial_dashboard(time_period)
-with tab5:
+def render_tax_tab():
     tax_optimization_tab()
 
-with tab6:
+def render_savings_tab():
     savings_and_investing_tab()
-with tab7:
-    detail_investmentplan()
\ No newline at end of file
+def render_investment_tab():
+    detail_investmentplan()
+
+TAB_RENDERERS = {
+    "upload": render_upload_tab,
+    "income": render_income_tab,
+    "transactions": render_transactions_tab,
+    "dashboard": render_dashboard_tab,
+    "tax": render_tax_tab,
+    "savings": render_savings_tab,
+    "investment": render_investment_tab
+}
+with rerun_profiler.section(active_tab):
+    TAB_RENDERERS[active_tab]()
+
+# Rendered last so they include the spans and timings of this rerun
+rerun_profiler.finish()
+if debug_panel_enabled():
+    render_trace_panel()
+if rerun_profiler.enabled:
+    render_profile_panel(rerun_profiler)
@@ -0,0 +1,93 @@
+"""
+Memory benchmark for the typed transaction/income frame schema.
+
+Usage:
+    python -m benchmarks.bench_frame_memory [--rows 1000000]
+
+Builds frames the way the loaders did before (object strings, float64
+confidences) and through utils.frame_schema, and prints deep memory use.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.frame_schema import INCOME_SCHEMA, STRING_DTYPE, TRANSACTION_SCHEMA, apply_schema, memory_usage_mb
+
+CATEGORIES = ["Meals", "Travel", "Office", "Software", "Rent", "Utilities", "Other"]
+INCOME_CATEGORIES = ["Salary", "Freelance", "Investment", "Gift", "Other"]
+PAYMENT_METHODS = ["Direct Deposit", "Check", "Cash", "Bank Transfer", "Other"]
+RECURRENCES = ["one-time", "weekly", "monthly", "annual"]
+
+
+def raw_transactions(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Object-typed frame shaped like the cursor rows from Snowflake"""
+    rng = np.random.default_rng(seed)
+    merchants = np.array([f"Merchant {i}" for i in range(2000)], dtype=object)
+    return pd.DataFrame({
+        "id": [f"{i:08x}-0000-4000-8000-{i:012x}" for i in range(rows)],
+        "date": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 2000, rows), unit="D"),
+        "merchant": merchants[rng.integers(0, len(merchants), rows)],
+        "merchant_confidence": rng.random(rows),
+        "description": np.array([f"Receipt line {i % 5000}" for i in range(rows)], dtype=object),
+        "amount": rng.gamma(2.0, 40.0, rows),
+        "amount_confidence": rng.random(rows),
+        "category": np.array(CATEGORIES, dtype=object)[rng.integers(0, len(CATEGORIES), rows)],
+        "category_confidence": rng.random(rows),
+        "date_confidence": rng.random(rows),
+        "is_reconciled": rng.random(rows) < 0.3,
+    })
+
+
+def raw_income(rows: int, seed: int = 1) -> pd.DataFrame:
+    """Object-typed frame shaped like IncomeManager.get_income rows"""
+    rng = np.random.default_rng(seed)
+    sources = np.array([f"Client {i}" for i in range(300)], dtype=object)
+    return pd.DataFrame({
+        "ID": [f"{i:08x}-1111-4000-8000-{i:012x}" for i in range(rows)],
+        "DATE": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 2000, rows), unit="D"),
+        "SOURCE": sources[rng.integers(0, len(sources), rows)],
+        "AMOUNT": rng.gamma(3.0, 500.0, rows),
+        "CATEGORY": np.array(INCOME_CATEGORIES, dtype=object)[rng.integers(0, len(INCOME_CATEGORIES), rows)],
+        "PAYMENT_METHOD": np.array(PAYMENT_METHODS, dtype=object)[rng.integers(0, len(PAYMENT_METHODS), rows)],
+        "DESCRIPTION": np.array([f"Invoice {i % 3000}" for i in range(rows)], dtype=object),
+        "IS_TAXABLE": rng.random(rows) < 0.9,
+        "RECURRENCE": np.array(RECURRENCES, dtype=object)[rng.integers(0, len(RECURRENCES), rows)],
+    })
+
+
+def compare(name: str, raw: pd.DataFrame, schema: dict, group_col: str) -> None:
+    before = memory_usage_mb(raw)
+    start = time.perf_counter()
+    typed = apply_schema(raw, schema)
+    cast_ms = (time.perf_counter() - start) * 1000
+    after = memory_usage_mb(typed)
+
+    timings = {}
+    for label, frame in (("object", raw), ("typed", typed)):
+        start = time.perf_counter()
+        frame.groupby(group_col, observed=True)[frame.columns[3]].sum()
+        timings[label] = (time.perf_counter() - start) * 1000
+
+    print(f"{name}: {len(raw):,} rows")
+    print(f"  object frame : {before:8.1f} MB")
+    print(f"  typed frame  : {after:8.1f} MB  ({(1 - after / before) * 100:.0f}% smaller, cast {cast_ms:.0f} ms)")
+    print(f"  groupby({group_col}) object {timings['object']:.0f} ms -> typed {timings['typed']:.0f} ms")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    if STRING_DTYPE is object:
+        print("pyarrow not installed: free-text columns stay as Python objects")
+    compare("transactions", raw_transactions(args.rows), TRANSACTION_SCHEMA, "merchant")
+    compare("income", raw_income(args.rows), INCOME_SCHEMA, "SOURCE")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Benchmark for utils.monte_carlo.simulate_savings.
+
+Usage:
+    python -m benchmarks.bench_monte_carlo [--paths 10000 100000] [--years 30]
+
+Exits non-zero when the default 10k-path, 30-year run is slower than the
+200 ms interactive budget.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+from utils.monte_carlo import simulate_savings
+
+TARGET_MS = 200.0
+TARGET_PATHS = 10000
+
+
+def time_simulation(n_paths: int, months: int, repeats: int = 5) -> dict:
+    """Best-of-N wall time and peak traced memory for one configuration"""
+    simulate_savings(100000, 0, 500, months, "Moderate", n_paths, seed=7)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        simulate_savings(100000, 0, 500, months, "Moderate", n_paths, seed=7)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    simulate_savings(100000, 0, 500, months, "Moderate", n_paths, seed=7)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"paths": n_paths, "months": months, "best_ms": min(timings),
+            "median_ms": sorted(timings)[len(timings) // 2], "peak_mb": peak / 1e6}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", type=int, nargs="+", default=[TARGET_PATHS, 100000])
+    parser.add_argument("--years", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for n_paths in args.paths:
+        result = time_simulation(n_paths, args.years * 12, args.repeats)
+        print(f"{result['paths']:>7} paths x {result['months']} months: "
+              f"best {result['best_ms']:.1f} ms, median {result['median_ms']:.1f} ms, "
+              f"peak {result['peak_mb']:.1f} MB")
+        if n_paths == TARGET_PATHS and args.years == 30 and result["best_ms"] > TARGET_MS:
+            print(f"  FAIL: exceeds {TARGET_MS:.0f} ms budget")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
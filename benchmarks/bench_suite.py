@@ -0,0 +1,182 @@
+"""
+End-to-end benchmark suite on synthetic data.
+
+Usage:
+    python -m benchmarks.bench_suite [--rows 10000 100000 1000000] [--repeats 3]
+                                     [--output results.json] [--baseline old.json]
+
+For every size a fresh SQLite database (FINAI_STORAGE_BACKEND=sqlite) is
+seeded with synthetic transactions and income, then the report builders
+are timed against it. The projection engines and the receipt extraction
+pipeline (TogetherClient over the local mock LLM server) are timed once.
+Results are written as JSON; pass an earlier file as --baseline to print
+the change per benchmark.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic_data
+
+DEFAULT_ROWS = [10000, 100000, 1000000]
+
+
+def time_call(fn: Callable, repeats: int) -> Dict:
+    """Cold first call plus best/median of `repeats` further calls, in seconds"""
+    start = time.perf_counter()
+    fn()
+    cold = time.perf_counter() - start
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {"cold_s": cold, "best_s": min(timings), "median_s": float(np.median(timings)), "runs": repeats}
+
+
+def storage_benchmarks(rows: int, repeats: int, workdir: str) -> List[Dict]:
+    """Seed a fresh local database with `rows` transactions and time the report builders"""
+    os.environ["FINAI_STORAGE_BACKEND"] = "sqlite"
+    os.environ["FINAI_SQLITE_PATH"] = os.path.join(workdir, f"bench_{rows}.sqlite3")
+
+    from utils.income_manager import IncomeManager
+    from utils.ledger import get_ledger
+    from utils.snowflake_conn import get_transactions_as_dataframe
+    from utils.snowflake_helpers import TransactionManager
+    from utils.tax_engine import _report_cache, tax_report
+
+    start = time.perf_counter()
+    loaded = synthetic_data.seed_database(rows)
+    elapsed = time.perf_counter() - start
+    results = [{"name": "seed_database", "rows": rows, "cold_s": elapsed, "best_s": elapsed,
+                "median_s": elapsed, "runs": 1, "loaded": loaded}]
+
+    cases = {
+        "get_transactions_as_dataframe": lambda: get_transactions_as_dataframe(10000),
+        "get_ledger": lambda: get_ledger(2000),
+        "get_combined_financial_report": lambda: TransactionManager.get_combined_financial_report("year"),
+        "get_income_report": lambda: IncomeManager.get_income_report("year"),
+        "get_spending_analytics": lambda: TransactionManager.get_spending_analytics("month"),
+        # Cleared each run, otherwise every repeat after the first is a generation-cache hit
+        "tax_report": lambda: (_report_cache.clear(), tax_report())[1],
+    }
+    for name, fn in cases.items():
+        results.append({"name": name, "rows": rows, **time_call(fn, repeats)})
+    return results
+
+
+def engine_benchmarks(repeats: int) -> List[Dict]:
+    """Projection, Monte Carlo and forecasting engines on fixed-size inputs"""
+    from utils.forecasting import fit_forecast
+    from utils.monte_carlo import simulate_savings
+    from utils.projection_engine import RISK_PROFILE_RATES, scenario_grid
+
+    contributions = np.linspace(0, 5000, 101)
+    rates = np.array(list(RISK_PROFILE_RATES.values()))
+    horizons = np.arange(1, 361)
+    trends = np.random.default_rng(3).gamma(5, 400, (200, 36))
+
+    cases = {
+        "scenario_grid_101x3x360": lambda: scenario_grid(contributions, rates, horizons, 10000),
+        "simulate_savings_10k_paths_30y": lambda: simulate_savings(250000, 10000, 800, 360, "Moderate", 10000, seed=1),
+        "fit_forecast_200_series_36m": lambda: fit_forecast(trends, horizon=6),
+    }
+    return [{"name": name, "rows": None, **time_call(fn, repeats)} for name, fn in cases.items()]
+
+
+def extraction_benchmark(receipts: int, workers: int, latency_ms: float) -> Dict:
+    """Run synthetic receipt texts through TogetherClient against the mock LLM server"""
+    from utils.llm_transport import HTTPTransport, start_mock_server
+    from utils.receipts import normalize_receipt
+    from utils.together_client import TogetherClient
+
+    server, url = start_mock_server(latency_ms=latency_ms, seed=0)
+    try:
+        client = TogetherClient(transport=HTTPTransport(url))
+        texts = synthetic_data.receipt_texts(receipts)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            extracted = list(pool.map(lambda text: normalize_receipt(client.process_receipt(text=text)), texts))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    usage = client.usage_snapshot()
+    return {
+        "name": "extraction_pipeline_mock", "rows": receipts, "cold_s": elapsed, "best_s": elapsed,
+        "median_s": elapsed, "runs": 1, "workers": workers, "mock_latency_ms": latency_ms,
+        "files_per_s": receipts / elapsed, "tokens_per_s": usage["total_tokens"] / elapsed,
+        "extracted_amount_total": round(sum(r["amount"]["value"] for r in extracted), 2)
+    }
+
+
+def _metadata() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "platform": platform.platform()}
+
+
+def print_results(results: List[Dict], baseline: Optional[Dict] = None):
+    previous = {(r["name"], r["rows"]): r for r in (baseline or {}).get("results", [])}
+    for result in results:
+        rows = f"{result['rows']:,}" if result["rows"] else "-"
+        line = f"{result['name']:<36} {rows:>10}  best {result['best_s'] * 1000:10.1f} ms"
+        old = previous.get((result["name"], result["rows"]))
+        if old and old["best_s"] > 0:
+            line += f"  ({result['best_s'] / old['best_s']:.2f}x of baseline)"
+        if "files_per_s" in result:
+            line += f"  {result['files_per_s']:.1f} files/s, {result['tokens_per_s']:.0f} tokens/s"
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--receipts", type=int, default=200, help="Receipts through the extraction pipeline")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent extraction requests")
+    parser.add_argument("--mock-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--workdir", help="Where to create the SQLite databases (default: temp dir)")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        for rows in args.rows:
+            print(f"Seeding and timing {rows:,} rows...", flush=True)
+            results.extend(storage_benchmarks(rows, args.repeats, workdir))
+    results.extend(engine_benchmarks(args.repeats))
+    if args.receipts:
+        results.append(extraction_benchmark(args.receipts, args.workers, args.mock_latency_ms))
+
+    print_results(results, baseline)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"meta": _metadata(), "results": results}, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
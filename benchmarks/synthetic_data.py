@@ -0,0 +1,155 @@
+"""
+Synthetic financial data for benchmarks.
+
+Generates transactions with per-category merchants and log-normal amounts,
+income streams with weekly/monthly/annual/one-time recurrence, and receipt
+texts shaped like sample_receipts_data, all reproducible from a seed.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.receipts import PREDEFINED_CATEGORIES
+
+MERCHANTS = {
+    "Meals": ["Blue Bottle Coffee", "Chipotle", "Sweetgreen", "Whole Foods Market", "Joe's Pizza", "Panera Bread"],
+    "Travel": ["Uber", "Lyft", "Delta Air Lines", "Marriott", "Shell", "Hertz"],
+    "Office": ["Staples", "WeWork", "Office Depot", "IKEA Business"],
+    "Software": ["AWS", "GitHub", "Notion", "Adobe", "Slack", "CloudNova Solutions"],
+    "Rent": ["Greenview Properties", "Parkside Apartments"],
+    "Utilities": ["Con Edison", "Verizon", "Comcast", "City Water Dept"],
+    "Other": ["Amazon", "Target", "CVS Pharmacy", "Best Buy"],
+}
+# Median amount and spread (log-normal sigma) per category
+AMOUNT_PROFILE = {
+    "Meals": (18, 0.6), "Travel": (45, 0.9), "Office": (60, 0.8), "Software": (35, 0.7),
+    "Rent": (1800, 0.1), "Utilities": (90, 0.4), "Other": (40, 1.0),
+}
+CATEGORY_WEIGHTS = [0.35, 0.15, 0.1, 0.12, 0.03, 0.08, 0.17]
+
+INCOME_CATEGORIES = ["Salary", "Freelance", "Investment", "Gift", "Other"]
+PAYMENT_METHODS = ["Direct Deposit", "Bank Transfer", "Check", "Cash", "PayPal"]
+RECURRENCE_DAYS = {"weekly": 7.0, "monthly": 30.44, "annual": 365.25}
+
+
+def transactions(rows: int, seed: int = 0, days: int = 730, end: Optional[datetime] = None) -> pd.DataFrame:
+    """Expense rows with the columns of the transactions table, newest at `end`"""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or datetime.utcnow()).floor("s")
+    categories = np.array(PREDEFINED_CATEGORIES, dtype=object)
+    category_idx = rng.choice(len(categories), rows, p=CATEGORY_WEIGHTS)
+
+    merchants = np.empty(rows, dtype=object)
+    amounts = np.empty(rows)
+    for i, category in enumerate(categories):
+        mask = category_idx == i
+        names = np.array(MERCHANTS[category], dtype=object)
+        merchants[mask] = names[rng.integers(0, len(names), mask.sum())]
+        median, sigma = AMOUNT_PROFILE[category]
+        amounts[mask] = np.round(rng.lognormal(np.log(median), sigma, mask.sum()), 2)
+
+    offsets = pd.to_timedelta(rng.integers(0, days * 86400, rows), unit="s")
+    return pd.DataFrame({
+        "id": [f"{seed:04x}{i:012x}-0000-4000-8000-{i:012x}" for i in range(rows)],
+        "date": (end - offsets).to_numpy(),
+        "merchant": merchants,
+        "merchant_confidence": np.round(rng.beta(8, 1.5, rows), 3),
+        "description": [f"Receipt #{i:07d}" for i in range(rows)],
+        "amount": amounts,
+        "amount_confidence": np.round(rng.beta(9, 1.2, rows), 3),
+        "category": categories[category_idx],
+        "category_confidence": np.round(rng.beta(6, 2, rows), 3),
+        "date_confidence": np.round(rng.beta(9, 1, rows), 3),
+        "is_reconciled": rng.random(rows) < 0.3,
+    })
+
+
+def income(rows: int, seed: int = 1, days: int = 730, end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Income rows grouped into recurring streams.
+
+    Each stream has a source, recurrence and base amount; its occurrences
+    are spaced by the recurrence period going back from `end`.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or datetime.utcnow()).floor("s")
+    n_streams = max(5, rows // 24)
+    recurrences = np.array(["monthly", "weekly", "annual", "one-time"], dtype=object)
+    stream_recurrence = recurrences[rng.choice(4, n_streams, p=[0.5, 0.2, 0.1, 0.2])]
+    stream_category = np.array(INCOME_CATEGORIES, dtype=object)[rng.integers(0, len(INCOME_CATEGORIES), n_streams)]
+    stream_method = np.array(PAYMENT_METHODS, dtype=object)[rng.integers(0, len(PAYMENT_METHODS), n_streams)]
+    stream_amount = np.round(rng.lognormal(np.log(1500), 0.8, n_streams), 2)
+    stream_phase = rng.uniform(0, 30, n_streams)
+
+    stream = rng.integers(0, n_streams, rows)
+    occurrence = pd.Series(stream).groupby(stream).cumcount().to_numpy()
+    period = np.array([RECURRENCE_DAYS.get(r, 0.0) for r in stream_recurrence])[stream]
+    one_time = period == 0
+    age_days = np.where(one_time, rng.uniform(0, days, rows), stream_phase[stream] + occurrence * period)
+    age_days = np.mod(age_days, days)
+    amounts = stream_amount[stream] * np.where(one_time, rng.uniform(0.2, 2.0, rows), rng.normal(1, 0.03, rows))
+
+    return pd.DataFrame({
+        "id": [f"{seed:04x}{i:012x}-1111-4000-8000-{i:012x}" for i in range(rows)],
+        "date": (end - pd.to_timedelta(age_days, unit="D")).to_numpy(),
+        "source": [f"Source {s:05d}" for s in stream],
+        "amount": np.round(np.abs(amounts), 2),
+        "category": stream_category[stream],
+        "payment_method": stream_method[stream],
+        "description": [f"Payment {o} of stream {s}" for s, o in zip(stream, occurrence)],
+        "is_taxable": stream_category[stream] != "Gift",
+        "recurrence": stream_recurrence[stream],
+    })
+
+
+def receipt_texts(count: int, seed: int = 2) -> List[str]:
+    """Plain-text receipts with header, dated line items and totals"""
+    rng = np.random.default_rng(seed)
+    texts = []
+    for i in range(count):
+        category = PREDEFINED_CATEGORIES[rng.choice(len(PREDEFINED_CATEGORIES), p=CATEGORY_WEIGHTS)]
+        merchant = MERCHANTS[category][rng.integers(0, len(MERCHANTS[category]))]
+        day = pd.Timestamp("2025-01-01") + pd.Timedelta(days=int(rng.integers(0, 365)))
+        lines = [merchant, f"{int(rng.integers(1, 999))} Market Street", f"Date: {day:%Y-%m-%d}",
+                 f"Receipt No: {seed:02d}-{i:06d}", "-" * 40]
+        subtotal = 0.0
+        median, sigma = AMOUNT_PROFILE[category]
+        for item in range(int(rng.integers(1, 12))):
+            qty = int(rng.integers(1, 4))
+            price = round(float(rng.lognormal(np.log(median / 3), sigma)), 2)
+            subtotal += qty * price
+            lines.append(f"{category} item {item + 1} x{qty}    {qty * price:.2f}")
+        tax = round(subtotal * 0.08, 2)
+        lines += ["-" * 40, f"Subtotal    {subtotal:.2f}", f"Tax    {tax:.2f}", f"Total    {subtotal + tax:.2f}"]
+        texts.append("\n".join(lines))
+    return texts
+
+
+def seed_database(transaction_rows: int, income_rows: Optional[int] = None, seed: int = 0) -> Dict[str, int]:
+    """
+    Create the schema in the configured backend and load synthetic rows.
+
+    Intended for the local SQLite backend (FINAI_STORAGE_BACKEND=sqlite).
+    """
+    from utils.snowflake_conn import bulk_upload_transactions, bump_generation, get_conn, init_db
+
+    income_rows = transaction_rows // 10 if income_rows is None else income_rows
+    init_db()
+    loaded = bulk_upload_transactions(transactions(transaction_rows, seed))
+
+    frame = income(income_rows, seed + 1)
+    with get_conn() as conn:
+        conn.cursor().executemany(
+            """
+            INSERT INTO income (
+                id, date, source, amount, category,
+                payment_method, description, is_taxable,
+                recurrence
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            frame.astype(object).itertuples(index=False, name=None)
+        )
+    bump_generation("income")
+    return {"transactions": loaded, "income": len(frame)}
@@ -0,0 +1,97 @@
+"""
+Shared, cached data loaders for the tabs.
+
+Every loader is keyed by the data generation of the tables it reads, so a
+write in this process (a logged receipt, a new income entry) invalidates
+exactly the results that depend on it. The TTL bounds how stale results
+can get when another process (e.g. ingest_receipts.py) writes to the same
+database.
+"""
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from utils.cashflow import forecast_cashflow
+from utils.income_manager import IncomeManager
+from utils.ledger import get_ledger
+from utils.snowflake_conn import data_generation
+from utils.snowflake_helpers import TransactionManager
+
+CACHE_TTL = 300
+
+
+def _to_minute(value: Optional[datetime]) -> Optional[datetime]:
+    # Report windows are computed from datetime.now(); drop seconds so reruns share a key
+    if isinstance(value, datetime):
+        return value.replace(second=0, microsecond=0)
+    return value
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _combined_report(generation, time_period: str, custom_start, custom_end) -> Dict:
+    return TransactionManager.get_combined_financial_report(time_period, custom_start=custom_start,
+                                                            custom_end=custom_end)
+
+
+def load_combined_report(time_period: str = 'month', custom_start: datetime = None,
+                         custom_end: datetime = None) -> Dict:
+    """Cached TransactionManager.get_combined_financial_report"""
+    return _combined_report(data_generation("transactions", "income"), time_period,
+                            _to_minute(custom_start), _to_minute(custom_end))
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _income_report(generation, timeframe: str) -> Dict:
+    return IncomeManager.get_income_report(timeframe)
+
+
+def load_income_report(timeframe: str = 'month') -> Dict:
+    """Cached IncomeManager.get_income_report"""
+    return _income_report(data_generation("income"), timeframe)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _recent_transactions(generation, limit: int) -> pd.DataFrame:
+    return TransactionManager.get_recent_transactions(limit)
+
+
+def load_recent_transactions(limit: int = 100) -> pd.DataFrame:
+    """Cached TransactionManager.get_recent_transactions (callers get their own copy)"""
+    return _recent_transactions(data_generation("transactions"), limit)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _ledger(generation, limit: int, start, end, types) -> pd.DataFrame:
+    return get_ledger(limit, start=start, end=end, types=types)
+
+
+def load_ledger(limit: int = 1000, start: datetime = None, end: datetime = None,
+                types: Optional[Tuple[str, ...]] = None) -> pd.DataFrame:
+    """Cached utils.ledger.get_ledger"""
+    return _ledger(data_generation("transactions", "income"), limit,
+                   _to_minute(start), _to_minute(end), tuple(types) if types else None)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _monthly_averages(generation, months: int) -> Dict[str, float]:
+    return {
+        "income": IncomeManager.get_monthly_income_average(months),
+        "expenses": TransactionManager.get_monthly_expense_average(months)
+    }
+
+
+def load_monthly_averages(months: int = 12) -> Dict[str, float]:
+    """Cached monthly income and expense averages"""
+    return _monthly_averages(data_generation("transactions", "income"), months)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _cashflow(generation, today: date, starting_balance: float, days: int) -> Dict:
+    return forecast_cashflow(starting_balance, days, today)
+
+
+def load_cashflow(starting_balance: float = 0.0, days: int = 365) -> Dict:
+    """Cached utils.cashflow.forecast_cashflow"""
+    return _cashflow(data_generation("transactions", "income"), date.today(), float(starting_balance), days)
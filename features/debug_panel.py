@@ -0,0 +1,90 @@
+import os
+import streamlit as st
+import pandas as pd
+from utils import tracing
+from utils.llm_routes import route_latency
+from utils.profiling import RerunProfiler, resolve_mode
+from utils.settings import get_setting
+
+
+def debug_panel_enabled() -> bool:
+    """Shown with ?debug=1 in the URL or the FINAI_DEBUG_PANEL setting"""
+    return st.query_params.get("debug") == "1" or str(get_setting("FINAI_DEBUG_PANEL", "")).lower() in ("1", "true")
+
+
+def render_trace_panel():
+    """Sidebar panel with per-span timings and the most recent spans"""
+    with st.sidebar.expander("🔍 Performance traces", expanded=False):
+        if not tracing.enabled():
+            st.caption("Tracing is disabled (FINAI_TRACING=0).")
+            return
+
+        summary = tracing.summary()
+        if summary.empty:
+            st.caption("No spans recorded yet.")
+            return
+        st.dataframe(
+            summary.round({"total_ms": 1, "p50_ms": 1, "p95_ms": 1}),
+            hide_index=True,
+            use_container_width=True
+        )
+
+        latency = route_latency()
+        if not latency.empty:
+            st.caption("LLM routes")
+            st.dataframe(latency.round({"p50_ms": 1, "p90_ms": 1, "p99_ms": 1}),
+                         hide_index=True, use_container_width=True)
+
+        recent = pd.DataFrame(tracing.recent_spans(50))
+        recent["start"] = pd.to_datetime(recent["start"], unit="s").dt.strftime("%H:%M:%S")
+        st.caption("Latest spans")
+        st.dataframe(
+            recent.drop(columns=["thread"]).round({"duration_ms": 1}),
+            hide_index=True,
+            use_container_width=True
+        )
+
+        cols = st.columns(2)
+        cols[0].download_button("Prometheus metrics", tracing.prometheus_text(),
+                                file_name="finai_metrics.txt", mime="text/plain")
+        if cols[1].button("Reset traces"):
+            tracing.reset()
+            st.rerun()
+
+
+def get_rerun_profiler() -> RerunProfiler:
+    """This session's profiler, started for the current rerun (?profile= or FINAI_PROFILE)"""
+    mode = resolve_mode(st.query_params.get("profile") or get_setting("FINAI_PROFILE"))
+    if 'rerun_profiler' not in st.session_state:
+        st.session_state.rerun_profiler = RerunProfiler(mode)
+    profiler = st.session_state.rerun_profiler
+    profiler.begin(mode)
+    return profiler
+
+
+def render_profile_panel(profiler: RerunProfiler):
+    """Sidebar overlay: cost of each tab in this rerun and across recent reruns"""
+    with st.sidebar.expander("⏱️ Tab profile", expanded=True):
+        if not profiler.history:
+            st.caption("No profiled reruns yet.")
+            return
+        latest = profiler.history[-1]
+        sections = pd.DataFrame(latest["sections"])
+        slowest = sections.loc[sections["wall_ms"].idxmax()]
+        st.caption(f"Rerun took {latest['total_ms']:.0f} ms; "
+                   f"**{slowest['tab']}** used {slowest['wall_ms'] / max(latest['total_ms'], 1e-9):.0%} of it")
+        st.dataframe(
+            sections.drop(columns=["profile"]).round({"wall_ms": 1, "alloc_mb": 2, "peak_mb": 2}),
+            hide_index=True,
+            use_container_width=True
+        )
+        dumps = sections["profile"].dropna()
+        if not dumps.empty:
+            st.caption(f"Profiles written to {os.path.dirname(dumps.iloc[0])}")
+
+        if len(profiler.history) > 1:
+            trend = pd.DataFrame([
+                {"rerun": i + 1, "tab": s["tab"], "wall_ms": s["wall_ms"]}
+                for i, rerun in enumerate(profiler.history) for s in rerun["sections"]
+            ]).pivot_table(index="rerun", columns="tab", values="wall_ms", aggfunc="sum")
+            st.bar_chart(trend)
@@ -1,15 +1,19 @@
 import streamlit as st
 import requests
 import os
-import json
 from datetime import datetime, timedelta
 import pandas as pd
 import plotly.express as px
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, List
+from utils.analysis_cache import SingleFlightCache, market_session, next_market_close
 from utils.together_client import TogetherClient
 
 # --- Configuration ---
 TOGETHER_MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
+# Bump whenever the analysis or risk prompts change so cached reports are not reused
+ANALYSIS_PROMPT_VERSION = 1
+DEFAULT_ANALYSIS_DAYS = 30
 
 # --- API Clients ---
 class TogetherClientWrapper:
@@ -17,7 +21,7 @@ class TogetherClientWrapper:
         self.client = TogetherClient()
 
     def generate(self, prompt: str, temperature: float = 0.3) -> str:
-        return self.client.generate_text(prompt, temperature, max_tokens=4000)
+        return self.client.generate_text(prompt, temperature, task="analyze")
 
     def generate_json(self, prompt: str, temperature: float = 0.1) -> Dict:
         return self.client.generate_json(prompt, temperature)
@@ -26,8 +30,28 @@ class TogetherClientWrapper:
 class MarketIntelligence:
     def __init__(self):
         self.together = TogetherClientWrapper()
+        # Resolved here, in the script thread: cache_resource needs its ScriptRunContext
+        self.cache = get_analysis_cache()
     
-    def analyze_security(self, symbol: str, days: int = 30) -> Dict[str, Any]:
+    def analyze_security(self, symbol: str, days: int = DEFAULT_ANALYSIS_DAYS) -> Dict[str, Any]:
+        """
+        Security analysis shared across users until the next market close.
+
+        Results are keyed by (symbol, days, session date, prompt version);
+        concurrent requests for the same key wait on a single LLM call.
+        The result's "error" is set when the risk assessment failed; such
+        results are not cached. This may run in the watchlist warm-up
+        thread, so failures are returned for the calling tab to render.
+        """
+        key = (symbol.upper(), days, market_session(), ANALYSIS_PROMPT_VERSION)
+        return self.cache.get_or_compute(
+            key,
+            lambda: self._run_analysis(symbol, days),
+            expires_at=next_market_close(),
+            cache_if=lambda result: bool(result["analysis"]) and not result["error"]
+        )
+
+    def _run_analysis(self, symbol: str, days: int) -> Dict[str, Any]:
         """Comprehensive security analysis with Groq"""
         # Main analysis prompt
         analysis_prompt = f"""Perform professional analysis for {symbol} (last {days} days):
@@ -67,39 +91,73 @@ class MarketIntelligence:
         
         Only return the JSON object, nothing else."""
         
+        error = None
         try:
             risk_data = self.together.generate_json(risk_prompt, temperature=0.1)
-        except json.JSONDecodeError as e:
-            st.error(f"Failed to parse risk assessment: {str(e)}")
-            st.warning(f"Raw response: {risk_response}")
-            risk_data = {
-                "volatility_score": 50,
-                "liquidity_score": 50,
-                "sector_risk": "Medium",
-                "overall_risk_rating": "Medium",
-                "risk_factors": ["Data unavailable"],
-                "error": True
-            }
+            if not risk_data:
+                error = "Risk assessment returned no data"
         except Exception as e:
-            st.error(f"Risk assessment failed: {str(e)}")
+            print(f"Risk assessment for {symbol} failed: {e}")
+            risk_data, error = {}, f"Risk assessment failed: {str(e)}"
+        if error:
             risk_data = {
                 "volatility_score": 50,
                 "liquidity_score": 50,
                 "sector_risk": "Medium",
                 "overall_risk_rating": "Medium",
-                "risk_factors": ["Assessment failed"],
-                "error": True
+                "risk_factors": ["Assessment failed"]
             }
         
         return {
             "analysis": analysis,
-            "risk_data": risk_data
+            "risk_data": risk_data,
+            "error": error
         }
+
+
+@st.cache_resource
+def get_analysis_cache() -> SingleFlightCache:
+    """Process-wide analysis cache shared by every session"""
+    return SingleFlightCache()
+
+
+@st.cache_resource
+def warm_watchlist(symbols: tuple, session, days: int = DEFAULT_ANALYSIS_DAYS) -> threading.Thread:
+    """Pre-compute analyses for the configured watchlist once per market session"""
+    market = MarketIntelligence()
+
+    def _warm():
+        for symbol in symbols:
+            try:
+                market.analyze_security(symbol, days)
+            except Exception as e:
+                print(f"Watchlist warm-up failed for {symbol}: {e}")
+
+    thread = threading.Thread(target=_warm, name="watchlist-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _configured_watchlist() -> List[str]:
+    """Read MARKET_WATCHLIST (comma separated or list) from secrets or env"""
+    try:
+        watchlist = st.secrets.get("MARKET_WATCHLIST")
+    except Exception:
+        watchlist = None
+    watchlist = watchlist or os.getenv("MARKET_WATCHLIST", "")
+    if isinstance(watchlist, str):
+        watchlist = watchlist.split(",")
+    return [s.strip().upper() for s in watchlist if s.strip()]
+
+
 # --- Streamlit UI ---
 def detail_investmentplan():
     st.header("📈 Market Intelligence")
+    watchlist = _configured_watchlist()
+    if watchlist:
+        warm_watchlist(tuple(watchlist), market_session())
     symbol = st.text_input("Enter ticker symbol", "AAPL").upper()
-    analysis_days = st.slider("Analysis period (days)", 7, 365, 30)
+    analysis_days = st.slider("Analysis period (days)", 7, 365, DEFAULT_ANALYSIS_DAYS)
         
     if st.button("Analyze Security"):
         with st.spinner("Running comprehensive analysis..."):
@@ -108,6 +166,10 @@ def detail_investmentplan():
                 
             # Display results
             st.subheader(f"{symbol} Analysis Report")
+            if result.get("error"):
+                st.warning(f"{result['error']}; showing default risk values. Run the analysis again to retry.")
+            else:
+                st.caption(f"Shared analysis valid until {next_market_close():%Y-%m-%d %H:%M %Z}")
             st.markdown(result["analysis"])
                 
             # Risk visualization
@@ -3,7 +3,13 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from utils.snowflake_helpers import TransactionManager, IncomeManager
+from dashboard.cached_data import load_combined_report, load_ledger, load_recent_transactions
+from utils.anomaly_detector import get_anomaly_detector
+from utils.budgets import PERIODS, get_budget_tracker
+from utils.forecasting import forecast_trends
+from utils.receipts import PREDEFINED_CATEGORIES
+from utils.snowflake_conn import data_generation
+from utils.subscriptions import get_subscription_detector
 
 
 def generate_financial_dashboard(time_period="month", start_date=None, end_date=None):
@@ -78,11 +84,11 @@ def generate_financial_dashboard(time_period="month", start_date=None, end_date=
             start_date = end_date - timedelta(days=365)
 
     # Get financial data for current and previous period
-    current_report = TransactionManager.get_combined_financial_report(time_period.lower())
+    current_report = load_combined_report(time_period.lower())
 
     # Calculate previous period for comparison
     prev_start_date = start_date - (end_date - start_date)
-    prev_report = TransactionManager.get_combined_financial_report(
+    prev_report = load_combined_report(
         custom_start=prev_start_date,
         custom_end=start_date
     )
@@ -243,7 +249,7 @@ def generate_financial_dashboard(time_period="month", start_date=None, end_date=
 
     with kpi8:
         # Average Daily Spend
-        expense_df = TransactionManager.get_recent_transactions(1000)
+        expense_df = load_recent_transactions(1000)
         if not expense_df.empty:
             expense_df = expense_df[(expense_df['date'] >= pd.to_datetime(start_date)) & 
                                 (expense_df['date'] <= pd.to_datetime(end_date))]
@@ -443,7 +449,7 @@ def generate_financial_dashboard(time_period="month", start_date=None, end_date=
             start_date = end_date - timedelta(days=365)
 
     # Get financial data
-    report = TransactionManager.get_combined_financial_report(time_period.lower())
+    report = load_combined_report(time_period.lower())
 
     # Top Metrics Row
     st.markdown("## Financial Overview")
@@ -573,9 +579,13 @@ def generate_financial_dashboard(time_period="month", start_date=None, end_date=
             income_trend.index = pd.to_datetime(income_trend.index)
             income_trend = income_trend.sort_index()
             
-            # Simple forecasting (moving average)
+            # Trend + seasonality forecast for the total and every source/category in one fit
             forecast_periods = 3
-            forecast = income_trend['Amount'].rolling(3).mean().iloc[-forecast_periods:]
+            trends = {"Total Income": report["income"]["monthly_trend"]}
+            trends.update({f"Income: {k}": v for k, v in report["income"].get("monthly_by_source", {}).items()})
+            trends.update({f"Expense: {k}": v for k, v in report["expenses"].get("monthly_by_category", {}).items()})
+            forecasts = forecast_trends(trends, horizon=forecast_periods, generation=data_generation())
+            forecast = forecasts[forecasts["series"] == "Total Income"]
             
             fig = go.Figure()
             fig.add_trace(go.Scatter(
@@ -585,8 +595,16 @@ def generate_financial_dashboard(time_period="month", start_date=None, end_date=
                 line=dict(color='#28a745', width=3)
             ))
             fig.add_trace(go.Scatter(
-                x=pd.date_range(income_trend.index[-1], periods=forecast_periods+1, freq='M')[1:],
-                y=forecast,
+                x=list(forecast['date']) + list(forecast['date'])[::-1],
+                y=list(forecast['upper']) + list(forecast['lower'])[::-1],
+                fill='toself',
+                fillcolor='rgba(40,167,69,0.15)',
+                line=dict(width=0),
+                name='95% Interval'
+            ))
+            fig.add_trace(go.Scatter(
+                x=forecast['date'],
+                y=forecast['forecast'],
                 name='Forecast',
                 line=dict(color='#28a745', width=3, dash='dot')
             ))
@@ -599,6 +617,13 @@ def generate_financial_dashboard(time_period="month", start_date=None, end_date=
             )
             st.plotly_chart(fig, use_container_width=True)
 
+            with st.expander("Forecast by source and category"):
+                st.dataframe(
+                    forecasts.pivot(index="series", columns="date", values="forecast")
+                             .rename(columns=lambda d: d.strftime("%b %Y")),
+                    use_container_width=True
+                )
+
     with tab3:
         st.markdown("## Expense Analysis")
         
@@ -640,50 +665,93 @@ def generate_financial_dashboard(time_period="month", start_date=None, end_date=
             )
             st.plotly_chart(fig, use_container_width=True)
         
-        # Expense alert system
+        # Budget progress comes from running counters, not a rescan of transactions
+        st.markdown("### Budgets")
+        tracker = get_budget_tracker()
+        budgets = tracker.status()
+        for row in budgets.itertuples():
+            st.progress(
+                min(row.used_pct / 100, 1.0),
+                text=f"{row.category} ({row.period}ly): ${row.spent:,.2f} of ${row.amount_limit:,.2f} "
+                     f"({row.used_pct:.0f}%)"
+            )
+        with st.expander("Set a budget"):
+            with st.form("budget_form"):
+                col1, col2, col3 = st.columns(3)
+                budget_category = col1.selectbox("Category", PREDEFINED_CATEGORIES)
+                budget_period = col2.selectbox("Period", PERIODS, index=1, format_func=str.capitalize)
+                budget_limit = col3.number_input("Limit", min_value=0.0, step=50.0, format="%.2f")
+                if st.form_submit_button("Save Budget"):
+                    try:
+                        if budget_limit > 0:
+                            tracker.set_budget(budget_category, budget_period, budget_limit)
+                        else:
+                            tracker.remove_budget(budget_category, budget_period)
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Error saving budget: {str(e)}")
+            st.caption("A limit of 0 removes the budget.")
+        alerts = tracker.alerts()
+        if not alerts.empty:
+            st.dataframe(
+                alerts[['created_at', 'category', 'period', 'threshold', 'spent', 'amount_limit']],
+                column_config={
+                    "created_at": st.column_config.DatetimeColumn("Raised"),
+                    "category": "Category",
+                    "period": "Period",
+                    "threshold": st.column_config.NumberColumn("Threshold", format="percent"),
+                    "spent": st.column_config.NumberColumn("Spent", format="$%.2f"),
+                    "amount_limit": st.column_config.NumberColumn("Limit", format="$%.2f")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+
+        # Subscriptions are kept current per transaction, so listing them reads no history
+        st.markdown("### Recurring Charges")
+        subscriptions = get_subscription_detector().subscriptions()
+        if not subscriptions.empty:
+            col1, col2 = st.columns(2)
+            col1.metric("Active Subscriptions", len(subscriptions))
+            col2.metric("Monthly Cost", f"${subscriptions['monthly_cost'].sum():,.2f}")
+            st.dataframe(
+                subscriptions[['merchant', 'category', 'cadence', 'last_amount', 'last_date', 'next_expected']],
+                column_config={
+                    "merchant": "Merchant",
+                    "category": "Category",
+                    "cadence": "Billed",
+                    "last_amount": st.column_config.NumberColumn("Last Charge", format="$%.2f"),
+                    "last_date": st.column_config.DateColumn("Last Charged"),
+                    "next_expected": st.column_config.DateColumn("Next Expected")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.info("No recurring charges detected yet")
+        
+        # Expense alert system: alerts are raised at write time by the streaming detector
         st.markdown("### Expense Alerts")
-        expense_df = TransactionManager.get_recent_transactions(1000)
-        if not expense_df.empty:
-            # Filter by date
-            expense_df = expense_df[(expense_df['date'] >= pd.to_datetime(start_date)) & 
-                                (expense_df['date'] <= pd.to_datetime(end_date))]
-            
-            # Large transactions
-            large_txns = expense_df[expense_df['amount'].abs() > expense_df['amount'].abs().quantile(0.9)]
-            if not large_txns.empty:
-                st.warning(f"⚠️ {len(large_txns)} large transactions detected (top 10%)")
-                st.dataframe(large_txns[['date', 'merchant', 'amount', 'category']])
-            
-            # Unusual spending patterns
-            daily_spending = expense_df.groupby(expense_df['date'].dt.date)['amount'].sum().abs()
-            avg_spending = daily_spending.mean()
-            std_spending = daily_spending.std()
-            unusual_days = daily_spending[daily_spending > (avg_spending + 2*std_spending)]
-            
-            if not unusual_days.empty:
-                st.warning(f"⚠️ {len(unusual_days)} days with unusually high spending detected")
-                st.write(unusual_days)
+        detector = get_anomaly_detector()
+        alerts = detector.recent_alerts(start_date, end_date)
+        if not alerts.empty:
+            st.warning(f"⚠️ {len(alerts)} unusual transactions for their category, merchant or season")
+            st.dataframe(alerts, hide_index=True, use_container_width=True)
+        
+        # Unusual spending patterns
+        unusual_days = detector.unusual_days(start_date, end_date)
+        if not unusual_days.empty:
+            st.warning(f"⚠️ {len(unusual_days)} days with unusually high spending detected")
+            st.write(unusual_days)
 
     with tab4:
         st.markdown("## Transaction Details")
         
         # Combined transactions view
         st.markdown("### All Transactions")
-        income_df = IncomeManager.get_recent_income(1000)
-        expense_df = TransactionManager.get_recent_transactions(1000)
+        combined = load_ledger(2000, start=start_date, end=end_date)
         
-        if not income_df.empty or not expense_df.empty:
-            income_df = income_df.loc[:, ~income_df.columns.duplicated()]
-            # Combine data
-            combined = pd.concat([
-                income_df[['date', 'merchant', 'amount', 'category', 'description']],
-                expense_df[['date', 'merchant', 'amount', 'category', 'description']]
-            ])
-            
-            # Filter by date
-            combined = combined[(combined['date'] >= pd.to_datetime(start_date)) & 
-                            (combined['date'] <= pd.to_datetime(end_date))]
-            
+        if not combined.empty:
             # Add amount display column
             combined['amount_display'] = combined['amount'].abs()
             
@@ -699,8 +767,7 @@ def generate_financial_dashboard(time_period="month", start_date=None, end_date=
             # Apply filtering only by category
             filtered = combined[
                 combined['category'].isin(category_filter)
-            ].sort_values('date', ascending=False)
-            filtered = filtered.loc[:, ~filtered.columns.duplicated()].reset_index(drop=True)
+            ].reset_index(drop=True)
                         
             # Format display
             def color_amount(val):
@@ -1,12 +1,22 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import json
 import os
-from utils.income_manager import IncomeManager
-from utils.snowflake_helpers import TransactionManager
+from dashboard.cached_data import load_monthly_averages
 from utils.together_client import TogetherClient
+from utils.monte_carlo import probability_by_month, simulate_savings
+from utils.projection_engine import (
+    DEFAULT_ANNUAL_RATE,
+    RISK_PROFILE_RATES,
+    balance_paths,
+    months_to_goal,
+    required_contribution,
+    scenario_grid
+)
 
 # --- Together.ai Integration ---
 class TogetherFinancialAdvisor:
@@ -18,7 +28,7 @@ class TogetherFinancialAdvisor:
     def get_advice(self, prompt: str, temperature: float = 0.3) -> str:
         """Get AI-generated financial advice from Together.ai"""
         try:
-            return self.together_client.generate_text(prompt, temperature, max_tokens=1000)
+            return self.together_client.generate_text(prompt, temperature, task="advise")
         except Exception as e:
             st.error(f"Failed to get financial advice: {str(e)}")
             return ""
@@ -30,8 +40,8 @@ class SavingsPlanner:
     @staticmethod
     def get_financial_snapshot():
         """Get current financial position from database"""
-        income = IncomeManager.get_monthly_income_average()
-        expenses = TransactionManager.get_monthly_expense_average()
+        averages = load_monthly_averages()
+        income, expenses = averages["income"], averages["expenses"]
         savings_capacity = income - expenses
         return {
             "monthly_income": income,
@@ -42,18 +52,11 @@ class SavingsPlanner:
     @staticmethod
     def generate_projection(goal_amount, current_savings, monthly_contribution, years, risk_profile):
         """Generate detailed savings projection"""
-        growth_rates = {"Conservative": 0.03, "Moderate": 0.06, "Aggressive": 0.09}
-        rate = growth_rates.get(risk_profile, 0.05)
-        monthly_rate = rate / 12
+        rate = RISK_PROFILE_RATES.get(risk_profile, DEFAULT_ANNUAL_RATE)
         months = years * 12
         
-        dates = [datetime.now() + timedelta(days=30*i) for i in range(months+1)]
-        balances = [current_savings]
-        
-        for _ in range(months):
-            interest = balances[-1] * monthly_rate
-            new_balance = balances[-1] + monthly_contribution + interest
-            balances.append(new_balance)
+        dates = pd.Timestamp.now() + pd.to_timedelta(np.arange(months + 1) * 30, unit="D")
+        balances = balance_paths(current_savings, monthly_contribution, rate, months)
         
         return pd.DataFrame({
             "Date": dates,
@@ -61,6 +64,25 @@ class SavingsPlanner:
             "Growth_Rate": risk_profile
         })
 
+    @staticmethod
+    def simulate_risk(goal_amount, current_savings, monthly_contribution, years, risk_profile,
+                      n_paths: int = 10000, seed: int = 42) -> dict:
+        """Monte Carlo projection with percentile bands and goal probability"""
+        return simulate_savings(goal_amount, current_savings, monthly_contribution,
+                                years * 12, risk_profile, n_paths=n_paths, seed=seed)
+
+    @staticmethod
+    def what_if_grid(contributions, years_options, current_savings: float = 0.0) -> pd.DataFrame:
+        """Final balance for every contribution x risk profile x horizon in one call"""
+        profiles = list(RISK_PROFILE_RATES)
+        balances = scenario_grid(contributions,
+                                 [RISK_PROFILE_RATES[p] for p in profiles],
+                                 np.asarray(years_options) * 12,
+                                 current_savings)
+        index = pd.MultiIndex.from_product([contributions, profiles, years_options],
+                                           names=["Contribution", "Risk Profile", "Years"])
+        return pd.DataFrame({"Balance": balances.ravel()}, index=index).reset_index()
+
 # --- Investment Recommender ---
 class InvestmentAdvisor:
     """Provides AI-enhanced investment recommendations"""
@@ -119,11 +141,14 @@ def savings_and_investing_tab():
             
             if st.form_submit_button("Generate Plan"):
                 with st.spinner("Creating optimized savings plan..."):
-                    # Calculate suggested monthly contribution
+                    # Contribution that exactly reaches the goal, capped at 80% of available savings
+                    rate = RISK_PROFILE_RATES.get(risk_profile, DEFAULT_ANNUAL_RATE)
                     suggested = min(
-                        goal_amount / (years * 12),  # Naive calculation
-                        snapshot['savings_capacity'] * 0.8  # 80% of available savings
+                        float(required_contribution(goal_amount, 0, rate, years * 12)),
+                        snapshot['savings_capacity'] * 0.8
                     )
+                    suggested = max(suggested, 0.0)
+                    months_needed = float(months_to_goal(goal_amount, 0, suggested, rate))
                     
                     # Generate projection
                     projection = SavingsPlanner.generate_projection(
@@ -136,11 +161,45 @@ def savings_and_investing_tab():
                     
                     # Display results
                     st.success(f"**Suggested Monthly Contribution:** ${suggested:,.2f}")
+                    if np.isfinite(months_needed):
+                        st.caption(f"At this contribution the goal is reached in {months_needed / 12:.1f} years.")
+                    else:
+                        st.caption("At this contribution the goal is not reachable; consider increasing savings capacity.")
                     
                     # Interactive chart
                     fig = px.line(projection, x="Date", y="Balance", 
                                  title=f"'{goal_name}' Projection")
                     st.plotly_chart(fig, use_container_width=True)
+
+                    # Risk-aware projection: fixed growth rates hide the spread of outcomes
+                    simulation = SavingsPlanner.simulate_risk(
+                        goal_amount=goal_amount,
+                        current_savings=0,
+                        monthly_contribution=suggested,
+                        years=years,
+                        risk_profile=risk_profile
+                    )
+                    band_dates = pd.Timestamp.now() + pd.to_timedelta(simulation["months"] * 30, unit="D")
+                    bands = simulation["percentiles"]
+                    fig = go.Figure([
+                        go.Scatter(x=band_dates, y=bands[95], line=dict(width=0), showlegend=False),
+                        go.Scatter(x=band_dates, y=bands[5], fill="tonexty", line=dict(width=0),
+                                   fillcolor="rgba(102,126,234,0.15)", name="5th-95th percentile"),
+                        go.Scatter(x=band_dates, y=bands[75], line=dict(width=0), showlegend=False),
+                        go.Scatter(x=band_dates, y=bands[25], fill="tonexty", line=dict(width=0),
+                                   fillcolor="rgba(102,126,234,0.35)", name="25th-75th percentile"),
+                        go.Scatter(x=band_dates, y=bands[50], line=dict(color="#667eea", width=3), name="Median")
+                    ])
+                    fig.add_hline(y=goal_amount, line_dash="dot", annotation_text="Goal")
+                    fig.update_layout(title=f"Range of Outcomes ({simulation['n_paths']:,} simulations)",
+                                      yaxis_title="Balance ($)")
+                    st.plotly_chart(fig, use_container_width=True)
+
+                    prob_cols = st.columns(3)
+                    for col, fraction in zip(prob_cols, (0.5, 0.75, 1.0)):
+                        month = int(round(years * 12 * fraction))
+                        col.metric(f"Chance of goal by {(datetime.now() + timedelta(days=30 * month)):%b %Y}",
+                                   f"{probability_by_month(simulation, month) * 100:.0f}%")
                     
                     # Get AI advice
                     advisor = TogetherFinancialAdvisor()
@@ -206,6 +265,38 @@ def savings_and_investing_tab():
                    f"${emergency_fund_needed:,.2f}",
                    f"{emergency_fund_months} months")
         
+        # What-if explorer: every slider change is a single vectorized evaluation
+        st.markdown("### 🔮 What-If Explorer")
+        wi_col1, wi_col2, wi_col3 = st.columns(3)
+        wi_contribution = wi_col1.slider("Monthly contribution ($)", 0, 5000,
+                                         min(int(max(snapshot['savings_capacity'], 0) // 50 * 50), 5000) or 500,
+                                         step=50)
+        wi_start = wi_col2.number_input("Current savings ($)", min_value=0, value=0, step=1000)
+        wi_goal = wi_col3.number_input("Goal ($)", min_value=100, value=50000, step=1000)
+
+        grid = SavingsPlanner.what_if_grid(
+            contributions=[wi_contribution],
+            years_options=list(range(1, 31)),
+            current_savings=wi_start
+        )
+        fig = px.line(grid, x="Years", y="Balance", color="Risk Profile",
+                      title=f"Balance at ${wi_contribution:,}/month")
+        fig.add_hline(y=wi_goal, line_dash="dot", annotation_text="Goal")
+        st.plotly_chart(fig, use_container_width=True)
+
+        rates = np.array([RISK_PROFILE_RATES[p] for p in RISK_PROFILE_RATES])
+        goal_months = months_to_goal(wi_goal, wi_start, wi_contribution, rates)
+        needed_10y = required_contribution(wi_goal, wi_start, rates, 120)
+        st.dataframe(
+            pd.DataFrame({
+                "Risk Profile": list(RISK_PROFILE_RATES),
+                "Years to Goal": np.where(np.isfinite(goal_months), goal_months / 12, np.nan).round(1),
+                "Monthly Needed for 10 Years": needed_10y.round(2)
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+
         # AI Financial Health Assessment
         if st.button("Get Financial Health Checkup"):
             with st.spinner("Analyzing your financial situation..."):
@@ -1,14 +1,31 @@
 import os
 import streamlit as st
 import json
+import threading
 from datetime import datetime
-from utils.snowflake_helpers import TransactionManager
+from utils.answer_cache import SemanticAnswerCache
 from utils.income_manager import IncomeManager
+from utils.tax_engine import tax_report
 from utils.together_client import TogetherClient
 import dotenv
 
 dotenv.load_dotenv()
 
+# Bump whenever the compliance prompt changes so cached answers are not reused
+TAX_PROMPT_VERSION = 1
+DEFAULT_SIMILARITY_THRESHOLD = 0.7
+
+COMMON_TAX_QUESTIONS = [
+    "How can I maximize tax deductions for my business expenses?",
+    "What expenses are deductible for freelancers and contractors?",
+    "How should I categorize software and technology expenses for tax purposes?",
+    "What tax benefits can I claim for home office and remote work?",
+    "How do I properly track and report income from multiple sources?",
+    "What are the tax implications of different business structures?",
+    "How can I optimize my tax strategy for investment income?",
+    "What records should I keep for tax audits and compliance?"
+]
+
 class TaxComplianceAssistant:
     """Handles all tax compliance queries using Together.ai"""
     
@@ -33,24 +50,83 @@ class TaxComplianceAssistant:
     Answer in clear, actionable terms suitable for FinAI users managing their finances. 
     Include specific examples and actionable steps when possible."""
 
-        return self.together_client.generate_text(prompt, temperature=0.2, max_tokens=1000)
+        return self.together_client.generate_text(prompt, temperature=0.2, task="advise")
+
+
+def _similarity_threshold() -> float:
+    """Read TAX_CACHE_SIMILARITY from secrets or env, falling back to the default"""
+    try:
+        value = st.secrets.get("TAX_CACHE_SIMILARITY")
+    except Exception:
+        value = None
+    value = value or os.getenv("TAX_CACHE_SIMILARITY")
+    return float(value) if value else DEFAULT_SIMILARITY_THRESHOLD
+
+
+@st.cache_resource
+def get_answer_cache(prompt_version: int = TAX_PROMPT_VERSION) -> SemanticAnswerCache:
+    """
+    Process-wide answer cache shared by every session.
+
+    The common questions are answered once in a background thread so
+    clicking them never waits on the API.
+    """
+    cache = SemanticAnswerCache(similarity_threshold=_similarity_threshold())
+
+    def _warm():
+        try:
+            cache.warm(COMMON_TAX_QUESTIONS, TaxComplianceAssistant().ask_compliance_question)
+        except Exception as e:
+            print(f"Tax answer cache warm-up failed: {e}")
+
+    threading.Thread(target=_warm, name="tax-answer-warmup", daemon=True).start()
+    return cache
 
 class TaxOptimizationDashboard:
     """Handles the tax optimization calculations and visualizations"""
     
     @staticmethod
-    def display_annual_tax_summary(report: dict):
-        """Display key tax metrics"""
+    def display_annual_tax_summary(tax: dict):
+        """Display key tax metrics, the estimated-tax schedule and past years"""
         with st.expander("📊 Annual Tax Summary"):
-            if report:
-                st.metric("Total Income", f"${report['income']['total']:,.2f}")
-                st.metric("Total Expenses", f"${report['expenses']['total']:,.2f}")
-                st.metric("Taxable Income", f"${report['income']['total'] - report['expenses']['total']:,.2f}")
+            summary = tax['summary'] if tax else None
+            if summary and (summary['income'] or summary['expenses']):
+                st.caption(f"{summary['year']} to date")
+                st.metric("Taxable Income Received", f"${summary['income']:,.2f}")
+                st.metric("Deductible Expenses", f"${summary['deductions']:,.2f}")
+                st.metric("Taxable Income", f"${summary['taxable_income']:,.2f}",
+                          help=f"After the ${summary['standard_deduction']:,.0f} standard deduction")
+                st.metric("Estimated Tax Liability", f"${summary['tax']:,.2f}",
+                          help=f"Effective rate {summary['effective_rate']:.1%}, "
+                               f"marginal rate {summary['marginal_rate']:.0%}")
                 
-                # Simple tax estimate (example rates)
-                taxable_income = report['income']['total'] - report['expenses']['total']
-                tax_estimate = taxable_income * 0.25  # Example 25% rate
-                st.metric("Estimated Tax Liability", f"${tax_estimate:,.2f}")
+                st.write("**Quarterly Estimated Tax**")
+                st.dataframe(
+                    tax['quarterly'][['quarter', 'due_date', 'ytd_taxable_income', 'installment']],
+                    column_config={
+                        "quarter": "Quarter",
+                        "due_date": st.column_config.DateColumn("Due"),
+                        "ytd_taxable_income": st.column_config.NumberColumn("Net Income YTD", format="$%.2f"),
+                        "installment": st.column_config.NumberColumn("Payment", format="$%.2f")
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+                
+                st.write("**Year-over-Year**")
+                st.dataframe(
+                    tax['comparison'],
+                    column_config={
+                        "year": st.column_config.NumberColumn("Year", format="%d"),
+                        "income": st.column_config.NumberColumn("Income", format="$%.2f"),
+                        "deductions": st.column_config.NumberColumn("Deductions", format="$%.2f"),
+                        "taxable_income": st.column_config.NumberColumn("Taxable", format="$%.2f"),
+                        "tax": st.column_config.NumberColumn("Tax", format="$%.2f"),
+                        "effective_rate": st.column_config.NumberColumn("Effective Rate", format="percent")
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
                 
                 # Important notice
                 st.warning("""
@@ -63,20 +139,13 @@ class TaxOptimizationDashboard:
                 st.warning("No financial data available for tax analysis")
     
     @staticmethod
-    def display_tax_deductible_expenses(report: dict):
+    def display_tax_deductible_expenses(tax: dict):
         """Show expense categories with tax benefits"""
         with st.expander("💡 Tax-Deductible Expenses"):
-            if report and report['expenses']['category_breakdown']:
-                deductible_categories = {
-                    'Office': "100% deductible for home office",
-                    'Software': "100% deductible if used for business",
-                    'Travel': "50-100% deductible depending on purpose",
-                    'Meals': "50% deductible for business meals"
-                }
-                
-                for category, amount in report['expenses']['category_breakdown'].items():
-                    if category in deductible_categories:
-                        st.write(f"**{category}**: ${amount:,.2f} - {deductible_categories[category]}")
+            by_category = tax['summary']['by_category'] if tax else None
+            if by_category is not None and (by_category['deductible'] > 0).any():
+                for row in by_category[by_category['deductible'] > 0].itertuples():
+                    st.write(f"**{row.category}**: ${row.deductible:,.2f} of ${row.spent:,.2f} - {row.note}")
                 
                 # Important notice
                 st.info("""
@@ -97,20 +166,9 @@ class ComplianceChatInterface:
     
     def display_common_questions(self):
         """Show pre-defined compliance questions"""
-        common_questions = [
-            "How can I maximize tax deductions for my business expenses?",
-            "What expenses are deductible for freelancers and contractors?",
-            "How should I categorize software and technology expenses for tax purposes?",
-            "What tax benefits can I claim for home office and remote work?",
-            "How do I properly track and report income from multiple sources?",
-            "What are the tax implications of different business structures?",
-            "How can I optimize my tax strategy for investment income?",
-            "What records should I keep for tax audits and compliance?"
-        ]
-        
         selected_question = st.selectbox(
             "Common compliance questions:",
-            ["Select a question..."] + common_questions
+            ["Select a question..."] + COMMON_TAX_QUESTIONS
         )
         return selected_question
     
@@ -119,13 +177,21 @@ class ComplianceChatInterface:
         if st.button("💡 Get Tax Optimization Advice") and question:
             with st.spinner("🧠 Analyzing tax optimization strategies..."):
                 try:
-                    assistant = TaxComplianceAssistant()
-                    response = assistant.ask_compliance_question(question)
+                    cache = get_answer_cache()
+                    cached = cache.lookup(question)
+                    if cached:
+                        response, tier, _ = cached
+                    else:
+                        assistant = TaxComplianceAssistant()
+                        response = assistant.ask_compliance_question(question)
+                        cache.store(question, response)
+                        tier = None
                     
                     # Add to chat history
                     st.session_state.tax_chat_history.append({
                         "question": question,
                         "response": response,
+                        "cache_tier": tier,
                         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
                     })
                 except Exception as e:
@@ -138,6 +204,8 @@ class ComplianceChatInterface:
             for i, chat in enumerate(reversed(st.session_state.tax_chat_history)):
                 with st.expander(f"Q: {chat['question']} ({chat['timestamp']})"):
                     st.write(chat['response'])
+                    if chat.get('cache_tier') == 'similar':
+                        st.caption("Answered from a previously asked, closely matching question.")
                     
                     # Disclaimer for all responses
                     if i == 0:  # Only show once
@@ -186,12 +254,16 @@ def tax_optimization_tab():
     with col1:
         st.subheader("📊 Tax Optimization Insights")
         
-        # Get financial data for the year
-        report = TransactionManager.get_combined_financial_report('year')
+        # Tax estimate for the year (cached until the ledger changes)
+        try:
+            tax = tax_report()
+        except Exception as e:
+            st.error(f"Tax estimate failed: {str(e)}")
+            tax = None
         
         # Display tax optimization components
-        TaxOptimizationDashboard.display_annual_tax_summary(report)
-        TaxOptimizationDashboard.display_tax_deductible_expenses(report)
+        TaxOptimizationDashboard.display_annual_tax_summary(tax)
+        TaxOptimizationDashboard.display_tax_deductible_expenses(tax)
     
     with col2:
         st.subheader("🎯 Tax Optimization Assistant")
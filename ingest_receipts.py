@@ -0,0 +1,256 @@
+"""
+Headless receipt ingestion for a folder of documents.
+
+Usage:
+    python ingest_receipts.py sample_receipts_data [--workers 4] [--batch-size 50]
+                              [--manifest path.jsonl] [--dry-run] [--limit N]
+
+Every supported file is extracted with TogetherClient, its category mapped
+to a predefined one and the results written with bulk_log_transactions in
+batches. Outcomes are appended to a JSONL manifest as soon as a batch is
+stored, so an interrupted run picks up where it stopped; files whose
+content was already ingested (under any name) are skipped as cache hits.
+Secrets are read from .streamlit/secrets.toml as in the app.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.receipts import is_failed_extraction, normalize_receipt
+
+FILE_TYPES = {".pdf": "pdf", ".txt": "txt", ".csv": "csv", ".jpg": "jpg", ".jpeg": "jpeg", ".png": "png"}
+MANIFEST_NAME = ".ingest_manifest.jsonl"
+
+
+def iter_documents(root: str, extensions: Dict[str, str]) -> Iterator[Tuple[str, str]]:
+    """Yield (path, file_type) for supported files below root in a stable order"""
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = sorted(d for d in subdirs if not d.startswith("."))
+        for name in sorted(files):
+            file_type = extensions.get(os.path.splitext(name)[1].lower())
+            if file_type and not name.startswith("."):
+                yield os.path.join(directory, name), file_type
+
+
+def load_manifest(path: str) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+    """
+    Read a manifest written by a previous run.
+
+    Returns:
+        Latest record per relative path, and the finished record per content hash
+    """
+    by_path, by_hash = {}, {}
+    if not os.path.exists(path):
+        return by_path, by_hash
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            by_path[record["path"]] = record
+            if record.get("status") in ("done", "duplicate"):
+                by_hash.setdefault(record["sha256"], record)
+    return by_path, by_hash
+
+
+def extract_document(client, data: bytes, file_type: str) -> List[Dict]:
+    """Run one document through extraction and category/date normalization"""
+    if file_type == "csv":
+        receipts = client._process_csv_file(data)
+    else:
+        receipts = [client.process_receipt(file_bytes=data, file_type=file_type)]
+    return [normalize_receipt(r) for r in receipts if not is_failed_extraction(r)]
+
+
+class Ingestion:
+    """Streams files through extraction and stores them in manifest-tracked batches"""
+
+    def __init__(self, root: str, manifest_path: str, workers: int, batch_size: int,
+                 dry_run: bool = False, retry_failed: bool = False):
+        self.root = root
+        self.manifest_path = manifest_path
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.retry_failed = retry_failed
+        self.stats = {"files": 0, "resumed": 0, "cache_hits": 0, "extracted": 0,
+                      "failed": 0, "transactions": 0}
+        self._pending: List[Tuple[Dict, List[Dict]]] = []
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from utils.together_client import TogetherClient
+            self._client = TogetherClient()
+        return self._client
+
+    def _write(self, records: List[Dict]):
+        if self.dry_run:
+            return  # a dry run must not mark files as ingested
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            for record in records:
+                record["finished_at"] = datetime.utcnow().isoformat()
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def _flush(self):
+        """Store pending receipts in one bulk insert, then checkpoint their files"""
+        if not self._pending:
+            return
+        receipts = [r for _, results in self._pending for r in results]
+        records = [record for record, _ in self._pending]
+        self._pending = []
+        try:
+            ids = [] if self.dry_run or not receipts else self._store(receipts)
+        except Exception as e:
+            print(f"Batch insert failed: {e}")
+            for record in records:
+                record.update(status="failed", error=f"Insert failed: {e}")
+            self.stats["failed"] += len(records)
+            self._write(records)
+            return
+        # One id (None when the receipt could not be stored) per receipt, in order
+        ids = iter(ids)
+        for record in records:
+            record["transaction_ids"] = [next(ids, None) for _ in range(record["transactions"])]
+            if self.dry_run:
+                continue
+            stored = sum(i is not None for i in record["transaction_ids"])
+            if stored < record["transactions"]:
+                # Nothing stored can be retried safely; a partial file is kept to avoid duplicates
+                record.update(status="failed" if not stored else "done",
+                              error=f"{record['transactions'] - stored} receipts could not be stored")
+                self.stats["failed"] += not stored
+            record["transactions"] = stored
+        self.stats["transactions"] += sum(r["transactions"] for r in records)
+        self._write(records)
+
+    def _store(self, receipts: List[Dict]) -> List[Optional[str]]:
+        from utils.snowflake_helpers import log_bulk_receipt_transactions
+        return log_bulk_receipt_transactions(receipts)
+
+    def _collect(self, record: Dict, future):
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"{record['path']}: extraction failed: {e}")
+            results, error = [], str(e)
+        else:
+            error = None if results else "No receipt could be extracted"
+        if error:
+            record.update(status="failed", error=error, transactions=0)
+            self.stats["failed"] += 1
+            self._write([record])
+            return
+        record.update(status="done", transactions=len(results))
+        self.stats["extracted"] += 1
+        self._pending.append((record, results))
+        if sum(len(r) for _, r in self._pending) >= self.batch_size:
+            self._flush()
+
+    def run(self, limit: Optional[int] = None) -> Dict:
+        by_path, by_hash = load_manifest(self.manifest_path)
+        seen_hashes = set(by_hash)
+        in_flight = {}
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for path, file_type in iter_documents(self.root, FILE_TYPES):
+                if limit is not None and self.stats["files"] >= limit:
+                    break
+                rel_path = os.path.relpath(path, self.root)
+                self.stats["files"] += 1
+
+                previous = by_path.get(rel_path)
+                if previous and (previous["status"] != "failed" or not self.retry_failed):
+                    self.stats["resumed"] += 1
+                    continue
+
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()
+                record = {"path": rel_path, "sha256": digest, "file_type": file_type}
+                if digest in seen_hashes:
+                    # Same content already ingested under another name: reuse, never re-log
+                    record.update(status="duplicate", transactions=0)
+                    self.stats["cache_hits"] += 1
+                    self._write([record])
+                    continue
+                seen_hashes.add(digest)
+
+                in_flight[pool.submit(extract_document, self.client, data, file_type)] = record
+                # Bound memory on large folders: keep at most two files per worker queued
+                while len(in_flight) >= self.workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._collect(in_flight.pop(future), future)
+
+            done, _ = wait(in_flight)
+            for future in done:
+                self._collect(in_flight.pop(future), future)
+        self._flush()
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        usage = self._client.usage_snapshot() if self._client is not None else {"total_tokens": 0, "requests": 0}
+        looked_up = self.stats["cache_hits"] + self.stats["extracted"] + self.stats["failed"]
+        self.stats.update(
+            elapsed_s=elapsed,
+            files_per_s=looked_up / elapsed,
+            tokens=usage["total_tokens"],
+            tokens_per_s=usage["total_tokens"] / elapsed,
+            llm_requests=usage["requests"],
+            cache_hit_rate=self.stats["cache_hits"] / looked_up if looked_up else 0.0
+        )
+        return self.stats
+
+
+def print_summary(stats: Dict, dry_run: bool):
+    print()
+    print(f"Files found:        {stats['files']}")
+    print(f"  resumed/skipped:  {stats['resumed']}")
+    print(f"  cache hits:       {stats['cache_hits']}")
+    print(f"  extracted:        {stats['extracted']}")
+    print(f"  failed:           {stats['failed']}")
+    stored = "would be stored" if dry_run else "stored"
+    print(f"Transactions {stored}: {stats['transactions']}")
+    print(f"Elapsed:            {stats['elapsed_s']:.1f}s")
+    print(f"Throughput:         {stats['files_per_s']:.2f} files/s, "
+          f"{stats['tokens_per_s']:.0f} tokens/s ({stats['tokens']} tokens, {stats['llm_requests']} requests)")
+    print(f"Cache hit rate:     {stats['cache_hit_rate']:.1%}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ingest a folder of receipts without the web UI")
+    parser.add_argument("directory", help="Folder to scan recursively (e.g. sample_receipts_data)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent extraction requests")
+    parser.add_argument("--batch-size", type=int, default=50, help="Transactions per bulk insert")
+    parser.add_argument("--manifest", help=f"Resume file (default: <directory>/{MANIFEST_NAME})")
+    parser.add_argument("--limit", type=int, help="Stop after this many files")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry files that failed previously")
+    parser.add_argument("--dry-run", action="store_true", help="Extract but do not write to the database")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"Not a directory: {args.directory}")
+    manifest = args.manifest or os.path.join(args.directory, MANIFEST_NAME)
+
+    ingestion = Ingestion(args.directory, manifest, args.workers, args.batch_size,
+                          dry_run=args.dry_run, retry_failed=args.retry_failed)
+    try:
+        stats = ingestion.run(limit=args.limit)
+    except KeyboardInterrupt:
+        print("\nInterrupted; finished files are recorded in the manifest and will be skipped next run")
+        return 130
+    print_summary(stats, args.dry_run)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
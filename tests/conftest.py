@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh local SQLite database, selected the way the CLI selects it"""
+    monkeypatch.setenv("FINAI_STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("FINAI_SQLITE_PATH", str(tmp_path / "finai.sqlite3"))
+    monkeypatch.setenv("FINAI_SEARCH_INDEX", str(tmp_path / "search.sqlite3"))
+    from utils.snowflake_conn import init_db
+    init_db()
+    return tmp_path
+
+
+@pytest.fixture
+def log_elsewhere(db):
+    """Log transactions from a separate process, as the ingestion CLI does"""
+    def log(*transactions):
+        script = ("import json, sys\n"
+                  "from utils.snowflake_conn import log_transaction\n"
+                  "for t in json.loads(sys.argv[1]):\n"
+                  "    log_transaction(t)\n")
+        subprocess.run([sys.executable, "-c", script, json.dumps(list(transactions))],
+                       cwd=ROOT, env={**os.environ, "PYTHONPATH": ROOT}, check=True, capture_output=True)
+    return log
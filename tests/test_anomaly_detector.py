@@ -0,0 +1,83 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import utils.anomaly_detector as anomaly_detector
+from utils.anomaly_detector import ExpenseAnomalyDetector, P2Quantile, RunningStats
+from utils.snowflake_conn import bulk_update_categories, log_transaction
+
+
+def test_running_stats_match_numpy_after_adds_and_removes():
+    values = [random.Random(7).uniform(1, 100) for _ in range(200)]
+    stats = RunningStats()
+    for x in values:
+        stats.add(x)
+    for x in values[:50]:
+        stats.remove(x)
+    assert stats.n == 150
+    assert stats.mean == pytest.approx(np.mean(values[50:]))
+    assert stats.std == pytest.approx(np.std(values[50:], ddof=1))
+
+
+def test_p2_quantile_tracks_the_90th_percentile():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(3, 0.5) for _ in range(5000)]
+    estimate = P2Quantile(0.9)
+    for x in values:
+        estimate.add(x)
+    assert estimate.count == 5000
+    assert estimate.value() == pytest.approx(np.quantile(values, 0.9), rel=0.05)
+
+
+def _history(days=30, amount=12.0, category="Meals", merchant="Diner"):
+    start = datetime(2025, 3, 1)
+    return [{"date": start + timedelta(days=i), "merchant": merchant, "category": category,
+             "amount": amount * (1 + 0.1 * math.sin(i))} for i in range(days)]
+
+
+def test_outlier_is_flagged_against_the_history_before_it():
+    detector = ExpenseAnomalyDetector()
+    detector.update_many(_history())
+    assert not detector.score({"date": "2025-04-01", "merchant": "Diner", "category": "Meals", "amount": 13.0})[
+        "is_anomaly"]
+    result = detector.update({"date": "2025-04-01", "merchant": "Diner", "category": "Meals", "amount": 400.0})
+    assert result["is_anomaly"]
+    assert any("Meals" in reason for reason in result["reasons"])
+    assert list(detector.recent_alerts()["amount"]) == [400.0]
+
+
+def test_unusual_days_need_enough_history():
+    detector = ExpenseAnomalyDetector()
+    detector.update_many(_history(days=3))
+    detector.update({"date": "2025-03-10", "merchant": "Diner", "category": "Meals", "amount": 500.0})
+    assert detector.unusual_days().empty
+    detector.update_many(_history(days=30))
+    detector.update({"date": "2025-05-10", "merchant": "Diner", "category": "Meals", "amount": 500.0})
+    assert datetime(2025, 5, 10).date() in detector.unusual_days().index
+
+
+def test_rows_written_by_another_process_are_scored(db, log_elsewhere, monkeypatch):
+    for t in _history():
+        log_transaction({**t, "date": t["date"].isoformat()})
+    detector = ExpenseAnomalyDetector()
+    detector.rebuild()
+    assert detector.recent_alerts().empty
+
+    log_elsewhere({"date": "2025-04-02T12:00:00", "merchant": "Diner", "category": "Meals", "amount": 400.0})
+    assert detector.recent_alerts().empty      # checked at most once a minute
+    monkeypatch.setattr(anomaly_detector, "RECONCILE_SECONDS", 0)
+    assert list(detector.recent_alerts()["amount"]) == [400.0]
+
+
+def test_category_fixes_move_rows_to_their_new_scope(db, monkeypatch):
+    ids = [log_transaction({**t, "date": t["date"].isoformat()}) for t in _history(category="Other")]
+    detector = ExpenseAnomalyDetector()
+    detector.rebuild()
+    bulk_update_categories([(tid, "Meals", 1.0) for tid in ids])
+    monkeypatch.setattr(anomaly_detector, "RECONCILE_SECONDS", 0)
+    detector.recent_alerts()
+    assert detector._scopes[("category", "Meals")].log_amount.n == len(ids)
+    assert ("category", "Other") not in detector._scopes
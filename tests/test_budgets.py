@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+import utils.budgets as budgets
+from utils.budgets import BudgetTracker, period_start
+from utils.snowflake_conn import log_transaction
+
+
+def _meal(amount, **extra):
+    return {"date": datetime.now().isoformat(), "merchant": "Diner", "amount": amount,
+            "category": "Meals", **extra}
+
+
+def test_period_start():
+    when = datetime(2025, 8, 14, 15, 30)
+    assert period_start("week", when) == datetime(2025, 8, 11)
+    assert period_start("month", when) == datetime(2025, 8, 1)
+    assert period_start("quarter", when) == datetime(2025, 7, 1)
+    assert period_start("year", when) == datetime(2025, 1, 1)
+    with pytest.raises(ValueError):
+        period_start("fortnight", when)
+
+
+def test_alerts_fire_once_per_threshold(db):
+    tracker = BudgetTracker().load()
+    tracker.set_budget("Meals", "month", 100.0)
+    assert tracker.observe([_meal(50.0, id="a")]) == []
+    first = tracker.observe([_meal(35.0, id="b")])
+    assert [(a["threshold"], a["transaction_id"]) for a in first] == [(0.8, "b")]
+    assert tracker.observe([_meal(1.0, id="c")]) == []
+    assert [a["threshold"] for a in tracker.observe([_meal(20.0, id="d")])] == [1.0]
+    assert tracker.usage("Meals") == pytest.approx(1.06)
+
+
+def test_back_dated_spend_is_not_this_period(db):
+    tracker = BudgetTracker().load()
+    tracker.set_budget("Meals", "month", 100.0)
+    tracker.observe([{**_meal(90.0), "date": "2001-01-05"}])
+    assert tracker.usage("Meals") == 0.0
+
+
+def test_rows_written_by_another_process_are_counted(db, log_elsewhere, monkeypatch):
+    tracker = BudgetTracker().load()
+    tracker.set_budget("Meals", "month", 100.0)
+    log_transaction(_meal(60.0))
+    tracker.observe([_meal(60.0)])
+    assert tracker.usage("Meals") == pytest.approx(0.6)
+
+    log_elsewhere(_meal(60.0))
+    monkeypatch.setattr(budgets, "RECONCILE_SECONDS", 0)
+    assert tracker.usage("Meals") == pytest.approx(1.2)
+    assert list(tracker.alerts()["threshold"]) == [1.0]
@@ -0,0 +1,16 @@
+from datetime import date
+
+import pandas as pd
+
+from utils.cashflow import expand_occurrences, recurring_streams
+
+
+def test_month_end_salary_keeps_the_last_day_after_a_short_month():
+    income = pd.DataFrame({
+        "date": ["2025-07-31", "2025-08-31", "2025-09-30"],
+        "source": "Acme", "category": "Salary", "recurrence": "monthly", "amount": 5000.0,
+    })
+    streams = recurring_streams(income, date(2025, 10, 5))
+    dates = expand_occurrences(streams, date(2025, 10, 5), date(2026, 3, 31))["date"].dt.date.tolist()
+    assert dates == [date(2025, 10, 31), date(2025, 11, 30), date(2025, 12, 31),
+                     date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)]
@@ -0,0 +1,107 @@
+import random
+
+import numpy as np
+import pytest
+
+import utils.category_classifier as category_classifier
+import utils.snowflake_conn as snowflake_conn
+from utils.category_classifier import CategoryClassifier, featurize, get_category_classifier
+from utils.snowflake_conn import bulk_log_transactions
+
+MERCHANTS = {
+    "Meals": ["Chipotle", "Pizza Hut", "Subway", "Olive Garden", "Taco Bell"],
+    "Travel": ["Delta Air Lines", "Hilton Hotels", "Hertz", "Amtrak", "Marriott"],
+    "Software": ["GitHub", "Atlassian", "JetBrains", "Adobe", "Slack"],
+    "Utilities": ["Con Edison", "Comcast", "PG&E", "Verizon", "Water Dept"],
+}
+DESCRIPTIONS = {
+    "Meals": ["lunch", "team dinner", "burrito bowl"],
+    "Travel": ["flight to Denver", "hotel stay", "car rental"],
+    "Software": ["monthly subscription", "annual license", "seat upgrade"],
+    "Utilities": ["electric bill", "internet service", "phone plan"],
+}
+
+
+def _examples(n=400, seed=1):
+    rng = random.Random(seed)
+    categories = list(MERCHANTS)
+    return [(rng.choice(MERCHANTS[c]), rng.choice(DESCRIPTIONS[c]), "", c)
+            for c in (rng.choice(categories) for _ in range(n))]
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "category_model.npz")
+    monkeypatch.setenv("FINAI_CATEGORY_MODEL", path)
+    return path
+
+
+def test_features_are_normalized_and_stable():
+    indices, values = featurize("Starbucks", "latte")
+    again, _ = featurize("Starbucks", "latte")
+    assert np.array_equal(indices, again)
+    assert np.linalg.norm(values) == pytest.approx(1.0)
+
+
+def test_too_few_examples_leave_the_model_untrained(model_path):
+    classifier = CategoryClassifier()
+    assert classifier.train(_examples(n=10)) == 0
+    assert not classifier.is_trained
+
+
+def test_trained_model_predicts_known_merchants_confidently(model_path):
+    classifier = CategoryClassifier()
+    assert classifier.train(_examples()) == 400
+    assert classifier.temperature >= 1.0        # calibration only ever softens
+    category, confidence = classifier.predict("Hilton Hotels", "hotel stay")
+    assert category == "Travel" and confidence > 0.8
+    _, unknown = classifier.predict("Zzyzx Holdings", "")
+    assert unknown < confidence
+
+
+def test_corrections_are_learned(model_path):
+    classifier = CategoryClassifier()
+    classifier.train(_examples())
+    assert classifier.predict("Blue Apron", "meal kit")[0] != "Software"
+    for _ in range(3):
+        classifier.learn([("Blue Apron", "meal kit", "", "Software")] * 5)
+    assert classifier.predict("Blue Apron", "meal kit")[0] == "Software"
+
+
+def test_save_and_load_round_trip(model_path):
+    classifier = CategoryClassifier()
+    classifier.train(_examples())
+    classifier.save()
+    loaded = CategoryClassifier()
+    assert loaded.load()
+    assert loaded.trained_rows == classifier.trained_rows
+    rows = [("GitHub", "annual license", ""), ("Comcast", "internet service", "")]
+    assert np.allclose(loaded.predict_proba(rows), classifier.predict_proba(rows), atol=1e-5)
+    assert not CategoryClassifier(classes=["Meals", "Other"]).load()
+
+
+def test_training_labels_are_reconciled_or_corrected_rows_only(db, model_path):
+    rows = [{"merchant": m, "description": d, "category": c, "amount": 5.0, "category_confidence": 0.99}
+            for m, d, _, c in _examples(n=60)]
+    ids = bulk_log_transactions(rows)
+    assert category_classifier._load_examples() == []       # confident, but only a model's guess
+    snowflake_conn.bulk_update_categories([(tid, r["category"], 1.0) for tid, r in zip(ids, rows)])
+    assert len(category_classifier._load_examples()) == 60
+
+
+def test_singleton_retries_until_it_can_train(tmp_path, model_path, monkeypatch):
+    monkeypatch.setattr(category_classifier, "_classifier", None)
+    monkeypatch.setattr(category_classifier, "_prepared_at", -float("inf"))
+    monkeypatch.setattr(snowflake_conn, "_category_listeners", [])
+    monkeypatch.setenv("FINAI_STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("FINAI_SQLITE_PATH", str(tmp_path / "finai.sqlite3"))
+    classifier = get_category_classifier()          # no transactions table yet
+    assert not classifier.is_trained
+
+    snowflake_conn.init_db()
+    bulk_log_transactions([{"merchant": m, "description": d, "category": c, "amount": 5.0, "is_reconciled": True}
+                           for m, d, _, c in _examples(n=60)])
+    assert get_category_classifier() is classifier and not classifier.is_trained    # within RETRY_SECONDS
+    monkeypatch.setattr(category_classifier, "RETRY_SECONDS", 0)
+    assert get_category_classifier() is classifier and classifier.trained_rows == 60
+    assert CategoryClassifier().load()
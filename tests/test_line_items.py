@@ -0,0 +1,50 @@
+import pytest
+
+from utils.line_items import get_top_items, get_transaction_line_items, get_unit_price_drift
+from utils.receipts import normalize_line_items
+from utils.snowflake_conn import bulk_log_transactions
+
+
+def _receipt(date, items):
+    return {"date": date, "merchant": "Grocer", "amount": sum(i["amount"] for i in items),
+            "category": "Groceries", "line_items": items}
+
+
+def test_normalize_drops_unusable_items_and_prices_units():
+    items = normalize_line_items([
+        {"description": "Milk", "quantity": 2, "amount": "5.00"},
+        {"description": "Bread", "amount": 3.0},
+        {"description": "", "amount": 1.0},
+        {"description": "Eggs", "amount": "n/a"},
+        {"description": "Apples", "quantity": -1, "amount": 2.0},
+        "Loose text",
+    ])
+    assert [(i["description"], i["quantity"], i["unit_price"]) for i in items] == [("Milk", 2.0, 2.5),
+                                                                                 ("Bread", 1.0, 3.0)]
+    assert normalize_line_items(None) == []
+
+
+def test_items_are_stored_with_their_transaction_and_aggregated(db):
+    ids = bulk_log_transactions([
+        _receipt("2025-01-05", [{"description": "Milk", "quantity": 2, "amount": 5.0},
+                                {"description": "Bread", "amount": 3.0}]),
+        _receipt("2025-03-05", [{"description": "MILK", "quantity": 1, "amount": 3.0}]),
+        _receipt("2025-06-05", [{"description": "Coffee beans", "amount": 18.0}]),
+    ])
+    assert list(get_transaction_line_items(ids[0])["description"]) == ["Milk", "Bread"]
+
+    top = get_top_items(by="spend")
+    assert list(top["total_spent"]) == [18.0, 8.0, 3.0]
+    milk = top.iloc[1]
+    assert (milk["purchases"], milk["quantity"]) == (2, 3.0)
+    assert list(get_top_items(by="quantity")["quantity"])[0] == 3.0
+
+    drift = get_unit_price_drift()
+    assert len(drift) == 1
+    assert (drift["first_unit_price"].iloc[0], drift["last_unit_price"].iloc[0]) == (2.5, 3.0)
+    assert drift["drift_pct"].iloc[0] == pytest.approx(20.0)
+
+
+def test_top_items_rejects_unknown_ordering():
+    with pytest.raises(ValueError):
+        get_top_items(by="colour")
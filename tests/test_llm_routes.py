@@ -0,0 +1,86 @@
+import json
+import os
+import time
+
+import pytest
+
+from utils.llm_routes import DEFAULT_ROUTES, LEGACY_MODEL, SMALL_MODEL, RouteTable
+from utils.llm_transport import LLMTransport, LLMTransportError, _response_from_payload
+from utils.together_client import TogetherClient
+
+
+class ScriptedTransport(LLMTransport):
+    """Answers per model: a string is the reply, a number of seconds is a hang ending in a timeout"""
+
+    name = "scripted"
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.calls = []
+
+    def create(self, timeout=None, **request):
+        self.calls.append((request["model"], timeout))
+        outcome = self.behaviour[request["model"]]
+        if isinstance(outcome, str):
+            return _response_from_payload({"model": request["model"],
+                                           "choices": [{"message": {"content": outcome}}],
+                                           "usage": {"prompt_tokens": 3, "completion_tokens": 2}})
+        time.sleep(min(outcome, timeout))
+        raise LLMTransportError(f"{request['model']} timed out after {timeout:.2f}s")
+
+
+def _client(tmp_path, overrides, behaviour):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps(overrides))
+    return TogetherClient(transport=ScriptedTransport(behaviour), routes=RouteTable(str(path)))
+
+
+def test_defaults_without_an_override_file():
+    table = RouteTable(path="")
+    assert table.route("extract") == DEFAULT_ROUTES["extract"]
+    assert table.models("extract") == [SMALL_MODEL, LEGACY_MODEL]
+    with pytest.raises(ValueError):
+        table.route("categorize")       # categories come from the local classifier
+
+
+def test_overrides_merge_and_reload_when_the_file_changes(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"extract": {"timeout": 5}}))
+    table = RouteTable(str(path))
+    assert table.route("extract")["timeout"] == 5
+    assert table.route("extract")["model"] == SMALL_MODEL
+
+    path.write_text(json.dumps({"extract": {"model": LEGACY_MODEL, "fallbacks": [LEGACY_MODEL, SMALL_MODEL]}}))
+    os.utime(path, (time.time() + 5, time.time() + 5))
+    assert table.models("extract") == [LEGACY_MODEL, SMALL_MODEL]
+
+
+def test_override_without_a_model_is_ignored(tmp_path, capsys):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"summarize": {"timeout": 5}}))
+    table = RouteTable(str(path))
+    assert "without a model" in capsys.readouterr().out
+    with pytest.raises(ValueError):
+        table.route("summarize")
+
+
+def test_timed_out_model_falls_back_within_the_route_budget(tmp_path):
+    client = _client(tmp_path, {"advise": {"model": "slow", "fallbacks": ["fast"], "timeout": 1.0}},
+                     {"slow": 0.3, "fast": "Keep receipts."})
+    assert client.generate_text("Any tips?") == "Keep receipts."
+    (first, first_budget), (second, second_budget) = client.transport.calls
+    assert (first, second) == ("slow", "fast")
+    assert first_budget == pytest.approx(1.0, abs=0.05)
+    assert second_budget == pytest.approx(0.7, abs=0.1)     # what the slow attempt left
+    assert client.usage_snapshot()["requests"] == 1
+
+    latency = client.routes.latency().set_index("model")
+    assert (latency.loc["slow", "errors"], latency.loc["fast", "errors"]) == (1, 0)
+    assert latency.loc["slow", "p50_ms"] >= 300
+
+
+def test_route_gives_up_when_its_budget_is_spent(tmp_path):
+    client = _client(tmp_path, {"risk-json": {"model": "slow", "fallbacks": ["fast"], "timeout": 0.2}},
+                     {"slow": 5.0, "fast": "{}"})
+    assert client.generate_json("Score this") == {}
+    assert [model for model, _ in client.transport.calls] == ["slow"]
@@ -0,0 +1,27 @@
+import pytest
+
+from utils.merchants import MATCH_THRESHOLD, normalize_merchant, token_set_similarity
+
+
+def _score(a: str, b: str) -> float:
+    return token_set_similarity(normalize_merchant(a), normalize_merchant(b))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Starbucks Coffee", "STARBUCKS #1234"),
+    ("Walmart Supercenter", "Walmart"),
+    ("Amazon.com", "Amazon"),
+    ("Whole Foods Market", "Whole Foods"),
+])
+def test_descriptor_variants_match(a, b):
+    assert _score(a, b) == 1.0
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Uber Eats", "Uber"),
+    ("Amazon Web Services", "Amazon"),
+    ("Target Optical", "Target"),
+    ("Blue Bottle Coffee", "Coffee"),
+])
+def test_distinct_businesses_sharing_a_brand_word_do_not_match(a, b):
+    assert _score(a, b) < MATCH_THRESHOLD
@@ -0,0 +1,22 @@
+from utils.prompt_compaction import compact_receipt_text
+
+FILLER = [f"Aisle {i} display shelving and seasonal layout notes for staff" for i in range(40)]
+
+
+def test_amounts_without_thousands_separator_are_kept():
+    text = "\n".join(["Home Store", "12 Main St", "2025-03-04"] + FILLER +
+                     ["Sofa 1899.00", "Rent 2500.00", "Deposit 12345.00", "TOTAL 16744.00"])
+    compacted = compact_receipt_text(text, window_min_tokens=50)
+    for line in ("Sofa 1899.00", "Rent 2500.00", "Deposit 12345.00", "TOTAL 16744.00"):
+        assert line in compacted
+    assert FILLER[10] not in compacted
+
+
+def test_discount_lines_with_amounts_survive_boilerplate_filter():
+    text = "\n".join(["Home Store", "Lamp 80.00", "Promo discount -50.00", "Coupon savings -5.00",
+                      "Use coupon SAVE10 next visit", "Visit www.homestore.example", "TOTAL 25.00"])
+    compacted = compact_receipt_text(text)
+    assert "Promo discount -50.00" in compacted
+    assert "Coupon savings -5.00" in compacted
+    assert "Use coupon SAVE10 next visit" not in compacted
+    assert "www.homestore.example" not in compacted
@@ -0,0 +1,71 @@
+import pytest
+
+import utils.search_index as search_index
+from utils.search_index import FuzzyVocabulary, SearchIndex, edit_distance, tokenize
+from utils.snowflake_conn import log_transaction
+
+
+def _doc(tid, merchant, description="", items="", amount=10.0):
+    return {"id": tid, "date": "2025-05-01", "merchant": merchant, "description": description,
+            "items": items, "amount": amount}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite3"))
+    index._last_catch_up = float("inf")     # only the rows a test adds
+    index.add_transactions([
+        _doc("1", "Starbucks", "Morning coffee"),
+        _doc("2", "Blue Bottle", "Coffee beans", items="Ethiopia whole bean"),
+        _doc("3", "Shell", "Fuel", items="Unleaded 95"),
+        _doc("4", "Star Market", "Groceries", items="Milk bread"),
+    ])
+    return index
+
+
+def test_tokenize_and_edit_distance():
+    assert tokenize("STARBUCKS #1234, Main-St") == ["starbucks", "1234", "main", "st"]
+    assert edit_distance("starbuks", "starbucks") == 1
+    assert edit_distance("starbcuks", "starbucks") == 1     # transposition
+    assert edit_distance("coffee", "toffees") == 2
+
+
+def test_fuzzy_vocabulary_finds_words_one_edit_away():
+    vocabulary = FuzzyVocabulary()
+    for term in ("starbucks", "market", "marker", "fuel", "1234"):
+        vocabulary.add(term)
+    assert vocabulary.lookup("starbuks") == ["starbucks"]
+    assert vocabulary.lookup("marke") == ["marker", "market"]
+    assert vocabulary.lookup("1235") == []      # numbers never match fuzzily
+
+
+def test_prefix_terms_match_and_merchant_ranks_first(index):
+    assert set(index.search("star", fuzzy=False)["id"]) == {"1", "4"}
+    assert set(index.search("coffee")["id"]) == {"1", "2"}
+    assert list(index.search("blue coffee")["id"]) == ["2"]
+    index.add_transactions([_doc("9", "Coffee Republic", "Sandwich")])
+    assert index.search("coffee")["id"].iloc[0] == "9"      # merchant matches weigh most
+    assert "[Unleaded]" in index.search("unleaded")["snippet"].iloc[0]
+
+
+def test_misspelled_terms_match_only_when_fuzzy(index):
+    assert list(index.search("starbuks")["id"]) == ["1"]
+    assert index.search("starbuks", fuzzy=False).empty
+
+
+def test_already_indexed_ids_are_skipped(index):
+    assert index.add_transactions([_doc("1", "Starbucks"), _doc("5", "Target")]) == 1
+    assert len(index) == 5
+
+
+def test_rows_written_by_another_process_are_caught_up(db, log_elsewhere, monkeypatch):
+    index = SearchIndex()
+    log_transaction({"merchant": "Zebra Cafe", "amount": 4.0})
+    index.catch_up(force=True)
+    log_elsewhere({"merchant": "Quokka Books", "amount": 12.0})
+    assert index.search("quokka").empty            # caught up at most once a minute
+
+    monkeypatch.setattr(search_index, "CATCH_UP_INTERVAL", 0)
+    index.search("quokka")                         # starts the catch-up without waiting on it
+    index._catch_up_thread.join()
+    assert list(index.search("quokka")["merchant"]) == ["Quokka Books"]
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.tax_engine as tax_engine
+from utils.snowflake_conn import log_transaction
+from utils.tax_engine import DEFAULT_TAX_YEARS, bracket_tax, load_tax_tables, marginal_rate, quarterly_schedule
+
+TABLE_2025 = DEFAULT_TAX_YEARS[2025]
+
+
+def _income(dates, amounts):
+    return pd.DataFrame({"date": pd.to_datetime(dates), "type": "income", "amount": amounts,
+                         "category": "Salary", "is_taxable": True})
+
+
+def test_bracket_tax_fills_each_bracket_in_turn():
+    # 10% of the first 11,925, then 12% up to 48,475, then 22% of the rest
+    expected = 11925 * 0.10 + (48475 - 11925) * 0.12 + (60000 - 48475) * 0.22
+    assert bracket_tax([0, 11925, 60000], TABLE_2025) == pytest.approx([0.0, 1192.5, expected])
+    assert marginal_rate(60000, TABLE_2025) == 0.22
+    assert marginal_rate(0, TABLE_2025) == 0.10
+
+
+def test_even_income_pays_even_installments():
+    months = pd.date_range("2025-01-01", periods=12, freq="MS") + pd.Timedelta(days=14)
+    schedule = quarterly_schedule(_income(months, [6000.0] * 12), 2025, load_tax_tables())
+    annual = bracket_tax(72000 - TABLE_2025["standard_deduction"], TABLE_2025)[0]
+    assert schedule["installment"].sum() == pytest.approx(annual)
+    assert np.all(np.diff(schedule["cumulative_due"]) >= 0)
+
+
+def test_front_loaded_income_never_schedules_more_than_the_annual_tax():
+    schedule = quarterly_schedule(_income(["2025-01-15", "2025-02-15"], [60000.0, 60000.0]),
+                                  2025, load_tax_tables())
+    annual = bracket_tax(120000 - TABLE_2025["standard_deduction"], TABLE_2025)[0]
+    assert schedule["installment"].tolist() == pytest.approx([annual / 4] * 4)
+
+
+def test_late_income_is_due_in_the_quarter_it_arrives():
+    schedule = quarterly_schedule(_income(["2025-11-15"], [120000.0]), 2025, load_tax_tables())
+    assert schedule["installment"].tolist()[:3] == [0.0, 0.0, 0.0]
+    assert schedule["installment"].iloc[3] > 0
+
+
+def test_report_sees_rows_written_by_another_process(db, log_elsewhere, monkeypatch):
+    tax_engine._report_cache.clear()
+    log_transaction({"date": datetime.now().isoformat(), "merchant": "Diner", "amount": 60.0, "category": "Meals"})
+    assert tax_engine.tax_report()["summary"]["expenses"] == pytest.approx(60.0)
+
+    log_elsewhere({"date": datetime.now().isoformat(), "merchant": "Diner", "amount": 60.0, "category": "Meals"})
+    assert tax_engine.tax_report()["summary"]["expenses"] == pytest.approx(60.0)    # within the TTL
+    monkeypatch.setattr(tax_engine, "REPORT_TTL", 0)
+    assert tax_engine.tax_report()["summary"]["expenses"] == pytest.approx(120.0)
@@ -0,0 +1,168 @@
+import threading
+from datetime import datetime, date, time, timedelta
+from typing import Any, Callable, Dict, Hashable, Optional
+from zoneinfo import ZoneInfo
+
+try:
+    import holidays
+except ImportError:  # Optional: weekends are still skipped without it
+    holidays = None
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_CLOSE = time(16, 0)
+
+
+def _is_trading_day(day: date) -> bool:
+    """Check whether the exchange is open on the given day"""
+    if day.weekday() >= 5:
+        return False
+    if holidays is not None:
+        try:
+            return day not in holidays.financial_holidays("NYSE", years=day.year)
+        except Exception:
+            return True
+    return True
+
+
+def market_session(now: Optional[datetime] = None) -> date:
+    """
+    Get the trading session an analysis generated at `now` belongs to.
+
+    Before the close the session is today; after the close (or on a
+    non-trading day) it is the next trading day.
+    """
+    now = now.astimezone(MARKET_TZ) if now else datetime.now(MARKET_TZ)
+    day = now.date()
+    if _is_trading_day(day) and now.time() < MARKET_CLOSE:
+        return day
+    day += timedelta(days=1)
+    while not _is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def next_market_close(now: Optional[datetime] = None) -> datetime:
+    """Get the close of the current session as an aware datetime"""
+    return datetime.combine(market_session(now), MARKET_CLOSE, tzinfo=MARKET_TZ)
+
+
+class _InFlight:
+    """A computation that other callers for the same key can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.completed = False
+
+
+class SingleFlightCache:
+    """
+    Thread-safe TTL cache where concurrent misses for one key share a
+    single computation instead of each calling the backend.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, tuple] = {}  # key -> (value, expires_at)
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any],
+                       expires_at: datetime,
+                       cache_if: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached value for `key`, computing it at most once.
+
+        Args:
+            key: Hashable cache key
+            compute: Zero-argument callable producing the value
+            expires_at: Aware datetime after which the value is stale
+            cache_if: Optional predicate; values failing it are returned
+                but not stored (e.g. empty responses from a failed call)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > datetime.now(entry[1].tzinfo):
+                self.hits += 1
+                return entry[0]
+            flight = self._in_flight.get(key)
+            owner = flight is None
+            if owner:
+                flight = _InFlight()
+                self._in_flight[key] = flight
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if not flight.completed:
+                # The owner was interrupted (e.g. a Streamlit rerun); compute it here instead
+                return self.get_or_compute(key, compute, expires_at, cache_if)
+            return flight.value
+
+        try:
+            flight.value = compute()
+            flight.completed = True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            # Rerun/stop exceptions are BaseExceptions: the key must be released whatever happened
+            try:
+                if flight.completed and self._should_cache(cache_if, flight.value):
+                    with self._lock:
+                        self._evict_expired()
+                        self._entries[key] = (flight.value, expires_at)
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+                flight.done.set()
+        return flight.value
+
+    @staticmethod
+    def _should_cache(cache_if: Optional[Callable[[Any], bool]], value: Any) -> bool:
+        if cache_if is None:
+            return True
+        try:
+            return bool(cache_if(value))
+        except Exception as e:
+            print(f"Cache predicate failed: {e}")
+            return False
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh cached value without computing it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > datetime.now(entry[1].tzinfo):
+                return entry[0]
+        return None
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one key, or everything when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and current size"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries), "in_flight": len(self._in_flight)}
+
+    def _evict_expired(self):
+        """Drop stale entries, then the soonest-expiring ones if still full"""
+        if len(self._entries) < self.max_entries:
+            return
+        now = datetime.now(MARKET_TZ)
+        for k in [k for k, (_, exp) in self._entries.items() if exp <= now]:
+            del self._entries[k]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[min(self._entries, key=lambda k: self._entries[k][1])]
@@ -0,0 +1,327 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from utils.snowflake_conn import (
+    get_conn,
+    get_transactions_as_dataframe,
+    register_transaction_listener,
+    transactions_marker,
+)
+
+Z_THRESHOLD = 2.5          # log-amount z-score that counts as unusual
+DAILY_Z_THRESHOLD = 2.0    # mean + 2 sigma, as the old daily rule
+MIN_OBSERVATIONS = 5       # a scope needs this much history before it can flag
+MAX_ALERTS = 500
+MAX_TRACKED_DAYS = 400
+BOOTSTRAP_ROWS = 10000
+RECONCILE_SECONDS = 60     # how often reads check for rows written by other processes
+
+
+class RunningStats:
+    """Welford mean/variance with O(1) add and remove"""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x: float):
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = x - self.mean
+        self.n -= 1
+        self.mean -= delta / self.n
+        self.m2 = max(self.m2 - delta * (x - self.mean), 0.0)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def zscore(self, x: float) -> float:
+        std = self.std
+        return (x - self.mean) / std if std > 0 else 0.0
+
+
+class P2Quantile:
+    """Streaming quantile estimate (Jain & Chlamtac P-squared), O(1) memory"""
+
+    __slots__ = ("p", "heights", "positions", "desired", "increments", "_initial")
+
+    def __init__(self, p: float = 0.9):
+        self.p = p
+        self._initial: List[float] = []
+        self.heights: List[float] = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        if len(self._initial) < 5:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                self.heights = sorted(self._initial)
+            return
+
+        q, n = self.heights, self.positions
+        if x < q[0]:
+            q[0], k = x, 0
+        elif x >= q[4]:
+            q[4], k = x, 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidate
+                n[i] += d
+
+    @property
+    def count(self) -> int:
+        return len(self._initial) if len(self._initial) < 5 else self.positions[4] + 1
+
+    def value(self) -> Optional[float]:
+        if len(self._initial) < 5:
+            if not self._initial:
+                return None
+            ordered = sorted(self._initial)
+            return ordered[min(int(self.p * len(ordered)), len(ordered) - 1)]
+        return self.heights[2]
+
+
+class _ScopeStats:
+    """Running statistics for one category, merchant or season"""
+
+    __slots__ = ("log_amount", "p90")
+
+    def __init__(self):
+        self.log_amount = RunningStats()
+        self.p90 = P2Quantile(0.9)
+
+    def add(self, amount: float):
+        self.log_amount.add(math.log1p(amount))
+        self.p90.add(amount)
+
+
+def _normalize_merchant(merchant) -> str:
+    return " ".join(str(merchant or "").lower().split())
+
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return pd.Timestamp(value).date()
+    except Exception:
+        return datetime.utcnow().date()
+
+
+class ExpenseAnomalyDetector:
+    """
+    Incremental expense anomaly detector.
+
+    Keeps per-category, per-merchant and per-category-and-month running
+    statistics (Welford on log amounts plus a P-squared 90th percentile)
+    and running daily totals. Every new transaction is scored against
+    the history before it in O(1), then folded in; anomalies are kept in
+    a bounded alert log so the dashboard never rescans transactions.
+
+    Writes the listener does not see (other processes, category fixes)
+    move the transactions row count or latest update; reads check that
+    once a minute and replay the recent history when it changed.
+    """
+
+    def __init__(self):
+        self._scopes: Dict[tuple, _ScopeStats] = {}
+        self._daily_totals: "OrderedDict[date, float]" = OrderedDict()
+        self._daily_stats = RunningStats()
+        self._alerts: deque = deque(maxlen=MAX_ALERTS)
+        self._lock = threading.Lock()
+        self.observed = 0
+        self._seen_marker = None
+        self._reconciled_at = 0.0
+
+    def _scope_keys(self, txn: Dict, day: date) -> List[tuple]:
+        category = txn.get("category") or "Other"
+        keys = [("category", category), ("season", category, day.month)]
+        merchant = _normalize_merchant(txn.get("merchant"))
+        if merchant:
+            keys.append(("merchant", merchant))
+        return keys
+
+    def score(self, txn: Dict) -> Dict:
+        """Score a transaction against current statistics without recording it"""
+        with self._lock:
+            return self._score(txn, _to_date(txn.get("date")))
+
+    def _score(self, txn: Dict, day: date) -> Dict:
+        amount = abs(float(txn.get("amount", 0.0) or 0.0))
+        log_amount = math.log1p(amount)
+        reasons, score = [], 0.0
+        for key in self._scope_keys(txn, day):
+            stats = self._scopes.get(key)
+            if stats is None or stats.log_amount.n < MIN_OBSERVATIONS:
+                continue
+            z = stats.log_amount.zscore(log_amount)
+            score = max(score, z)
+            label = key[1] if key[0] != "season" else f"{key[1]} in {day:%B}"
+            if z >= Z_THRESHOLD:
+                reasons.append(f"{z:.1f}σ above typical {label} spend")
+            p90 = stats.p90.value()
+            if key[0] == "category" and p90 is not None and amount > p90:
+                reasons.append(f"top 10% of {label} transactions")
+        return {"amount": amount, "score": score, "reasons": reasons,
+                "is_anomaly": score >= Z_THRESHOLD}
+
+    def update(self, txn: Dict) -> Dict:
+        """Score a new transaction, fold it into the statistics and log alerts"""
+        day = _to_date(txn.get("date"))
+        with self._lock:
+            result = self._score(txn, day)
+            for key in self._scope_keys(txn, day):
+                self._scopes.setdefault(key, _ScopeStats()).add(result["amount"])
+            self._add_to_day(day, result["amount"])
+            self.observed += 1
+            if result["is_anomaly"]:
+                self._alerts.append({
+                    "date": day,
+                    "merchant": txn.get("merchant", ""),
+                    "category": txn.get("category", "Other"),
+                    "amount": result["amount"],
+                    "score": round(result["score"], 2),
+                    "reasons": "; ".join(result["reasons"])
+                })
+        return result
+
+    def update_many(self, transactions: Iterable[Dict]):
+        transactions = list(transactions)
+        for txn in transactions:
+            self.update(txn)
+        with self._lock:
+            if self._seen_marker is not None:
+                rows, last_updated = self._seen_marker
+                self._seen_marker = (rows + len(transactions), last_updated)
+
+    def rebuild(self) -> int:
+        """Replace the statistics and alerts with a replay of the latest BOOTSTRAP_ROWS transactions"""
+        with get_conn() as conn:
+            marker = transactions_marker(conn.cursor())
+        fresh = ExpenseAnomalyDetector()
+        history = get_transactions_as_dataframe(BOOTSTRAP_ROWS)
+        if not history.empty:
+            history = history.sort_values("date")
+            fresh.update_many(history[["date", "merchant", "category", "amount"]].to_dict("records"))
+        with self._lock:
+            self._scopes, self._daily_totals = fresh._scopes, fresh._daily_totals
+            self._daily_stats, self._alerts, self.observed = fresh._daily_stats, fresh._alerts, fresh.observed
+            self._seen_marker = marker
+            self._reconciled_at = time.monotonic()
+        return fresh.observed
+
+    def reconcile(self) -> bool:
+        """Rebuild when the transactions table changed without this process; returns whether it did"""
+        with self._lock:
+            self._reconciled_at = time.monotonic()
+            seen = self._seen_marker
+        with get_conn() as conn:
+            marker = transactions_marker(conn.cursor())
+        if marker == seen:
+            return False
+        self.rebuild()
+        return True
+
+    def _current(self):
+        if time.monotonic() - self._reconciled_at >= RECONCILE_SECONDS:
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"Reconciling anomaly statistics failed: {e}")
+
+    def _add_to_day(self, day: date, amount: float):
+        """Replace the day's total in the running daily statistics"""
+        previous = self._daily_totals.get(day)
+        if previous is not None:
+            self._daily_stats.remove(previous)
+        total = (previous or 0.0) + amount
+        self._daily_totals[day] = total
+        self._daily_stats.add(total)
+        if len(self._daily_totals) > MAX_TRACKED_DAYS:
+            oldest = min(self._daily_totals)
+            self._daily_stats.remove(self._daily_totals.pop(oldest))
+
+    def recent_alerts(self, start=None, end=None) -> pd.DataFrame:
+        """Alerts raised at write time, optionally limited to a date range"""
+        self._current()
+        with self._lock:
+            alerts = list(self._alerts)
+        df = pd.DataFrame(alerts, columns=["date", "merchant", "category", "amount", "score", "reasons"])
+        if start is not None:
+            df = df[df["date"] >= _to_date(start)]
+        if end is not None:
+            df = df[df["date"] <= _to_date(end)]
+        return df.sort_values("score", ascending=False)
+
+    def unusual_days(self, start=None, end=None) -> pd.Series:
+        """Days whose total spend exceeds mean + 2σ of tracked daily totals"""
+        self._current()
+        with self._lock:
+            threshold = self._daily_stats.mean + DAILY_Z_THRESHOLD * self._daily_stats.std
+            days = {d: t for d, t in self._daily_totals.items()
+                    if t > threshold and self._daily_stats.n >= MIN_OBSERVATIONS}
+        series = pd.Series(days, dtype="float64").sort_index()
+        if start is not None:
+            series = series[series.index >= _to_date(start)]
+        if end is not None:
+            series = series[series.index <= _to_date(end)]
+        return series
+
+
+_detector: Optional[ExpenseAnomalyDetector] = None
+_detector_lock = threading.Lock()
+
+
+def get_anomaly_detector() -> ExpenseAnomalyDetector:
+    """
+    Process-wide detector, bootstrapped from history and then kept current
+    by the transaction insert listener and the periodic reconcile. Get it
+    before logging transactions so every write is scored.
+    """
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            detector = ExpenseAnomalyDetector()
+            try:
+                detector.rebuild()
+            except Exception as e:
+                print(f"Loading anomaly history failed: {e}")
+            register_transaction_listener(detector.update_many)
+            _detector = detector
+        return _detector
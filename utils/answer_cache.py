@@ -0,0 +1,134 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "for", "of", "to", "in", "on", "my", "i",
+    "is", "are", "do", "does", "can", "what", "how", "should", "with", "by",
+    "me", "it", "be", "as", "at", "from", "that", "this", "which", "any",
+}
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, strip punctuation and collapse whitespace"""
+    return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+
+def _stem(word: str) -> str:
+    """Very light suffix stripping so 'deductions' matches 'deduction'"""
+    for suffix in ("ing", "ions", "ion", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def _terms(normalized: str) -> Counter:
+    """Unigram and bigram term counts for a normalized question"""
+    words = [_stem(w) for w in normalized.split() if w not in _STOPWORDS]
+    terms = Counter(words)
+    terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return terms
+
+
+class SemanticAnswerCache:
+    """
+    Two-tier answer cache for LLM Q&A.
+
+    Tier 1 is an exact match on the normalized question. Tier 2 compares
+    TF-IDF vectors (stemmed unigrams + bigrams) by cosine similarity and
+    returns the closest stored answer above `similarity_threshold`.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.7, max_entries: int = 1000):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self._answers: "OrderedDict[str, str]" = OrderedDict()
+        self._terms: Dict[str, Counter] = {}
+        self._doc_freq: Counter = Counter()
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0}
+
+    def lookup(self, question: str) -> Optional[Tuple[str, str, float]]:
+        """
+        Find a cached answer for a question.
+
+        Returns:
+            (answer, tier, similarity) where tier is 'exact' or 'similar',
+            or None on a miss
+        """
+        key = normalize_question(question)
+        with self._lock:
+            if key in self._answers:
+                self._answers.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return self._answers[key], "exact", 1.0
+
+            best_key, best_score = self._most_similar(_terms(key))
+            if best_key is not None and best_score >= self.similarity_threshold:
+                self._answers.move_to_end(best_key)
+                self.stats["similar_hits"] += 1
+                return self._answers[best_key], "similar", best_score
+
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, question: str, answer: str):
+        """Cache an answer; empty answers (failed calls) are ignored"""
+        if not answer:
+            return
+        key = normalize_question(question)
+        with self._lock:
+            if key not in self._answers:
+                terms = _terms(key)
+                self._terms[key] = terms
+                self._doc_freq.update(terms.keys())
+            self._answers[key] = answer
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.max_entries:
+                old_key, _ = self._answers.popitem(last=False)
+                self._doc_freq.subtract(self._terms.pop(old_key).keys())
+
+    def __contains__(self, question: str) -> bool:
+        return normalize_question(question) in self._answers
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def _vector(self, terms: Counter) -> Tuple[Dict[str, float], float]:
+        """TF-IDF weights and L2 norm against the current corpus"""
+        n_docs = len(self._answers) + 1
+        weights = {
+            term: (1 + math.log(count)) * (math.log((1 + n_docs) / (1 + self._doc_freq[term])) + 1)
+            for term, count in terms.items()
+        }
+        return weights, math.sqrt(sum(w * w for w in weights.values()))
+
+    def _most_similar(self, query_terms: Counter) -> Tuple[Optional[str], float]:
+        """Cosine-nearest stored question; caller holds the lock"""
+        if not query_terms or not self._answers:
+            return None, 0.0
+        query, query_norm = self._vector(query_terms)
+        best_key, best_score = None, 0.0
+        for key, terms in self._terms.items():
+            if not query.keys() & terms.keys():
+                continue
+            doc, doc_norm = self._vector(terms)
+            score = sum(w * doc.get(t, 0.0) for t, w in query.items()) / (query_norm * doc_norm)
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
+
+    def warm(self, questions: List[str], answer_fn) -> int:
+        """Answer and store every question not already cached"""
+        warmed = 0
+        for question in questions:
+            if question in self:
+                continue
+            try:
+                self.store(question, answer_fn(question))
+                warmed += 1
+            except Exception as e:
+                print(f"Answer cache warm-up failed for '{question}': {e}")
+        return warmed
@@ -0,0 +1,330 @@
+"""
+Category budgets with running period-to-date spend.
+
+A budget is a spending limit for one category over a week, month,
+quarter or year (budgets table). Spend for the current period of every
+budget is kept as a counter (budget_spend table) that the transaction
+insert listener increments, so "how much of the Meals budget is used" is
+a dict lookup. A write that takes spend past one of ALERT_THRESHOLDS
+raises an alert at write time (once per threshold and period), stored in
+budget_alerts with the transaction that crossed it.
+
+Writes the listener does not see (category fixes, bulk uploads) change
+the transactions generation; the next read then recounts the current
+periods with one aggregate query. Rows written by other processes (the
+ingestion CLI) leave the generation alone, so reads also compare the
+transactions table's row count and latest update with what the tracker
+has seen once a minute, and recount when they differ. A recount raises
+the alerts for thresholds it finds crossed.
+"""
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.receipts import PREDEFINED_CATEGORIES
+from utils.snowflake_conn import data_generation, get_conn, register_transaction_listener, transactions_marker
+from utils.tracing import traced
+
+PERIODS = ('week', 'month', 'quarter', 'year')
+ALERT_THRESHOLDS = (0.8, 1.0)
+MAX_ALERTS = 200
+RECONCILE_SECONDS = 60      # how often reads check for rows written by other processes
+
+STATUS_COLUMNS = ['category', 'period', 'period_start', 'amount_limit', 'spent', 'remaining', 'used_pct']
+ALERT_COLUMNS = ['id', 'category', 'period', 'period_start', 'threshold', 'spent', 'amount_limit',
+                 'transaction_id', 'created_at']
+
+
+def period_start(period: str, when: datetime) -> datetime:
+    """Start (midnight) of the week, month, quarter or year containing `when`"""
+    day = datetime(when.year, when.month, when.day)
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'quarter':
+        return day.replace(month=3 * ((day.month - 1) // 3) + 1, day=1)
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"period must be one of {PERIODS}")
+
+
+def _to_datetime(value) -> datetime:
+    try:
+        return pd.Timestamp(value).to_pydatetime() if value is not None else datetime.now()
+    except Exception:
+        return datetime.now()
+
+
+class BudgetTracker:
+    """
+    Budgets and their current-period spend, kept in memory and mirrored to
+    the budget_spend table on every change.
+    """
+
+    def __init__(self):
+        self._limits: Dict[Tuple[str, str], float] = {}
+        self._spent: Dict[Tuple[str, str], Tuple[datetime, float]] = {}   # -> (period start, spent)
+        self._raised = set()                   # (category, period, period start, threshold)
+        self._alerts: deque = deque(maxlen=MAX_ALERTS)
+        self._seen_generation = None
+        self._seen_marker: Optional[Tuple[int, object]] = None   # (row count, latest last_updated)
+        self._reconciled_at = 0.0
+        self._lock = threading.RLock()
+
+    @traced("db.load_budgets")
+    def load(self, now: Optional[datetime] = None) -> "BudgetTracker":
+        """Read budgets and this period's alerts, then recount current spend"""
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT category, period, amount_limit FROM budgets")
+            limits = {(c, p): float(limit) for c, p, limit in cursor.fetchall()}
+            cursor.execute(f"SELECT {', '.join(ALERT_COLUMNS)} FROM budget_alerts ORDER BY created_at")
+            alerts = [dict(zip(ALERT_COLUMNS, row)) for row in cursor.fetchall()]
+        with self._lock:
+            self._limits = limits
+            for alert in alerts[-MAX_ALERTS:]:
+                alert['period_start'] = _to_datetime(alert['period_start'])
+                self._alerts.append(alert)
+                self._raised.add((alert['category'], alert['period'], alert['period_start'], alert['threshold']))
+        self.recount(now=now)
+        return self
+
+    @traced("db.recount_budget_spend")
+    def recount(self, keys: Optional[Iterable[Tuple[str, str]]] = None, now: Optional[datetime] = None):
+        """
+        Recompute current-period spend from transactions, one query per
+        period length, and raise alerts for thresholds the new totals cross
+        """
+        now = now or datetime.now()
+        with self._lock:
+            every_key = keys is None
+            keys = list(keys or self._limits)
+            generation = data_generation("transactions")
+        by_period: Dict[str, List[str]] = {}
+        for category, period in keys:
+            by_period.setdefault(period, []).append(category)
+
+        counters = {}
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            marker = transactions_marker(cursor)
+            for period, categories in by_period.items():
+                start = period_start(period, now)
+                cursor.execute(f"""
+                    SELECT category, SUM(ABS(amount))
+                    FROM transactions
+                    WHERE date >= %s AND category IN ({', '.join(['%s'] * len(categories))})
+                    GROUP BY category
+                """, [start.date()] + categories)
+                spent = {category: float(total or 0.0) for category, total in cursor.fetchall()}
+                for category in categories:
+                    counters[(category, period)] = (start, spent.get(category, 0.0))
+        with self._lock:
+            self._spent.update(counters)
+            self._seen_generation = generation
+            if every_key:
+                self._seen_marker = marker
+                self._reconciled_at = time.monotonic()
+            raised = [alert for (category, period), (start, spent) in counters.items()
+                      for alert in self._cross(category, period, start, spent, None, now)]
+            self._alerts.extend(raised)
+        self._save_counters(counters)
+        self._save_alerts(raised)
+
+    def _cross(self, category: str, period: str, start: datetime, spent: float,
+               transaction_id: Optional[str], now: datetime) -> List[Dict]:
+        """The alert for the highest threshold `spent` reaches that has not fired this period"""
+        limit = self._limits.get((category, period))
+        if not limit:
+            return []
+        crossed = [th for th in ALERT_THRESHOLDS
+                   if spent >= th * limit and (category, period, start, th) not in self._raised]
+        if not crossed:
+            return []
+        self._raised.update((category, period, start, th) for th in crossed)
+        return [{
+            'id': str(uuid.uuid4()), 'category': category, 'period': period,
+            'period_start': start, 'threshold': max(crossed), 'spent': spent,
+            'amount_limit': limit, 'transaction_id': transaction_id, 'created_at': now
+        }]
+
+    def _save_alerts(self, alerts: List[Dict]):
+        if not alerts:
+            return
+        try:
+            with get_conn() as conn:
+                conn.cursor().executemany(
+                    f"INSERT INTO budget_alerts ({', '.join(ALERT_COLUMNS)}) "
+                    f"VALUES ({', '.join(['%s'] * len(ALERT_COLUMNS))})",
+                    [tuple(a[c] for c in ALERT_COLUMNS) for a in alerts]
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"Saving budget alerts failed: {e}")
+
+    def _save_counters(self, counters: Dict[Tuple[str, str], Tuple[datetime, float]]):
+        if not counters:
+            return
+        try:
+            with get_conn() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("DELETE FROM budget_spend WHERE category = %s AND period = %s",
+                                   [key for key in counters])
+                cursor.executemany(
+                    "INSERT INTO budget_spend (category, period, period_start, spent) VALUES (%s, %s, %s, %s)",
+                    [(c, p, start, spent) for (c, p), (start, spent) in counters.items()]
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"Saving budget spend failed: {e}")
+
+    def observe(self, transactions: Iterable[Dict]) -> List[Dict]:
+        """
+        Add committed transactions to their category's counters and raise
+        alerts for thresholds they cross. Returns the new alerts.
+        """
+        now = datetime.now()
+        transactions = list(transactions)
+        changed, raised = {}, []
+        with self._lock:
+            for t in transactions:
+                category = t.get('category') or 'Other'
+                when = _to_datetime(t.get('date'))
+                amount = abs(float(t.get('amount', 0.0) or 0.0))
+                for period in PERIODS:
+                    limit = self._limits.get((category, period))
+                    if limit is None:
+                        continue
+                    start = period_start(period, now)
+                    if period_start(period, when) != start:
+                        continue    # back-dated or future-dated: not this period's spend
+                    counter_start, before = self._spent.get((category, period), (start, 0.0))
+                    if counter_start != start:
+                        before = 0.0    # a new period began since the last write
+                    after = before + amount
+                    self._spent[(category, period)] = changed[(category, period)] = (start, after)
+                    # One alert per write: the highest threshold reached that has not fired this period
+                    raised += self._cross(category, period, start, after, t.get('id'), now)
+            self._alerts.extend(raised)
+            self._seen_generation = data_generation("transactions")
+            if self._seen_marker is not None:
+                rows, last_updated = self._seen_marker
+                self._seen_marker = (rows + len(transactions), last_updated)
+        self._save_counters(changed)
+        self._save_alerts(raised)
+        return raised
+
+    @traced("db.reconcile_budget_spend")
+    def reconcile(self) -> bool:
+        """Recount when the transactions table changed without this process; returns whether it did"""
+        with self._lock:
+            self._reconciled_at = time.monotonic()
+            seen = self._seen_marker
+        with get_conn() as conn:
+            marker = transactions_marker(conn.cursor())
+        if marker == seen:
+            return False
+        self.recount()
+        return True
+
+    def _current(self):
+        if self._seen_generation != data_generation("transactions"):
+            self.recount()
+        elif time.monotonic() - self._reconciled_at >= RECONCILE_SECONDS:
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"Reconciling budget spend failed: {e}")
+
+    def usage(self, category: str, period: str = 'month') -> Optional[float]:
+        """Share of the budget spent this period (1.0 = at the limit), None without a budget"""
+        self._current()
+        now = datetime.now()
+        with self._lock:
+            limit = self._limits.get((category, period))
+            if not limit:
+                return None
+            start, spent = self._spent.get((category, period), (None, 0.0))
+            return (spent if start == period_start(period, now) else 0.0) / limit
+
+    def status(self) -> pd.DataFrame:
+        """Every budget with its current-period spend"""
+        self._current()
+        now = datetime.now()
+        rows = []
+        with self._lock:
+            for (category, period), limit in self._limits.items():
+                start = period_start(period, now)
+                counter_start, spent = self._spent.get((category, period), (start, 0.0))
+                spent = spent if counter_start == start else 0.0
+                rows.append((category, period, start, limit, spent, limit - spent, spent / limit * 100))
+        df = pd.DataFrame(rows, columns=STATUS_COLUMNS)
+        return df.sort_values('used_pct', ascending=False).reset_index(drop=True)
+
+    def set_budget(self, category: str, period: str, amount_limit: float):
+        """Create or change a budget"""
+        if category not in PREDEFINED_CATEGORIES:
+            raise ValueError(f"Invalid category. Must be one of: {PREDEFINED_CATEGORIES}")
+        if period not in PERIODS:
+            raise ValueError(f"period must be one of {PERIODS}")
+        if amount_limit <= 0:
+            raise ValueError("Budget limit must be positive")
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM budgets WHERE category = %s AND period = %s", (category, period))
+            cursor.execute("INSERT INTO budgets (category, period, amount_limit) VALUES (%s, %s, %s)",
+                           (category, period, float(amount_limit)))
+            conn.commit()
+        with self._lock:
+            self._limits[(category, period)] = float(amount_limit)
+        self.recount([(category, period)])
+
+    def remove_budget(self, category: str, period: str):
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM budgets WHERE category = %s AND period = %s", (category, period))
+            cursor.execute("DELETE FROM budget_spend WHERE category = %s AND period = %s", (category, period))
+            conn.commit()
+        with self._lock:
+            self._limits.pop((category, period), None)
+            self._spent.pop((category, period), None)
+
+    def alerts(self, transaction_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Alerts raised at write time, newest first, optionally for given transactions"""
+        self._current()
+        with self._lock:
+            alerts = list(self._alerts)
+        if transaction_ids is not None:
+            ids = set(transaction_ids)
+            alerts = [a for a in alerts if a['transaction_id'] in ids]
+        df = pd.DataFrame(alerts, columns=ALERT_COLUMNS)
+        return df.iloc[::-1].reset_index(drop=True)
+
+
+_tracker: Optional[BudgetTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_budget_tracker() -> BudgetTracker:
+    """
+    Process-wide tracker, loaded once and then kept current by the
+    transaction insert listener. Get it before logging transactions so
+    alerts are raised by the write that crosses a threshold.
+    """
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            tracker = BudgetTracker()
+            try:
+                tracker.load()
+            except Exception as e:
+                print(f"Loading budgets failed: {e}")
+            register_transaction_listener(tracker.observe)
+            _tracker = tracker
+        return _tracker
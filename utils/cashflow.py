@@ -0,0 +1,214 @@
+"""
+Forward cash-flow projection from recurring income.
+
+Income rows carry a recurrence ('one-time', 'weekly', 'monthly',
+'annual'). Each recurring (source, recurrence) stream is expanded into
+its future dates with NumPy date arithmetic, all streams of a kind at
+once. The dates are combined with the expected daily spend from recent
+expenses into a daily projected-balance calendar.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.ledger import get_ledger
+from utils.snowflake_conn import data_generation
+from utils.tracing import traced
+
+HORIZON_DAYS = 365
+EXPENSE_LOOKBACK_DAYS = 90
+STALE_AFTER_PERIODS = 3     # a stream not seen for this many periods has stopped
+AMOUNT_WINDOW = 3           # recent occurrences whose median is the projected amount
+# Step of each recurrence: ("months", n) steps by calendar month, ("days", n) by days
+RECURRENCE_STEPS: Dict[str, Tuple[str, int]] = {
+    "weekly": ("days", 7),
+    "monthly": ("months", 1),
+    "annual": ("months", 12),
+}
+OCCURRENCE_COLUMNS = ["date", "source", "category", "recurrence", "amount"]
+CALENDAR_COLUMNS = ["date", "income", "expenses", "net", "balance"]
+LEDGER_LIMIT = 100000
+_CACHE_SIZE = 32
+_occurrence_cache: "OrderedDict[Hashable, pd.DataFrame]" = OrderedDict()
+
+
+def recurring_streams(income_df: pd.DataFrame, today: Optional[date] = None) -> pd.DataFrame:
+    """
+    One row per active recurring stream: source, category, recurrence,
+    anchor (latest date), day (largest day of month among the latest
+    occurrences) and amount (median of the latest occurrences).
+    """
+    columns = ["source", "category", "recurrence", "anchor", "day", "amount"]
+    if income_df.empty:
+        return pd.DataFrame(columns=columns)
+    df = income_df.rename(columns=str.lower)
+    df = df[df["recurrence"].astype(object).isin(list(RECURRENCE_STEPS))]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    df = df.assign(date=pd.to_datetime(df["date"], format="mixed").dt.normalize(),
+                   source=df["source"].astype(object), recurrence=df["recurrence"].astype(object),
+                   category=df["category"].astype(object)).sort_values("date")
+
+    grouped = df.groupby(["source", "recurrence"], sort=False)
+    streams = grouped.agg(category=("category", "last"), anchor=("date", "last")).reset_index()
+    recent = grouped.tail(AMOUNT_WINDOW).assign(day=lambda d: d["date"].dt.day)
+    recent = recent.groupby(["source", "recurrence"], sort=False).agg(amount=("amount", "median"), day=("day", "max"))
+    recent = recent.reindex(pd.MultiIndex.from_frame(streams[["source", "recurrence"]]))
+    # A month-end salary paid Aug 31 then Sep 30 keeps the 31st, not the last month's shorter day
+    streams["amount"] = recent["amount"].to_numpy()
+    streams["day"] = recent["day"].to_numpy()
+
+    # Drop streams that have stopped paying
+    today = pd.Timestamp(today or date.today())
+    period_days = streams["recurrence"].map({"weekly": 7, "monthly": 31, "annual": 366})
+    active = (today - streams["anchor"]).dt.days <= period_days * STALE_AFTER_PERIODS
+    return streams.loc[active, columns].reset_index(drop=True)
+
+
+def _month_steps(anchors: np.ndarray, steps: np.ndarray, days: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    anchor + steps months on day `days` of the month (the anchor's own day
+    by default), clamping the day to the month's length (31 -> Feb 28)
+    """
+    months = anchors.astype("datetime64[M]")
+    if days is None:
+        day_of_month = (anchors.astype("datetime64[D]") - months.astype("datetime64[D]")).astype(int)
+    else:
+        day_of_month = np.asarray(days, dtype=int) - 1
+    target = months[:, None] + steps
+    month_length = ((target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")).astype(int)
+    return target.astype("datetime64[D]") + np.minimum(day_of_month[:, None], month_length - 1)
+
+
+def expand_occurrences(streams: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    """
+    Future dates of every stream in (start, end], vectorized per recurrence kind.
+
+    Occurrences are counted from the stream's anchor. Month steps land on
+    the stream's day, so a monthly stream paid on the 31st lands on the
+    last day of shorter months and returns to the 31st after them.
+    """
+    start64, end64 = np.datetime64(start, "D"), np.datetime64(end, "D")
+    frames = []
+    for recurrence, (unit, step) in RECURRENCE_STEPS.items():
+        kind = streams[streams["recurrence"] == recurrence]
+        if kind.empty:
+            continue
+        anchors = kind["anchor"].to_numpy().astype("datetime64[D]")
+        if unit == "months":
+            span = (end64.astype("datetime64[M]") - anchors.min().astype("datetime64[M]")).astype(int)
+            steps = np.arange(1, span // step + 2) * step
+            dates = _month_steps(anchors, steps, kind["day"].to_numpy())
+        else:
+            span = (end64 - anchors.min()).astype(int)
+            steps = np.arange(1, span // step + 2) * step
+            dates = anchors[:, None] + steps
+        mask = (dates > start64) & (dates <= end64)
+        rows = np.nonzero(mask)[0]
+        frames.append(pd.DataFrame({
+            "date": dates[mask],
+            "source": kind["source"].to_numpy()[rows],
+            "category": kind["category"].to_numpy()[rows],
+            "recurrence": recurrence,
+            "amount": kind["amount"].to_numpy(dtype=float)[rows],
+        }))
+    if not frames:
+        return pd.DataFrame(columns=OCCURRENCE_COLUMNS)
+    return pd.concat(frames, ignore_index=True).sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def project_income(income_df: pd.DataFrame, days: int = HORIZON_DAYS, today: Optional[date] = None,
+                   generation: Optional[Tuple[int, ...]] = None) -> pd.DataFrame:
+    """
+    Expected income occurrences over the next `days` days.
+
+    Cached per income generation and day, so it is recomputed only after
+    income rows change.
+    """
+    today = today or date.today()
+    key = (generation, today, days) if generation is not None else None
+    if key is not None and key in _occurrence_cache:
+        _occurrence_cache.move_to_end(key)
+        return _occurrence_cache[key]
+
+    occurrences = expand_occurrences(recurring_streams(income_df, today), today, today + timedelta(days=days))
+    if key is not None:
+        _occurrence_cache[key] = occurrences
+        while len(_occurrence_cache) > _CACHE_SIZE:
+            _occurrence_cache.popitem(last=False)
+    return occurrences
+
+
+def expected_daily_expenses(expense_df: pd.DataFrame, today: Optional[date] = None,
+                            lookback_days: int = EXPENSE_LOOKBACK_DAYS) -> np.ndarray:
+    """Average spend for each weekday (Monday first) over the lookback window"""
+    if expense_df.empty:
+        return np.zeros(7)
+    today = pd.Timestamp(today or date.today())
+    window_start = today - pd.Timedelta(days=lookback_days)
+    dates = pd.to_datetime(expense_df["date"], format="mixed")
+    recent = (dates >= window_start) & (dates < today)
+    totals = np.bincount(dates[recent].dt.weekday, weights=expense_df.loc[recent, "amount"].abs(), minlength=7)
+    weekdays = pd.date_range(window_start, today - pd.Timedelta(days=1), freq="D").weekday
+    return totals / np.maximum(np.bincount(weekdays, minlength=7), 1)
+
+
+def cashflow_calendar(occurrences: pd.DataFrame, daily_expenses: np.ndarray,
+                      starting_balance: float = 0.0, days: int = HORIZON_DAYS,
+                      today: Optional[date] = None) -> pd.DataFrame:
+    """
+    Daily projected balance for the next `days` days.
+
+    Args:
+        occurrences: Output of project_income
+        daily_expenses: Output of expected_daily_expenses (per weekday)
+        starting_balance: Balance at the end of today
+
+    Returns:
+        DataFrame with CALENDAR_COLUMNS, one row per day
+    """
+    today = today or date.today()
+    calendar = pd.date_range(today + timedelta(days=1), periods=days, freq="D")
+    income = np.zeros(days)
+    if not occurrences.empty:
+        offsets = (pd.to_datetime(occurrences["date"]) - calendar[0]).dt.days.to_numpy()
+        inside = (offsets >= 0) & (offsets < days)
+        income = np.bincount(offsets[inside], weights=occurrences["amount"].to_numpy(dtype=float)[inside],
+                             minlength=days)
+    expenses = np.asarray(daily_expenses, dtype=float)[calendar.weekday]
+    net = income - expenses
+    return pd.DataFrame({"date": calendar, "income": income, "expenses": expenses,
+                         "net": net, "balance": starting_balance + np.cumsum(net)})
+
+
+@traced("report.cashflow", measure=None)
+def forecast_cashflow(starting_balance: float = 0.0, days: int = HORIZON_DAYS,
+                      today: Optional[date] = None) -> Dict:
+    """
+    Projected daily balance from recurring income and recent spending.
+
+    Returns:
+        Dictionary with the daily 'calendar', the income 'occurrences' it
+        was built from, and the 'lowest_balance' with its 'lowest_date'
+    """
+    today = today or date.today()
+    start = datetime.combine(today, datetime.min.time())
+    # Far enough back to see the latest payment of every active stream
+    income = get_ledger(LEDGER_LIMIT, start=start - timedelta(days=366 * STALE_AFTER_PERIODS),
+                        types=('income',)).rename(columns={'merchant': 'source'})
+    expenses = get_ledger(LEDGER_LIMIT, start=start - timedelta(days=EXPENSE_LOOKBACK_DAYS),
+                          types=('expense',))
+
+    occurrences = project_income(income, days, today, generation=data_generation("income"))
+    calendar = cashflow_calendar(occurrences, expected_daily_expenses(expenses, today),
+                                 starting_balance, days, today)
+    lowest = calendar.loc[calendar['balance'].idxmin()]
+    return {
+        'calendar': calendar,
+        'occurrences': occurrences,
+        'lowest_balance': float(lowest['balance']),
+        'lowest_date': lowest['date']
+    }
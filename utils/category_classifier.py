@@ -0,0 +1,329 @@
+"""
+Local expense category classifier.
+
+Merchant, description and line-item text are turned into hashed word,
+word-bigram and merchant character-trigram features, and a multinomial
+logistic regression over PREDEFINED_CATEGORIES is trained on confirmed
+transactions (reconciled or with a category corrected by the user; a
+model or LLM category is never a label, however confident). A
+temperature fitted on held-out rows calibrates the confidence.
+
+Extraction results are categorized by the model first; the LLM's
+category is used only when the model is untrained or below
+MIN_CONFIDENCE. Category corrections are learned as they are saved:
+
+    python -m utils.category_classifier train
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.receipts import PREDEFINED_CATEGORIES, map_category_to_predefined
+from utils.settings import get_setting
+from utils.snowflake_conn import get_conn, register_category_listener
+from utils.tracing import span, traced
+
+DEFAULT_MODEL_PATH = os.path.join(".finai", "category_model.npz")
+N_FEATURES = 2 ** 18
+MIN_CONFIDENCE = 0.6        # below this the LLM's category is used instead
+MIN_TRAINING_ROWS = 50
+EPOCHS = 8
+BATCH_SIZE = 256
+LEARNING_RATE = 0.5
+L2 = 1e-3                   # weight decay on the feature rows each step touches
+CORRECTION_PASSES = 3       # SGD passes over each batch of corrections
+HOLDOUT_SHARE = 0.1
+BATCH_LOOKUP = 900          # ids per IN (...) lookup
+RETRY_SECONDS = 60          # how often an untrained classifier tries loading or training again
+
+_WORD = re.compile(r"[a-z0-9]+")
+_BIAS = zlib.crc32(b"<bias>") % N_FEATURES
+
+
+def _hash(feature: str) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(feature.encode("utf-8")) % N_FEATURES
+
+
+def featurize(merchant: str, description: str = "", items: str = "") -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed feature indices and L2-normalized log-count values of one transaction"""
+    features = ["<bias>"]
+    for prefix, text in (("m", merchant), ("d", description), ("i", items)):
+        words = _WORD.findall(str(text or "").lower())
+        features += [f"{prefix}:{w}" for w in words]
+        features += [f"{prefix}:{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {' '.join(_WORD.findall(str(merchant or '').lower()))} "
+    features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    indices, counts = np.unique(np.fromiter((_hash(f) for f in features), dtype=np.int64), return_counts=True)
+    values = np.log1p(counts).astype(np.float32)
+    return indices, values / np.linalg.norm(values)
+
+
+def _batch(rows: Sequence[Tuple[str, str, str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR arrays (indices, values, row pointers) for several transactions"""
+    pairs = [featurize(*row) for row in rows]
+    indptr = np.zeros(len(pairs) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(i) for i, _ in pairs])
+    return np.concatenate([i for i, _ in pairs]), np.concatenate([v for _, v in pairs]), indptr
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+class CategoryClassifier:
+    """Hashed-feature softmax regression with temperature-calibrated confidence"""
+
+    def __init__(self, path: Optional[str] = None, classes: Sequence[str] = PREDEFINED_CATEGORIES):
+        self.path = path or get_setting("FINAI_CATEGORY_MODEL", DEFAULT_MODEL_PATH)
+        self.classes = list(classes)
+        self._class_index = {c: i for i, c in enumerate(self.classes)}
+        self.weights = np.zeros((N_FEATURES, len(self.classes)), dtype=np.float32)
+        self.temperature = 1.0
+        self.trained_rows = 0
+        self._lock = threading.RLock()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.trained_rows > 0
+
+    def _logits(self, indices, values, indptr) -> np.ndarray:
+        contributions = self.weights[indices] * values[:, None]
+        return np.add.reduceat(contributions, indptr[:-1], axis=0)   # every row has the bias feature
+
+    def _sgd_step(self, indices, values, indptr, labels, learning_rate: float):
+        error = _softmax(self._logits(indices, values, indptr))
+        error[np.arange(len(labels)), labels] -= 1.0
+        rows = np.repeat(np.arange(len(labels)), np.diff(indptr))
+        self.weights[np.unique(indices)] *= 1.0 - learning_rate * L2
+        np.add.at(self.weights, indices, -learning_rate * values[:, None] * error[rows])
+
+    def _fit(self, rows: Sequence[Tuple[str, str, str]], labels: np.ndarray, epochs: int, learning_rate: float,
+             seed: int = 0):
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            order = rng.permutation(len(rows))
+            rate = learning_rate / (1 + epoch)
+            for start in range(0, len(order), BATCH_SIZE):
+                chosen = order[start:start + BATCH_SIZE]
+                self._sgd_step(*_batch([rows[i] for i in chosen]), labels[chosen], rate)
+
+    def _calibrate(self, rows: Sequence[Tuple[str, str, str]], labels: np.ndarray):
+        """
+        Temperature minimizing held-out negative log-likelihood. It only
+        softens: on separable data a sharpening temperature would make
+        unseen merchants look as certain as known ones.
+        """
+        logits = self._logits(*_batch(rows)).astype(np.float64)
+        best, best_loss = 1.0, np.inf
+        for temperature in np.exp(np.linspace(0.0, np.log(10.0), 40)):
+            probabilities = _softmax(logits / temperature)[np.arange(len(labels)), labels]
+            loss = -np.mean(np.log(np.maximum(probabilities, 1e-12)))
+            if loss < best_loss:
+                best, best_loss = float(temperature), loss
+        self.temperature = best
+
+    @traced("classifier.train", measure=lambda n: {"rows": n})
+    def train(self, examples: Sequence[Tuple[str, str, str, str]], seed: int = 0) -> int:
+        """
+        Train from scratch on (merchant, description, items, category)
+        examples and calibrate on a held-out share. Returns rows used.
+        """
+        examples = [e for e in examples if e[3] in self._class_index]
+        if len(examples) < MIN_TRAINING_ROWS:
+            return 0
+        rows = [e[:3] for e in examples]
+        labels = np.array([self._class_index[e[3]] for e in examples])
+        order = np.random.default_rng(seed).permutation(len(rows))
+        holdout = order[:max(int(len(rows) * HOLDOUT_SHARE), 1)]
+        fit = order[len(holdout):]
+        with self._lock:
+            self.weights[:] = 0.0
+            self._fit([rows[i] for i in fit], labels[fit], EPOCHS, LEARNING_RATE, seed)
+            self._calibrate([rows[i] for i in holdout], labels[holdout])
+            self.trained_rows = len(rows)
+        return len(rows)
+
+    def learn(self, examples: Iterable[Tuple[str, str, str, str]]) -> int:
+        """Fold corrected (merchant, description, items, category) examples into the model"""
+        examples = [e for e in examples if e[3] in self._class_index]
+        if not examples:
+            return 0
+        rows = [e[:3] for e in examples]
+        labels = np.array([self._class_index[e[3]] for e in examples])
+        with self._lock:
+            self._fit(rows, labels, CORRECTION_PASSES, LEARNING_RATE)
+            self.trained_rows += len(examples)
+        return len(examples)
+
+    def predict_proba(self, rows: Sequence[Tuple[str, str, str]]) -> np.ndarray:
+        """Calibrated class probabilities, one row per (merchant, description, items)"""
+        with self._lock:
+            logits = self._logits(*_batch(rows))
+            return _softmax(logits.astype(np.float64) / self.temperature)
+
+    def predict(self, merchant: str, description: str = "", items: str = "") -> Tuple[str, float]:
+        """Most likely category and its calibrated confidence"""
+        probabilities = self.predict_proba([(merchant, description, items)])[0]
+        best = int(np.argmax(probabilities))
+        return self.classes[best], float(probabilities[best])
+
+    def save(self):
+        """Write the model; weights are sparse, so only non-zero rows are stored"""
+        with self._lock:
+            rows = np.flatnonzero(np.any(self.weights != 0, axis=1))
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            temporary = f"{self.path}.tmp.npz"
+            np.savez_compressed(temporary, rows=rows, weights=self.weights[rows],
+                                temperature=self.temperature, trained_rows=self.trained_rows,
+                                classes=np.array(self.classes))
+            os.replace(temporary, self.path)
+
+    def load(self) -> bool:
+        """Read a saved model; False when there is none or it was trained on other classes"""
+        if not os.path.exists(self.path):
+            return False
+        with np.load(self.path) as saved:
+            if list(saved["classes"]) != self.classes:
+                return False
+            with self._lock:
+                self.weights[:] = 0.0
+                self.weights[saved["rows"]] = saved["weights"]
+                self.temperature = float(saved["temperature"])
+                self.trained_rows = int(saved["trained_rows"])
+        return True
+
+    def learn_corrections(self, updates: List[Tuple[str, str, float]]) -> int:
+        """Category listener: learn (transaction id, category, confidence) fixes"""
+        examples = _load_examples(ids=[u[0] for u in updates])
+        corrected = {tid: category for tid, category, _ in updates}
+        learned = self.learn([(m, d, i, corrected[tid]) for tid, m, d, i, _ in examples if tid in corrected])
+        if learned:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Saving category model failed: {e}")
+        return learned
+
+
+@traced("db.category_examples")
+def _load_examples(ids: Optional[List[str]] = None) -> List[Tuple[str, str, str, str, str]]:
+    """
+    (id, merchant, description, items, category) of confirmed transactions
+    (reconciled, or category updated since extraction), or of the given ids.
+    """
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        if ids is None:
+            cursor.execute("""
+                SELECT id, merchant, description, category FROM transactions
+                WHERE is_reconciled OR last_updated IS NOT NULL
+            """)
+            rows = cursor.fetchall()
+            cursor.execute("SELECT transaction_id, description FROM line_items ORDER BY transaction_id, line_no")
+            item_rows = cursor.fetchall()
+        else:
+            rows, item_rows = [], []
+            for start in range(0, len(ids), BATCH_LOOKUP):
+                chunk = ids[start:start + BATCH_LOOKUP]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"SELECT id, merchant, description, category FROM transactions "
+                               f"WHERE id IN ({placeholders})", chunk)
+                rows += cursor.fetchall()
+                cursor.execute(f"SELECT transaction_id, description FROM line_items "
+                               f"WHERE transaction_id IN ({placeholders}) ORDER BY transaction_id, line_no", chunk)
+                item_rows += cursor.fetchall()
+    items = defaultdict(list)
+    for transaction_id, description in item_rows:
+        items[transaction_id].append(description or "")
+    return [(tid, merchant or "", description or "", " ".join(items.get(tid, [])), category)
+            for tid, merchant, description, category in rows]
+
+
+def categorize_receipt(receipt: Dict, classifier: Optional[CategoryClassifier] = None) -> Dict:
+    """
+    Set the receipt's category from the local model when it is confident,
+    otherwise keep the LLM's category mapped to a predefined one. The
+    category's "source" records which was used.
+    """
+    classifier = classifier or get_category_classifier()
+    category = dict(receipt.get("category") or {})
+    merchant = (receipt.get("merchant") or {}).get("value", "")
+    items = " ".join(str(i.get("description") or "") for i in receipt.get("line_items") or [] if isinstance(i, dict))
+    if classifier.is_trained:
+        with span("classifier.predict"):
+            predicted, confidence = classifier.predict(merchant, receipt.get("description", ""), items)
+        if confidence >= MIN_CONFIDENCE:
+            return {**receipt, "category": {"value": predicted, "confidence": round(confidence, 3), "source": "model"}}
+    category["value"] = map_category_to_predefined(str(category.get("value") or "Other"))
+    category["source"] = "llm"
+    return {**receipt, "category": category}
+
+
+_classifier: Optional[CategoryClassifier] = None
+_classifier_lock = threading.Lock()
+_prepared_at = -float("inf")
+
+
+def get_category_classifier() -> CategoryClassifier:
+    """
+    Process-wide classifier: the saved model, or one trained from the
+    confirmed transactions on first use. While it is untrained (no table
+    yet, too few confirmed rows) loading and training are retried at most
+    every RETRY_SECONDS. Corrections saved afterwards are learned through
+    the category listener.
+    """
+    global _classifier, _prepared_at
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = CategoryClassifier()
+            register_category_listener(_classifier.learn_corrections)
+        if not _classifier.is_trained and time.monotonic() - _prepared_at >= RETRY_SECONDS:
+            _prepared_at = time.monotonic()
+            try:
+                if not _classifier.load() and _classifier.train([e[1:] for e in _load_examples()]):
+                    _classifier.save()
+            except Exception as e:
+                print(f"Loading category model failed: {e}")
+        return _classifier
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local category classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("train", help="Retrain from confirmed transactions")
+    predict = sub.add_parser("predict", help="Categorize a merchant and description")
+    predict.add_argument("merchant")
+    predict.add_argument("description", nargs="?", default="")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        classifier = CategoryClassifier()
+        used = classifier.train([e[1:] for e in _load_examples()])
+        if not used:
+            print(f"Need at least {MIN_TRAINING_ROWS} confirmed transactions to train")
+            return 1
+        classifier.save()
+        print(f"Trained on {used} transactions (temperature {classifier.temperature:.2f}) -> {classifier.path}")
+    else:
+        classifier = CategoryClassifier()
+        if not classifier.load():
+            print("No trained model; run `python -m utils.category_classifier train` first")
+            return 1
+        category, confidence = classifier.predict(args.merchant, args.description)
+        print(f"{category} ({confidence:.1%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import hashlib
+from collections import OrderedDict
+from statistics import NormalDist
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SEASON_LENGTH = 12  # monthly data, yearly seasonality
+DEFAULT_HORIZON = 3
+DEFAULT_LEVEL = 0.95
+_CACHE_SIZE = 64
+_fit_cache: "OrderedDict[Hashable, pd.DataFrame]" = OrderedDict()
+
+
+def _design_matrix(t: np.ndarray, n_obs: int, season_length: int) -> np.ndarray:
+    """
+    Regressors for a linear trend plus Fourier seasonality.
+
+    Terms are added only when there is enough history to estimate them:
+    level always, trend from 3 points, one harmonic from 8, two from 2 seasons.
+    """
+    columns = [np.ones_like(t)]
+    if n_obs >= 3:
+        columns.append(t)
+    harmonics = 2 if n_obs >= 2 * season_length else 1 if n_obs >= 8 else 0
+    for k in range(1, harmonics + 1):
+        angle = 2 * np.pi * k * t / season_length
+        columns.extend([np.sin(angle), np.cos(angle)])
+    return np.column_stack(columns)
+
+
+def fit_forecast(values: np.ndarray, horizon: int = DEFAULT_HORIZON,
+                 level: float = DEFAULT_LEVEL, season_length: int = SEASON_LENGTH,
+                 non_negative: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Fit trend + seasonality to every row of `values` in one least-squares solve.
+
+    Args:
+        values: Array of shape (n_series, n_periods), oldest period first
+        horizon: Number of future periods to forecast
+        level: Coverage of the prediction interval
+        season_length: Periods per seasonal cycle
+        non_negative: Clip forecasts and bounds at zero (amounts)
+
+    Returns:
+        Dictionary of (n_series, horizon) arrays: forecast, lower, upper,
+        plus the fitted values of shape (n_series, n_periods)
+    """
+    y = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    n_series, n_obs = y.shape
+    if n_obs == 0:
+        raise ValueError("Cannot forecast an empty series")
+
+    t = np.arange(n_obs + horizon, dtype=np.float64)
+    X_all = _design_matrix(t, n_obs, season_length)
+    X, X_future = X_all[:n_obs], X_all[n_obs:]
+
+    # One solve shared by all series: coefficients has shape (n_terms, n_series)
+    coefficients, *_ = np.linalg.lstsq(X, y.T, rcond=None)
+    fitted = (X @ coefficients).T
+    forecast = (X_future @ coefficients).T
+
+    dof = max(n_obs - X.shape[1], 1)
+    sigma = np.sqrt(((y - fitted) ** 2).sum(axis=1) / dof)
+    if n_obs <= X.shape[1]:
+        # Exactly determined fit: fall back to the spread of the data itself
+        sigma = y.std(axis=1, ddof=0)
+    # Parameter uncertainty grows with distance from the data
+    xtx_inv = np.linalg.pinv(X.T @ X)
+    leverage = np.einsum("ij,jk,ik->i", X_future, xtx_inv, X_future)
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    half_width = z * sigma[:, None] * np.sqrt(1 + leverage)[None, :]
+
+    lower, upper = forecast - half_width, forecast + half_width
+    if non_negative:
+        forecast, lower, upper = (np.clip(a, 0, None) for a in (forecast, lower, upper))
+    return {"forecast": forecast, "lower": lower, "upper": upper, "fitted": fitted}
+
+
+def monthly_matrix(trends: Dict[str, Dict]) -> pd.DataFrame:
+    """
+    Align several {month_end: amount} trends on one complete monthly index.
+
+    Months missing from a series are treated as zero.
+    """
+    frame = pd.DataFrame({name: pd.Series(trend, dtype="float64") for name, trend in trends.items()})
+    if frame.empty:
+        return frame
+    frame.index = pd.to_datetime(frame.index).to_period("M").to_timestamp("M")
+    frame = frame.groupby(level=0).sum()
+    full_index = pd.date_range(frame.index.min(), frame.index.max(), freq=pd.offsets.MonthEnd())
+    return frame.reindex(full_index, fill_value=0.0).fillna(0.0).T
+
+
+def _fingerprint(matrix: pd.DataFrame) -> str:
+    """Content hash of the aligned input so stale fits are never reused"""
+    digest = hashlib.sha1(np.ascontiguousarray(matrix.to_numpy()).tobytes())
+    digest.update("|".join(map(str, matrix.index)).encode())
+    digest.update(str(matrix.columns[-1]).encode())
+    return digest.hexdigest()
+
+
+def forecast_trends(trends: Dict[str, Dict], horizon: int = DEFAULT_HORIZON,
+                    level: float = DEFAULT_LEVEL,
+                    generation: Optional[Tuple[int, ...]] = None) -> pd.DataFrame:
+    """
+    Forecast many monthly trends (e.g. total income and each source) at once.
+
+    Results are cached per data generation and input fingerprint, so
+    re-rendering the dashboard does not refit unchanged history.
+
+    Returns:
+        Long DataFrame with columns series, date, forecast, lower, upper
+    """
+    matrix = monthly_matrix({k: v for k, v in trends.items() if v})
+    if matrix.empty:
+        return pd.DataFrame(columns=["series", "date", "forecast", "lower", "upper"])
+
+    key = (generation, horizon, level, _fingerprint(matrix))
+    if key in _fit_cache:
+        _fit_cache.move_to_end(key)
+        return _fit_cache[key]
+
+    result = fit_forecast(matrix.to_numpy(), horizon=horizon, level=level)
+    future = pd.date_range(matrix.columns[-1], periods=horizon + 1, freq=pd.offsets.MonthEnd())[1:]
+    n_series = len(matrix.index)
+    forecast = pd.DataFrame({
+        "series": np.repeat(matrix.index.to_numpy(), horizon),
+        "date": np.tile(future, n_series),
+        "forecast": result["forecast"].ravel(),
+        "lower": result["lower"].ravel(),
+        "upper": result["upper"].ravel()
+    })
+
+    _fit_cache[key] = forecast
+    while len(_fit_cache) > _CACHE_SIZE:
+        _fit_cache.popitem(last=False)
+    return forecast
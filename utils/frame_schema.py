@@ -0,0 +1,76 @@
+from typing import Dict
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    STRING_DTYPE = pd.ArrowDtype(pa.string())
+except ImportError:  # Optional: free-text columns stay as Python objects
+    STRING_DTYPE = object
+
+# Low-cardinality text becomes categorical, confidences float32 and free text
+# Arrow-backed strings. Keys are lower-case; frame columns match case-insensitively
+# because Snowflake returns income columns upper-case.
+TRANSACTION_SCHEMA: Dict[str, object] = {
+    "id": STRING_DTYPE,
+    "merchant": "category",
+    "merchant_confidence": "float32",
+    "description": STRING_DTYPE,
+    "amount": "float64",
+    "amount_confidence": "float32",
+    "category": "category",
+    "category_confidence": "float32",
+    "date_confidence": "float32",
+    "is_reconciled": "bool",
+    "canonical_merchant": "category",
+}
+
+INCOME_SCHEMA: Dict[str, object] = {
+    "id": STRING_DTYPE,
+    "source": "category",
+    "amount": "float64",
+    "category": "category",
+    "payment_method": "category",
+    "description": STRING_DTYPE,
+    "is_taxable": "boolean",
+    "recurrence": "category",
+}
+
+LEDGER_SCHEMA: Dict[str, object] = {
+    "id": STRING_DTYPE,
+    "type": "category",
+    "merchant": "category",
+    "category": "category",
+    "description": STRING_DTYPE,
+    "payment_method": "category",
+    "amount": "float64",
+    "is_taxable": "boolean",
+    "recurrence": "category",
+}
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, object]) -> pd.DataFrame:
+    """
+    Cast a freshly loaded frame to its compact dtypes in one pass.
+
+    Columns not in the schema (dates, tags) are left untouched; columns
+    that fail to convert are left as loaded rather than failing the load.
+    """
+    if df.empty:
+        return df
+    dtypes = {col: schema[str(col).lower()] for col in df.columns if str(col).lower() in schema}
+    try:
+        return df.astype(dtypes)
+    except (TypeError, ValueError) as e:
+        print(f"Schema cast failed, falling back per column: {e}")
+        for col, dtype in dtypes.items():
+            try:
+                df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError):
+                continue
+        return df
+
+
+def memory_usage_mb(df: pd.DataFrame) -> float:
+    """Deep memory footprint of a frame in megabytes"""
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -0,0 +1,298 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_DB_PATH = os.path.join(".finai", "jobs.sqlite3")
+POLL_INTERVAL = 0.5
+
+_worker_client = None
+
+
+def _process_item(payload: bytes, file_type: str) -> Dict:
+    """Run one document through extraction inside a worker process"""
+    global _worker_client
+    if _worker_client is None:
+        from utils.together_client import TogetherClient
+        _worker_client = TogetherClient()
+    if file_type == "csv":
+        return {"results": _worker_client._process_csv_file(payload)}
+    return {"results": [_worker_client.process_receipt(file_bytes=payload, file_type=file_type)]}
+
+
+class JobQueue:
+    """
+    Local job system for bulk document processing.
+
+    Jobs and their documents are stored in a SQLite table, so they survive
+    Streamlit reruns and browser refreshes. A dispatcher thread feeds pending
+    items to a process pool and checkpoints every result as soon as it
+    finishes; items left running by a crash are re-queued on start.
+
+    When a worker dies the pool cannot tell which item killed it, so every
+    item in flight is re-queued with its crash count raised. Items that
+    have been in a crash then run one at a time; only an item that crashes
+    while running alone is marked failed.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_workers: Optional[int] = None):
+        self.db_path = db_path or os.getenv("FINAI_JOB_DB", DEFAULT_DB_PATH)
+        self.max_workers = max_workers or os.cpu_count() or 2
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._init_db()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                created_at TEXT,
+                status TEXT,        -- 'pending', 'running', 'done'
+                total INTEGER,
+                completed INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0
+            )
+            """)
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT,
+                idx INTEGER,
+                name TEXT,
+                file_type TEXT,
+                payload BLOB,
+                status TEXT,        -- 'pending', 'running', 'done', 'failed'
+                result TEXT,        -- JSON list of extracted receipts
+                error TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (job_id, idx)
+            )
+            """)
+            try:
+                conn.execute("ALTER TABLE job_items ADD COLUMN crashes INTEGER DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # added by an earlier start
+            conn.execute("CREATE INDEX IF NOT EXISTS job_items_status ON job_items(status)")
+            # Anything left running belongs to a dead process
+            conn.execute("UPDATE job_items SET status = 'pending' WHERE status = 'running'")
+
+    def submit(self, files: List[Tuple[str, bytes, str]]) -> str:
+        """
+        Queue documents for processing.
+
+        Args:
+            files: List of (file_name, file_bytes, file_type) tuples
+
+        Returns:
+            Job ID to poll with status() / results()
+        """
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, created_at, status, total) VALUES (?, ?, 'pending', ?)",
+                (job_id, now, len(files))
+            )
+            conn.executemany(
+                """
+                INSERT INTO job_items (job_id, idx, name, file_type, payload, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, 'pending', ?)
+                """,
+                [(job_id, i, name, file_type, sqlite3.Binary(data), now)
+                 for i, (name, data, file_type) in enumerate(files)]
+            )
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Progress counters for a job, or None if it does not exist"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        status = dict(row)
+        status["finished"] = status["completed"] + status["failed"] >= status["total"]
+        return status
+
+    def results(self, job_id: str) -> List[Dict]:
+        """Extracted receipts for every finished item, in upload order"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT result FROM job_items WHERE job_id = ? AND status = 'done' ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+        results = []
+        for row in rows:
+            results.extend(json.loads(row["result"]))
+        return results
+
+    def failures(self, job_id: str) -> List[Dict]:
+        """Names and errors of items that failed"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name, error FROM job_items WHERE job_id = ? AND status = 'failed' ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def recent_jobs(self, limit: int = 10) -> List[Dict]:
+        """Most recent jobs, newest first"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def start(self):
+        """Start the dispatcher thread if it is not already running"""
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._stopped.clear()
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def _claim_pending(self, limit: int, suspects: bool = False) -> List[sqlite3.Row]:
+        """Claim pending items that have (suspects) or have not been in a worker crash"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT job_id, idx, file_type, payload FROM job_items
+                WHERE status = 'pending' AND COALESCE(crashes, 0) {'>' if suspects else '='} 0
+                ORDER BY job_id, idx LIMIT ?
+                """,
+                (limit,)
+            ).fetchall()
+            now = datetime.utcnow().isoformat()
+            conn.executemany(
+                "UPDATE job_items SET status = 'running', updated_at = ? WHERE job_id = ? AND idx = ?",
+                [(now, row["job_id"], row["idx"]) for row in rows]
+            )
+            conn.executemany(
+                "UPDATE jobs SET status = 'running' WHERE id = ?",
+                {(row["job_id"],) for row in rows}
+            )
+        return rows
+
+    def _requeue(self, rows: List[sqlite3.Row]):
+        """Return claimed items that were never submitted"""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE job_items SET status = 'pending' WHERE job_id = ? AND idx = ?",
+                [(row["job_id"], row["idx"]) for row in rows]
+            )
+
+    def _requeue_crashed(self, items: List[Tuple[str, int]]):
+        """Put items that were in flight when a worker died back in the queue"""
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE job_items SET status = 'pending', crashes = COALESCE(crashes, 0) + 1, updated_at = ? "
+                "WHERE job_id = ? AND idx = ?",
+                [(now, job_id, idx) for job_id, idx in items]
+            )
+
+    def _checkpoint(self, job_id: str, idx: int, result: Optional[Dict], error: Optional[str]):
+        """Persist one item's outcome and advance the job counters"""
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            if error is None:
+                conn.execute(
+                    "UPDATE job_items SET status = 'done', result = ?, payload = NULL, updated_at = ? "
+                    "WHERE job_id = ? AND idx = ?",
+                    (json.dumps(result["results"], default=str), now, job_id, idx)
+                )
+                conn.execute("UPDATE jobs SET completed = completed + 1 WHERE id = ?", (job_id,))
+            else:
+                conn.execute(
+                    "UPDATE job_items SET status = 'failed', error = ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                    (error, now, job_id, idx)
+                )
+                conn.execute("UPDATE jobs SET failed = failed + 1 WHERE id = ?", (job_id,))
+            conn.execute(
+                "UPDATE jobs SET status = 'done' WHERE id = ? AND completed + failed >= total",
+                (job_id,)
+            )
+
+    def _dispatch_loop(self):
+        context = multiprocessing.get_context("spawn")  # never fork the Streamlit server
+        while not self._stopped.is_set():
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as pool:
+                if not self._run_pool(pool):
+                    print("Worker pool crashed; restarting")
+
+    def _run_pool(self, pool: ProcessPoolExecutor) -> bool:
+        """Feed the pool until stopped; returns False if the pool broke"""
+        running = {}
+        isolated = False    # a crash suspect is running alone
+        while not self._stopped.is_set():
+            claimed = []
+            if not running:
+                claimed = self._claim_pending(1, suspects=True)
+                isolated = bool(claimed)
+            free = self.max_workers * 2 - len(running)
+            if free > 0 and not isolated:
+                claimed = self._claim_pending(free)
+            for i, row in enumerate(claimed):
+                try:
+                    future = pool.submit(_process_item, bytes(row["payload"]), row["file_type"])
+                except BrokenProcessPool:
+                    # The pool died since the last wait; nothing claimed here ran
+                    self._requeue(claimed[i:])
+                    self._requeue_crashed(list(running.values()))
+                    return False
+                running[future] = (row["job_id"], row["idx"])
+            if not running:
+                self._wakeup.wait(POLL_INTERVAL * 10)
+                self._wakeup.clear()
+                continue
+            done, _ = wait(list(running), timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                job_id, idx = running.pop(future)
+                try:
+                    self._checkpoint(job_id, idx, future.result(), None)
+                except BrokenProcessPool as e:
+                    broken = True
+                    if isolated:
+                        # It ran alone, so this item is what kills the worker
+                        self._checkpoint(job_id, idx, None, f"Worker crashed: {e}")
+                    else:
+                        self._requeue_crashed([(job_id, idx)])
+                except Exception as e:
+                    print(f"Job {job_id} item {idx} failed: {e}")
+                    self._checkpoint(job_id, idx, None, str(e))
+            if broken:
+                # The rest of the paid-for work in flight is retried on a fresh pool
+                self._requeue_crashed(list(running.values()))
+                return False
+        return True
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue; resumes any unfinished work on first use"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+            _queue.start()
+        return _queue
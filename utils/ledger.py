@@ -0,0 +1,70 @@
+"""
+Unified ledger of every money movement.
+
+The `ledger` view (created by init_db) unions expenses and income into one
+stream with a `type` column and signed amounts: expenses negative, income
+positive. Views that list or total both kinds read it with one query
+instead of loading and reshaping the two tables separately.
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+from utils.frame_schema import LEDGER_SCHEMA, apply_schema
+from utils.snowflake_conn import get_conn
+from utils.tracing import traced
+
+LEDGER_COLUMNS = [
+    'id', 'date', 'type', 'merchant', 'category', 'description',
+    'payment_method', 'amount', 'is_taxable', 'recurrence'
+]
+ENTRY_TYPES = ('expense', 'income')
+
+
+@traced("db.get_ledger")
+def get_ledger(limit: int = 1000,
+               start: Optional[datetime] = None,
+               end: Optional[datetime] = None,
+               types: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Get the most recent ledger entries, newest first.
+
+    Args:
+        limit: Maximum number of entries
+        start: Optional inclusive lower bound on date
+        end: Optional inclusive upper bound on date
+        types: Entry types to include ('expense', 'income'); all by default
+
+    Returns:
+        DataFrame with LEDGER_COLUMNS and a signed `amount`
+    """
+    types = [t for t in (types or ENTRY_TYPES) if t in ENTRY_TYPES]
+    conditions: List[str] = [f"type IN ({', '.join(['%s'] * len(types))})"]
+    params: List = list(types)
+    if start is not None:
+        conditions.append("date >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("date <= %s")
+        params.append(end)
+
+    try:
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {', '.join(LEDGER_COLUMNS)}
+                FROM ledger
+                WHERE {' AND '.join(conditions)}
+                ORDER BY date DESC
+                LIMIT {int(limit)}
+            """, params)
+            df = pd.DataFrame(cursor.fetchall(), columns=LEDGER_COLUMNS)
+    except Exception as e:
+        print(f"Failed to fetch ledger: {e}")
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+
+    if not df.empty:
+        df['date'] = pd.to_datetime(df['date'], format='mixed')
+        df = apply_schema(df, LEDGER_SCHEMA)
+    return df
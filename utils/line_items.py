@@ -0,0 +1,152 @@
+"""
+Item-level analytics over the line_items table.
+
+Line items are stored with their transaction (see log_transaction and
+bulk_log_transactions), so these aggregates run in the database instead
+of re-extracting receipts or loading every item into pandas.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from utils.snowflake_conn import get_conn
+from utils.tracing import traced
+
+TOP_ITEM_COLUMNS = ['item_key', 'description', 'purchases', 'quantity', 'total_spent', 'avg_unit_price', 'last_seen']
+DRIFT_COLUMNS = ['item_key', 'description', 'purchases', 'first_unit_price', 'last_unit_price',
+                 'min_unit_price', 'max_unit_price', 'first_seen', 'last_seen', 'drift_pct']
+ORDER_BY = {'spend': 'total_spent', 'quantity': 'quantity', 'purchases': 'purchases'}
+
+
+def _date_filter(start: Optional[datetime], end: Optional[datetime]) -> Tuple[str, List]:
+    conditions, params = ["1 = 1"], []
+    if start is not None:
+        conditions.append("date >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("date <= %s")
+        params.append(end)
+    return " AND ".join(conditions), params
+
+
+def _query(sql: str, params: List, columns: List[str]) -> pd.DataFrame:
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        df = pd.DataFrame(cursor.fetchall(), columns=columns)
+    for col in ('first_seen', 'last_seen'):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format='mixed')
+    return df
+
+
+@traced("db.top_items")
+def get_top_items(limit: int = 10, by: str = 'spend',
+                  start: Optional[datetime] = None,
+                  end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Most bought items, grouped by normalized description.
+
+    Args:
+        limit: Number of items to return
+        by: 'spend', 'quantity' or 'purchases'
+        start: Optional inclusive lower bound on purchase date
+        end: Optional inclusive upper bound on purchase date
+
+    Returns:
+        DataFrame with TOP_ITEM_COLUMNS
+    """
+    if by not in ORDER_BY:
+        raise ValueError(f"by must be one of {sorted(ORDER_BY)}")
+    where, params = _date_filter(start, end)
+    try:
+        return _query(f"""
+            SELECT
+                item_key,
+                MAX(description) AS description,
+                COUNT(*) AS purchases,
+                SUM(quantity) AS quantity,
+                SUM(amount) AS total_spent,
+                SUM(amount) / NULLIF(SUM(quantity), 0) AS avg_unit_price,
+                MAX(date) AS last_seen
+            FROM line_items
+            WHERE {where}
+            GROUP BY item_key
+            ORDER BY {ORDER_BY[by]} DESC
+            LIMIT {int(limit)}
+        """, params, TOP_ITEM_COLUMNS)
+    except Exception as e:
+        print(f"Failed to fetch top items: {e}")
+        return pd.DataFrame(columns=TOP_ITEM_COLUMNS)
+
+
+@traced("db.unit_price_drift")
+def get_unit_price_drift(limit: int = 20, min_purchases: int = 2,
+                         start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Items whose unit price moved most between their first and latest purchase.
+
+    Args:
+        limit: Number of items to return
+        min_purchases: Ignore items bought fewer times than this
+        start: Optional inclusive lower bound on purchase date
+        end: Optional inclusive upper bound on purchase date
+
+    Returns:
+        DataFrame with DRIFT_COLUMNS; drift_pct is the change from the
+        first to the latest unit price, sorted by its magnitude
+    """
+    where, params = _date_filter(start, end)
+    try:
+        return _query(f"""
+            WITH priced AS (
+                SELECT
+                    item_key,
+                    description,
+                    date,
+                    unit_price,
+                    FIRST_VALUE(unit_price) OVER (
+                        PARTITION BY item_key ORDER BY date, line_no) AS first_unit_price,
+                    FIRST_VALUE(unit_price) OVER (
+                        PARTITION BY item_key ORDER BY date DESC, line_no DESC) AS last_unit_price
+                FROM line_items
+                WHERE {where} AND unit_price > 0
+            )
+            SELECT
+                item_key,
+                MAX(description) AS description,
+                COUNT(*) AS purchases,
+                MAX(first_unit_price) AS first_unit_price,
+                MAX(last_unit_price) AS last_unit_price,
+                MIN(unit_price) AS min_unit_price,
+                MAX(unit_price) AS max_unit_price,
+                MIN(date) AS first_seen,
+                MAX(date) AS last_seen,
+                (MAX(last_unit_price) - MAX(first_unit_price)) / MAX(first_unit_price) * 100 AS drift_pct
+            FROM priced
+            GROUP BY item_key
+            HAVING COUNT(*) >= %s
+            ORDER BY ABS((MAX(last_unit_price) - MAX(first_unit_price)) / MAX(first_unit_price)) DESC
+            LIMIT {int(limit)}
+        """, params + [int(min_purchases)], DRIFT_COLUMNS)
+    except Exception as e:
+        print(f"Failed to fetch unit price drift: {e}")
+        return pd.DataFrame(columns=DRIFT_COLUMNS)
+
+
+@traced("db.transaction_line_items")
+def get_transaction_line_items(transaction_id: str) -> pd.DataFrame:
+    """Line items stored for one transaction, in receipt order"""
+    columns = ['line_no', 'description', 'quantity', 'amount', 'unit_price']
+    try:
+        return _query(f"""
+            SELECT {', '.join(columns)}
+            FROM line_items
+            WHERE transaction_id = %s
+            ORDER BY line_no
+        """, [transaction_id], columns)
+    except Exception as e:
+        print(f"Failed to fetch line items: {e}")
+        return pd.DataFrame(columns=columns)
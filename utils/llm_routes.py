@@ -0,0 +1,159 @@
+"""
+Task-based model routing for LLM calls.
+
+Each task sends its requests through a route naming the model, the
+max_tokens cap, a latency budget (seconds, shared by the whole fallback
+chain) and the models to fall back to when a call fails or times out:
+
+    extract     receipt extraction to JSON
+    advise      tax and savings advice
+    analyze     long-form security analysis
+    risk-json   structured risk scores
+
+Categories have no route: the local classifier sets them, and when it
+is unsure the category already in the extract response is kept (see
+utils/category_classifier.py). Small, fast models serve the structured
+tasks. Routes can be changed
+without code edits by pointing FINAI_LLM_ROUTES at a JSON file of
+per-route overrides; it is re-read when it changes:
+
+    {"extract": {"model": "mistralai/Mistral-7B-Instruct-v0.1", "timeout": 20},
+     "analyze": {"fallbacks": ["meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo"]}}
+
+Latency of every attempt is kept per route and model; route_latency()
+reports p50/p90/p99, and each attempt is also an llm.route.<task> span.
+
+    python -m utils.llm_routes show
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.settings import get_setting
+
+SMALL_MODEL = "meta-llama/Llama-3.2-3B-Instruct-Turbo"
+MEDIUM_MODEL = "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo"
+LARGE_MODEL = "meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo"
+LEGACY_MODEL = "mistralai/Mistral-7B-Instruct-v0.1"
+
+DEFAULT_ROUTES = {
+    "extract": {"model": SMALL_MODEL, "max_tokens": 2000, "timeout": 30.0, "fallbacks": [LEGACY_MODEL]},
+    "advise": {"model": MEDIUM_MODEL, "max_tokens": 1000, "timeout": 60.0, "fallbacks": [LEGACY_MODEL]},
+    "analyze": {"model": LARGE_MODEL, "max_tokens": 4000, "timeout": 120.0,
+                "fallbacks": [MEDIUM_MODEL, LEGACY_MODEL]},
+    "risk-json": {"model": SMALL_MODEL, "max_tokens": 600, "timeout": 20.0, "fallbacks": [MEDIUM_MODEL]},
+}
+LATENCY_WINDOW = 500    # attempts kept per (route, model)
+LATENCY_COLUMNS = ['route', 'model', 'calls', 'errors', 'p50_ms', 'p90_ms', 'p99_ms']
+
+
+class RouteTable:
+    """Routes merged from DEFAULT_ROUTES and the override file, plus their latency"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_setting("FINAI_LLM_ROUTES")
+        self._routes: Dict[str, Dict] = copy.deepcopy(DEFAULT_ROUTES)
+        self._loaded_mtime = None
+        self._latency: Dict[Tuple[str, str], deque] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._reload()
+
+    def _reload(self):
+        """Re-read the override file when its modification time changed"""
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        routes = copy.deepcopy(DEFAULT_ROUTES)
+        try:
+            with open(self.path) as f:
+                for task, override in json.load(f).items():
+                    routes[task] = {**routes.get(task, {"fallbacks": []}), **override}
+        except Exception as e:
+            print(f"Loading LLM routes from {self.path} failed: {e}")
+            return
+        missing = [task for task, route in routes.items() if not route.get("model")]
+        if missing:
+            print(f"LLM routes without a model ignored: {missing}")
+            return
+        with self._lock:
+            self._routes = routes
+            self._loaded_mtime = mtime
+
+    def route(self, task: str) -> Dict:
+        """model, max_tokens, timeout and fallbacks of a task"""
+        self._reload()
+        with self._lock:
+            if task not in self._routes:
+                raise ValueError(f"Unknown LLM route '{task}'. Use one of: {sorted(self._routes)}")
+            return dict(self._routes[task])
+
+    def models(self, task: str) -> List[str]:
+        """The route's model followed by its fallbacks, without repeats"""
+        route = self.route(task)
+        return list(dict.fromkeys([route["model"], *route.get("fallbacks", [])]))
+
+    def record(self, task: str, model: str, seconds: float, error: bool = False):
+        key = (task, model)
+        with self._lock:
+            self._latency.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(seconds * 1000)
+            self._errors[key] = self._errors.get(key, 0) + error
+
+    def latency(self) -> pd.DataFrame:
+        """p50/p90/p99 latency of recent attempts per route and model"""
+        with self._lock:
+            samples = {key: np.array(values) for key, values in self._latency.items()}
+            errors = dict(self._errors)
+        rows = [(task, model, len(ms), errors.get((task, model), 0), *np.percentile(ms, [50, 90, 99]))
+                for (task, model), ms in sorted(samples.items())]
+        return pd.DataFrame(rows, columns=LATENCY_COLUMNS)
+
+    def table(self) -> pd.DataFrame:
+        self._reload()
+        with self._lock:
+            routes = copy.deepcopy(self._routes)
+        return pd.DataFrame([{"route": task, **route, "fallbacks": ", ".join(route.get("fallbacks", []))}
+                             for task, route in routes.items()])
+
+
+_route_table: Optional[RouteTable] = None
+_route_table_lock = threading.Lock()
+
+
+def get_route_table() -> RouteTable:
+    """Process-wide route table shared by every TogetherClient"""
+    global _route_table
+    with _route_table_lock:
+        if _route_table is None:
+            _route_table = RouteTable()
+        return _route_table
+
+
+def route_latency() -> pd.DataFrame:
+    return get_route_table().latency()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="LLM task routes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="Print the routes in effect (defaults plus FINAI_LLM_ROUTES)")
+    parser.parse_args(argv)
+    print(get_route_table().table().to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
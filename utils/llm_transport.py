@@ -0,0 +1,353 @@
+"""
+Pluggable transports for chat completions.
+
+TogetherClient sends every request through a transport, selected with the
+FINAI_LLM_TRANSPORT setting:
+
+    together  Live Together.ai API (default)
+    mock      OpenAI-compatible HTTP server at FINAI_MOCK_LLM_URL, e.g. the
+              stand-in started with `python -m utils.llm_transport serve`
+    record    Live API, saving every response to FINAI_LLM_CASSETTE
+    replay    Serve responses saved by `record`; no network at all
+
+The mock server answers receipt extraction prompts with deterministic JSON
+built from the receipt text and everything else with synthetic text, with
+configurable latency and error rates.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from utils.settings import get_setting
+
+DEFAULT_MOCK_URL = "http://127.0.0.1:8765"
+DEFAULT_CASSETTE = os.path.join(".finai", "llm_cassette.jsonl")
+RECEIPT_MARKER = "Extracted Receipt Text:"
+
+
+class LLMTransportError(RuntimeError):
+    """A completion request failed at the transport level"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for synthetic usage figures"""
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def _response_from_payload(payload: Dict):
+    """Wrap an OpenAI-style JSON body so it reads like a Together SDK response"""
+    usage = payload.get("usage") or {}
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=c["message"]["content"]))
+                 for c in payload.get("choices", [])],
+        usage=SimpleNamespace(prompt_tokens=usage.get("prompt_tokens", 0),
+                              completion_tokens=usage.get("completion_tokens", 0)),
+        model=payload.get("model")
+    )
+
+
+def _payload_from_response(response) -> Dict:
+    usage = getattr(response, "usage", None)
+    return {
+        "model": getattr(response, "model", None),
+        "choices": [{"message": {"role": "assistant", "content": c.message.content}} for c in response.choices],
+        "usage": {"prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                  "completion_tokens": getattr(usage, "completion_tokens", 0) or 0}
+    }
+
+
+def request_key(request: Dict) -> str:
+    """Stable hash of a completion request, used to match recorded responses"""
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMTransport:
+    """
+    Sends one chat completion request; subclasses implement create().
+    `timeout` (seconds) bounds the request and is not part of it.
+    """
+
+    name = "base"
+
+    def create(self, timeout: Optional[float] = None, **request):
+        raise NotImplementedError
+
+
+class TogetherTransport(LLMTransport):
+    """The live Together.ai API"""
+
+    name = "together"
+
+    def __init__(self, api_key: Optional[str] = None):
+        from together import Together
+        api_key = api_key or get_setting("TOGETHER_API_KEY")
+        if not api_key:
+            raise ValueError("TOGETHER_API_KEY not found in environment variables")
+        self.client = Together(api_key=api_key)
+
+    def create(self, timeout: Optional[float] = None, **request):
+        if timeout is not None:
+            request["timeout"] = timeout
+        return self.client.chat.completions.create(**request)
+
+
+class HTTPTransport(LLMTransport):
+    """Any OpenAI-compatible endpoint, such as the local mock server"""
+
+    name = "mock"
+
+    def __init__(self, base_url: str = DEFAULT_MOCK_URL, timeout: float = 60.0):
+        self.url = base_url.rstrip("/") + "/v1/chat/completions"
+        self.timeout = timeout
+
+    def create(self, timeout: Optional[float] = None, **request):
+        body = json.dumps(request).encode("utf-8")
+        http_request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(http_request, timeout=timeout or self.timeout) as response:
+                return _response_from_payload(json.loads(response.read()))
+        except urllib.error.HTTPError as e:
+            raise LLMTransportError(f"HTTP {e.code}: {e.read().decode('utf-8', 'ignore')[:200]}", e.code) from e
+        except urllib.error.URLError as e:
+            raise LLMTransportError(f"Cannot reach {self.url}: {e.reason}") from e
+
+
+class RecordReplayTransport(LLMTransport):
+    """
+    Record responses from another transport to a JSONL cassette, or replay them.
+
+    Requests are matched on a hash of the full request (model, messages,
+    temperature, ...), so a replay is deterministic and needs no network.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", inner: Optional[LLMTransport] = None):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be 'record' or 'replay'")
+        if mode == "record" and inner is None:
+            raise ValueError("record mode needs a transport to record from")
+        self.path = path
+        self.mode = mode
+        self.name = mode
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._responses: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._responses[entry["key"]] = entry["response"]
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def create(self, timeout: Optional[float] = None, **request):
+        key = request_key(request)
+        with self._lock:
+            payload = self._responses.get(key)
+        if payload is not None:
+            return _response_from_payload(payload)
+        if self.mode == "replay":
+            raise LLMTransportError(f"No recorded response for request {key[:12]}")
+
+        payload = _payload_from_response(self.inner.create(timeout=timeout, **request))
+        with self._lock:
+            self._responses[key] = payload
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "model": request.get("model"), "response": payload}) + "\n")
+        return _response_from_payload(payload)
+
+
+def create_transport(kind: Optional[str] = None) -> LLMTransport:
+    """Build the transport named by `kind` or the FINAI_LLM_TRANSPORT setting"""
+    kind = (kind or get_setting("FINAI_LLM_TRANSPORT", "together")).lower()
+    cassette = get_setting("FINAI_LLM_CASSETTE", DEFAULT_CASSETTE)
+    if kind == "together":
+        return TogetherTransport()
+    if kind == "mock":
+        return HTTPTransport(get_setting("FINAI_MOCK_LLM_URL", DEFAULT_MOCK_URL))
+    if kind == "record":
+        return RecordReplayTransport(cassette, "record", TogetherTransport())
+    if kind == "replay":
+        return RecordReplayTransport(cassette, "replay")
+    raise ValueError(f"Unknown LLM transport '{kind}'. Use together, mock, record or replay")
+
+
+# --- Mock completion server ---
+
+_AMOUNT_PATTERN = re.compile(r"(?<![\d.])(\d{1,6}(?:,\d{3})*\.\d{2})(?![\d.])")
+_DATE_PATTERN = re.compile(r"\b(\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{4}|\d{1,2}-[A-Za-z]{3}-\d{4})\b")
+
+
+def synthetic_receipt(receipt_text: str) -> Dict:
+    """Deterministic extraction result derived from the receipt text itself"""
+    from utils.receipts import map_category_to_predefined
+
+    lines = [line.strip() for line in receipt_text.splitlines() if re.search(r"[A-Za-z0-9]", line)]
+    amounts = [float(a.replace(",", "")) for a in _AMOUNT_PATTERN.findall(receipt_text)]
+    date_match = _DATE_PATTERN.search(receipt_text)
+    line_items = []
+    for line in lines:
+        found = _AMOUNT_PATTERN.findall(line)
+        label = _AMOUNT_PATTERN.sub("", line).strip(" :$-\t")
+        if found and label and not re.search(r"total|tax|balance|due", label, re.I):
+            line_items.append({"description": label[:60], "amount": float(found[-1].replace(",", "")), "quantity": 1})
+    return {
+        "amount": {"value": max(amounts) if amounts else 0.0, "confidence": 0.9 if amounts else 0.2},
+        "merchant": {"value": lines[0][:60] if lines else "Unknown", "confidence": 0.8 if lines else 0.1},
+        "date": {"value": date_match.group(1) if date_match else "", "confidence": 0.9 if date_match else 0.1},
+        "category": {"value": map_category_to_predefined(receipt_text), "confidence": 0.7},
+        "description": " ".join(lines[:3])[:200],
+        "line_items": line_items[:50]
+    }
+
+
+class MockCompletionBackend:
+    """
+    Produces completions for the mock server.
+
+    Canned responses ({"match": substring, "content": str} entries) win
+    over synthetic ones; latency and errors are drawn from a seeded RNG so a
+    serial benchmark run is reproducible.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 0, canned: Optional[List[Dict]] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.canned = canned or []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _content(self, request: Dict) -> str:
+        prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+        for entry in self.canned:
+            if entry.get("match", "") in prompt:
+                return entry["content"] if isinstance(entry["content"], str) else json.dumps(entry["content"])
+        wants_json = (request.get("response_format") or {}).get("type") == "json_object"
+        if RECEIPT_MARKER in prompt:
+            text = prompt.split(RECEIPT_MARKER, 1)[1]
+            return json.dumps(synthetic_receipt(text.split("data:image/", 1)[0]))
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if wants_json:
+            return json.dumps({"mock": True, "request": digest[:12]})
+        words = max(8, min(int(request.get("max_tokens") or 256) // 4, 300))
+        return f"Mock response {digest[:8]}. " + " ".join(f"insight{i % 17}" for i in range(words))
+
+    def complete(self, request: Dict) -> Tuple[int, Dict]:
+        """Returns (HTTP status, JSON body)"""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+            status = self._rng.choice((429, 500, 503)) if fail else 200
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return status, {"error": {"message": "Injected mock failure", "type": "mock_error"}}
+
+        content = self._content(request)
+        prompt = "".join(str(m.get("content", "")) for m in request.get("messages", []))
+        return 200, {
+            "id": f"mock-{self.requests}",
+            "object": "chat.completion",
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)}
+        }
+
+
+def _handler_for(backend: MockCompletionBackend):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._send(404, {"error": {"message": "Not found"}})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except (ValueError, json.JSONDecodeError):
+                return self._send(400, {"error": {"message": "Invalid JSON"}})
+            self._send(*backend.complete(request))
+
+        def _send(self, status: int, body: Dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # keep benchmark output clean
+
+    return Handler
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0,
+                      **backend_options) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the mock server on a background thread.
+
+    Port 0 picks a free port. Returns the server (call shutdown() when done)
+    and its base URL, suitable for HTTPTransport or FINAI_MOCK_LLM_URL.
+    """
+    backend = MockCompletionBackend(**backend_options)
+    server = ThreadingHTTPServer((host, port), _handler_for(backend))
+    server.daemon_threads = True
+    server.backend = backend
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Together.ai completions API")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Run the mock completion server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency-ms", type=float, default=0.0, help="Mean response latency")
+    serve.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- latency jitter")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 429/5xx")
+    serve.add_argument("--seed", type=int, default=0)
+    serve.add_argument("--responses", help="JSON file of canned {match, content} responses")
+    args = parser.parse_args(argv)
+
+    canned = None
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            canned = json.load(f)
+    server, url = start_mock_server(args.host, args.port, latency_ms=args.latency_ms,
+                                    jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                                    seed=args.seed, canned=canned)
+    print(f"Mock LLM server listening on {url} (set FINAI_LLM_TRANSPORT=mock, FINAI_MOCK_LLM_URL={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+SQLite stand-in for the Snowflake connection.
+
+Selected with FINAI_STORAGE_BACKEND=sqlite (database file at FINAI_SQLITE_PATH).
+The wrappers accept the Snowflake SQL used in utils.snowflake_conn unchanged:
+%s placeholders, CREATE OR REPLACE VIEW, CURRENT_TIMESTAMP() and upper-case
+column names in cursor.description, so loaders behave the same on both.
+"""
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from utils.settings import get_setting
+
+DEFAULT_SQLITE_PATH = os.path.join(".finai", "finai.sqlite3")
+
+_CREATE_OR_REPLACE_VIEW = re.compile(r"^\s*CREATE\s+OR\s+REPLACE\s+VIEW\s+(\w+)", re.IGNORECASE)
+
+
+def storage_backend() -> str:
+    """'snowflake' (default) or 'sqlite'"""
+    return str(get_setting("FINAI_STORAGE_BACKEND", "snowflake")).lower()
+
+
+def sqlite_path() -> str:
+    return get_setting("FINAI_SQLITE_PATH", DEFAULT_SQLITE_PATH)
+
+
+def _adapt(value):
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def translate(sql: str) -> List[str]:
+    """Rewrite one Snowflake statement into the SQLite statement(s) it means"""
+    sql = sql.replace("%s", "?").replace("CURRENT_TIMESTAMP()", "CURRENT_TIMESTAMP")
+    match = _CREATE_OR_REPLACE_VIEW.match(sql)
+    if match:
+        return [f"DROP VIEW IF EXISTS {match.group(1)}", _CREATE_OR_REPLACE_VIEW.sub(f"CREATE VIEW {match.group(1)}", sql)]
+    return [sql]
+
+
+class SQLiteCursor:
+    """Cursor with the subset of the Snowflake cursor API the app uses"""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params: Optional[Sequence] = None):
+        statements = translate(sql)
+        for statement in statements[:-1]:
+            self._cursor.execute(statement)
+        self._cursor.execute(statements[-1], tuple(_adapt(p) for p in params or ()))
+        return self
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence]):
+        (statement,) = translate(sql)
+        self._cursor.executemany(statement, (tuple(_adapt(p) for p in params) for params in seq_of_params))
+        return self
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        # Snowflake reports unquoted identifiers upper-case
+        if self._cursor.description is None:
+            return None
+        return [(col[0].upper(),) + tuple(col[1:]) for col in self._cursor.description]
+
+
+class SQLiteConnection:
+    """Context-managed connection that commits on success, like the Snowflake one"""
+
+    def __init__(self, path: str):
+        if os.path.dirname(os.path.abspath(path)):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self._conn.close()
+        return False
+
+    def write_frame(self, df: pd.DataFrame, table_name: str) -> int:
+        """Append a DataFrame to an existing table (write_pandas equivalent)"""
+        columns = [str(c).lower() for c in df.columns]
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        self.cursor().executemany(
+            f"INSERT INTO {table_name.lower()} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+            rows
+        )
+        return len(df)
+
+
+def connect_sqlite(path: Optional[str] = None) -> SQLiteConnection:
+    return SQLiteConnection(path or sqlite_path())
@@ -0,0 +1,285 @@
+"""
+Merchant canonicalization.
+
+OCR and the LLM spell one merchant many ways ("STARBUCKS #1234",
+"Starbucks Coffee", "starbucks"). Each raw name is normalized (case,
+punctuation, store numbers, company suffixes) and matched against the
+known merchants: candidates come from character trigram blocking and are
+scored with token-set similarity. The result is stored in the
+merchant_aliases table and memoized, so each spelling is matched once.
+
+Transactions carry the result in canonical_merchant; rows logged before
+it existed are filled in by the backfill, and a wrong match can be fixed
+with a manual alias:
+
+    python -m utils.merchants backfill
+    python -m utils.merchants alias "SBUX" "Starbucks"
+"""
+import argparse
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from utils.snowflake_conn import bump_generation, get_conn
+from utils.tracing import traced
+
+MATCH_THRESHOLD = 0.88
+MAX_CANDIDATES = 10
+MIN_SHARED_GRAMS = 2
+
+_STORE_NUMBER = re.compile(r"(#\s*\d+|\b(store|unit|location|no)\.?\s*\d+\b|\b\d{3,}\b)")
+_NON_WORD = re.compile(r"[^0-9a-z&]+")
+_SUFFIXES = {"inc", "llc", "ltd", "co", "corp", "corporation", "company", "plc", "gmbh", "the"}
+# Descriptor words a merchant's name may carry or drop without naming a different business
+_GENERIC = {
+    "coffee", "cafe", "store", "stores", "shop", "market", "supermarket", "supercenter", "mart",
+    "restaurant", "grill", "kitchen", "bakery", "pharmacy", "station", "gas", "fuel", "online",
+    "com", "www", "marketplace", "mktplace", "mktp", "retail", "outlet", "usa", "and",
+}
+
+
+def normalize_merchant(name: str) -> str:
+    """Matching key for a raw merchant name"""
+    text = _STORE_NUMBER.sub(" ", str(name or "").lower())
+    tokens = [t for t in _NON_WORD.sub(" ", text).split() if t not in _SUFFIXES]
+    return " ".join(tokens)
+
+
+def display_name(name: str) -> str:
+    """Readable canonical name for the first spelling of a new merchant"""
+    text = " ".join(_STORE_NUMBER.sub(" ", str(name or "")).split()).strip(" -,.")
+    if not text.isupper():
+        return text
+    # Title-case shouted names but keep short acronyms ("AWS", "CVS")
+    return " ".join(word.title() if len(word) > 3 else word for word in text.split())
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def token_set_similarity(a: str, b: str) -> float:
+    """
+    Token-set ratio of two normalized names: 1.0 when one name's words are
+    a subset of the other's and the words left over are generic descriptors
+    ("starbucks coffee" / "starbucks"), falling back to plain string
+    similarity.
+    """
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    common = " ".join(sorted(tokens_a & tokens_b))
+    rest_a = " ".join(sorted(tokens_a - tokens_b))
+    rest_b = " ".join(sorted(tokens_b - tokens_a))
+    full_a, full_b = f"{common} {rest_a}".strip(), f"{common} {rest_b}".strip()
+    scores = [SequenceMatcher(None, a, b).ratio(), SequenceMatcher(None, full_a, full_b).ratio()]
+    if common:
+        # A subset only counts when it keeps the leading (usually brand) word,
+        # so "coffee" does not absorb "blue bottle coffee", and drops nothing
+        # but descriptors, so "uber" does not absorb "uber eats"
+        shorter, longer = sorted((a, b), key=len)
+        leftover = tokens_a ^ tokens_b
+        if longer.split()[0] in shorter.split() and all(t in _GENERIC or len(t) <= 2 for t in leftover):
+            scores += [SequenceMatcher(None, common, full_a).ratio(), SequenceMatcher(None, common, full_b).ratio()]
+    return max(scores)
+
+
+class MerchantCanonicalizer:
+    """
+    In-memory alias map and trigram index over canonical merchants.
+
+    New spellings are queued and written to merchant_aliases by save().
+    """
+
+    def __init__(self, threshold: float = MATCH_THRESHOLD):
+        self.threshold = threshold
+        self._aliases: Dict[str, str] = {}         # normalized spelling -> canonical name
+        self._canonical: Dict[str, str] = {}       # normalized canonical -> canonical name
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        self._pending: List[Tuple[str, str, float, str]] = []
+        self._lock = threading.RLock()
+
+    def _add_canonical(self, key: str, name: str):
+        if key not in self._canonical:
+            self._canonical[key] = name
+            for gram in _trigrams(key):
+                self._grams[gram].add(key)
+
+    @traced("db.load_merchant_aliases")
+    def load(self) -> "MerchantCanonicalizer":
+        """Read the stored aliases"""
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT alias, canonical FROM merchant_aliases")
+            rows = cursor.fetchall()
+        with self._lock:
+            for alias, canonical in rows:
+                self._aliases[alias] = canonical
+                self._add_canonical(normalize_merchant(canonical), canonical)
+        return self
+
+    def _best_match(self, key: str) -> Tuple[Optional[str], float]:
+        shared = Counter()
+        for gram in _trigrams(key):
+            for candidate in self._grams.get(gram, ()):
+                shared[candidate] += 1
+        best, best_score = None, 0.0
+        for candidate, count in shared.most_common(MAX_CANDIDATES):
+            if count < MIN_SHARED_GRAMS:
+                break
+            score = token_set_similarity(key, candidate)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best, best_score
+
+    def canonicalize(self, name: str) -> str:
+        """Canonical name for a raw merchant; unseen names become new merchants"""
+        key = normalize_merchant(name)
+        if not key:
+            return str(name or "").strip()
+        with self._lock:
+            canonical = self._aliases.get(key)
+            if canonical is not None:
+                return canonical
+            match, score = self._best_match(key)
+            if match is not None and score >= self.threshold:
+                canonical, source = self._canonical[match], "auto"
+            else:
+                canonical, score, source = display_name(name) or key, 1.0, "new"
+                self._add_canonical(key, canonical)
+            self._aliases[key] = canonical
+            self._pending.append((key, canonical, float(score), source))
+            return canonical
+
+    def canonicalize_many(self, names: Iterable[str]) -> Dict[str, str]:
+        """Canonical name for each distinct raw name"""
+        return {name: self.canonicalize(name) for name in dict.fromkeys(names)}
+
+    def set_alias(self, name: str, canonical: str):
+        """Manually map a spelling to a merchant (saved on the next save())"""
+        key = normalize_merchant(name)
+        with self._lock:
+            self._add_canonical(normalize_merchant(canonical), canonical)
+            self._aliases[key] = canonical
+            self._pending.append((key, canonical, 1.0, "manual"))
+
+    @traced("db.save_merchant_aliases", measure=lambda n: {"rows": n})
+    def save(self) -> int:
+        """Write queued aliases; manual ones replace earlier mappings"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        pending = list({p[0]: p for p in pending}.values())
+        try:
+            with get_conn() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("DELETE FROM merchant_aliases WHERE alias = %s", [(p[0],) for p in pending])
+                cursor.executemany(
+                    "INSERT INTO merchant_aliases (alias, canonical, score, source) VALUES (%s, %s, %s, %s)",
+                    pending
+                )
+                conn.commit()
+            return len(pending)
+        except Exception as e:
+            print(f"Saving merchant aliases failed: {e}")
+            with self._lock:
+                self._pending = pending + self._pending
+            return 0
+
+
+def merchant_key(df: pd.DataFrame) -> pd.Series:
+    """canonical_merchant where set, else the raw merchant (for grouping)"""
+    merchant = df['merchant'].astype(object)
+    if 'canonical_merchant' not in df.columns:
+        return merchant
+    return df['canonical_merchant'].astype(object).where(df['canonical_merchant'].notna(), merchant)
+
+
+@traced("db.backfill_canonical_merchants", measure=lambda n: {"rows": n})
+def backfill_canonical_merchants(canonicalizer: Optional["MerchantCanonicalizer"] = None) -> int:
+    """
+    Fill canonical_merchant for rows that have none. Each distinct raw
+    merchant is matched once and written with one UPDATE per spelling,
+    not per row. Returns the number of rows updated.
+    """
+    canonicalizer = canonicalizer or get_merchant_canonicalizer()
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT merchant FROM transactions WHERE canonical_merchant IS NULL")
+        names = [row[0] for row in cursor.fetchall() if row[0] is not None]
+    if not names:
+        return 0
+    mapping = canonicalizer.canonicalize_many(names)
+    canonicalizer.save()
+    return _write_canonical(mapping, only_missing=True)
+
+
+def _write_canonical(mapping: Dict[str, str], only_missing: bool) -> int:
+    condition = " AND canonical_merchant IS NULL" if only_missing else ""
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"UPDATE transactions SET canonical_merchant = %s WHERE merchant = %s{condition}",
+            [(canonical, name) for name, canonical in mapping.items()]
+        )
+        updated = cursor.rowcount
+        conn.commit()
+    bump_generation("transactions")
+    return updated
+
+
+def apply_alias(name: str, canonical: str, canonicalizer: Optional[MerchantCanonicalizer] = None) -> int:
+    """Map a spelling to a merchant and relabel the transactions already stored under it"""
+    canonicalizer = canonicalizer or get_merchant_canonicalizer()
+    canonicalizer.set_alias(name, canonical)
+    canonicalizer.save()
+    key = normalize_merchant(name)
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT merchant FROM transactions")
+        matching = [row[0] for row in cursor.fetchall() if row[0] is not None and normalize_merchant(row[0]) == key]
+    return _write_canonical({m: canonical for m in matching}, only_missing=False) if matching else 0
+
+
+_canonicalizer: Optional[MerchantCanonicalizer] = None
+_canonicalizer_lock = threading.Lock()
+
+
+def get_merchant_canonicalizer() -> MerchantCanonicalizer:
+    """Process-wide canonicalizer, loaded from merchant_aliases once"""
+    global _canonicalizer
+    with _canonicalizer_lock:
+        if _canonicalizer is None:
+            canonicalizer = MerchantCanonicalizer()
+            try:
+                canonicalizer.load()
+            except Exception as e:
+                print(f"Loading merchant aliases failed: {e}")
+            _canonicalizer = canonicalizer
+        return _canonicalizer
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Merchant canonicalization")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill", help="Fill canonical_merchant for existing transactions")
+    alias = sub.add_parser("alias", help="Map a spelling to a merchant")
+    alias.add_argument("name")
+    alias.add_argument("canonical")
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        print(f"Updated {backfill_canonical_merchants()} transactions")
+    else:
+        updated = apply_alias(args.name, args.canonical)
+        print(f"{normalize_merchant(args.name)!r} -> {args.canonical!r} ({updated} transactions relabelled)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+from utils.projection_engine import DEFAULT_ANNUAL_RATE, RISK_PROFILE_RATES
+
+# Annual volatility per risk profile; expected returns come from RISK_PROFILE_RATES
+RISK_PROFILE_VOLATILITY = {"Conservative": 0.05, "Moderate": 0.10, "Aggressive": 0.16}
+DEFAULT_VOLATILITY = 0.10
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+# Working-set budget per chunk; total memory stays bounded regardless of n_paths
+DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024
+MAX_CHECKPOINTS = 60
+
+
+def simulate_savings(goal_amount: float,
+                     current_savings: float,
+                     monthly_contribution: float,
+                     months: int,
+                     risk_profile: str = "Moderate",
+                     n_paths: int = 10000,
+                     seed: Optional[int] = None,
+                     annual_return: Optional[float] = None,
+                     annual_volatility: Optional[float] = None,
+                     percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                     chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Dict:
+    """
+    Monte Carlo savings projection with log-normal monthly returns.
+
+    Paths are generated in chunks sized to `chunk_bytes`, so memory is
+    bounded by the chunk plus one float32 row of checkpoints per path.
+    Results are identical for a given seed whatever the chunk size.
+
+    Args:
+        goal_amount: Target balance
+        current_savings: Starting balance
+        monthly_contribution: Amount added at the end of every month
+        months: Horizon in months
+        risk_profile: Key of RISK_PROFILE_RATES / RISK_PROFILE_VOLATILITY
+        n_paths: Number of simulated return paths
+        seed: Seed for reproducible results
+        annual_return / annual_volatility: Override the profile assumptions
+        percentiles: Percentile bands to report
+
+    Returns:
+        Dictionary with checkpoint months, percentile bands per checkpoint,
+        probability of having reached the goal by every month and summary
+        statistics of the final balance
+    """
+    if months < 1 or n_paths < 1:
+        raise ValueError("months and n_paths must be positive")
+
+    mean = RISK_PROFILE_RATES.get(risk_profile, DEFAULT_ANNUAL_RATE) if annual_return is None else annual_return
+    vol = RISK_PROFILE_VOLATILITY.get(risk_profile, DEFAULT_VOLATILITY) if annual_volatility is None else annual_volatility
+    # Monthly log-return parameters whose mean matches the deterministic projection
+    sigma = np.float32(vol / np.sqrt(12))
+    mu = np.float32(np.log1p(mean / 12) - 0.5 * sigma ** 2)
+
+    step = max(1, -(-months // MAX_CHECKPOINTS))
+    checkpoints = np.unique(np.append(np.arange(0, months + 1, step), months))
+    checkpoint_idx = checkpoints[1:] - 1  # column index in the per-month arrays
+
+    snapshot = np.empty((n_paths, len(checkpoints)), dtype=np.float32)
+    snapshot[:, 0] = current_savings
+    first_hits = np.zeros(months + 1, dtype=np.int64)
+    chunk = max(1, min(n_paths, chunk_bytes // (months * 4 * 2)))
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, n_paths, chunk):
+        rows = min(chunk, n_paths - start)
+        # Cumulative growth G_t, then B_t = G_t * (P + c * sum_{j<=t} 1/G_j)
+        growth = rng.standard_normal((rows, months), dtype=np.float32)
+        growth *= sigma
+        growth += mu
+        np.cumsum(growth, axis=1, out=growth)
+        np.exp(growth, out=growth)
+        balance = np.reciprocal(growth)
+        np.cumsum(balance, axis=1, out=balance)
+        balance *= np.float32(monthly_contribution)
+        balance += np.float32(current_savings)
+        balance *= growth
+
+        snapshot[start:start + rows, 1:] = balance[:, checkpoint_idx]
+        reached = balance >= goal_amount
+        hit = reached.any(axis=1)
+        first_hits += np.bincount(reached.argmax(axis=1)[hit] + 1, minlength=months + 1)
+
+    if current_savings >= goal_amount:
+        prob_by_month = np.ones(months + 1)
+    else:
+        prob_by_month = np.cumsum(first_hits) / n_paths
+
+    bands = np.percentile(snapshot, percentiles, axis=0)
+    final = snapshot[:, -1]
+    return {
+        "months": checkpoints,
+        "percentiles": {p: band for p, band in zip(percentiles, bands)},
+        "prob_reached_by_month": prob_by_month,
+        "prob_goal": float(np.mean(final >= goal_amount)),
+        "final_mean": float(final.mean()),
+        "final_median": float(np.median(final)),
+        "n_paths": n_paths,
+        "seed": seed
+    }
+
+
+def probability_by_month(result: Dict, month: int) -> float:
+    """Probability the goal was reached on or before `month`"""
+    probs = result["prob_reached_by_month"]
+    return float(probs[min(max(month, 0), len(probs) - 1)])
+
+
+def simulate_profiles(goal_amount: float, current_savings: float, monthly_contribution: float,
+                      months: int, n_paths: int = 10000, seed: Optional[int] = None,
+                      profiles: Optional[Sequence[str]] = None) -> Dict[str, Dict]:
+    """Run simulate_savings for each risk profile with the same seed"""
+    return {
+        profile: simulate_savings(goal_amount, current_savings, monthly_contribution,
+                                  months, profile, n_paths, seed)
+        for profile in (profiles or RISK_PROFILE_RATES)
+    }
@@ -0,0 +1,136 @@
+"""
+Per-section profiling of a Streamlit rerun.
+
+Each tab body runs inside RerunProfiler.section(); the section records wall
+time, database queries, rows and LLM tokens (rolled up from the tracing
+spans beneath it) and traced memory allocations. In "cprofile" or
+"pyinstrument" mode every section also dumps a profile to FINAI_PROFILE_DIR.
+"""
+import cProfile
+import os
+import re
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils.settings import get_setting
+from utils.tracing import span
+
+DEFAULT_PROFILE_DIR = os.path.join(".finai", "profiles")
+MODES = ("off", "basic", "cprofile", "pyinstrument")
+HISTORY = 20
+
+
+def resolve_mode(value: Optional[str]) -> str:
+    """Map a ?profile= / FINAI_PROFILE value to one of MODES"""
+    value = str(value or "").lower()
+    if value in ("1", "true", "on", "basic"):
+        return "basic"
+    return value if value in MODES else "off"
+
+
+class RerunProfiler:
+    """
+    Collects one row per profiled section for every rerun.
+
+    Kept in session state so recent reruns can be compared; a disabled
+    profiler adds no overhead beyond a context manager per tab.
+    """
+
+    def __init__(self, mode: str = "off", dump_dir: Optional[str] = None):
+        self.mode = mode
+        self.dump_dir = dump_dir or get_setting("FINAI_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+        self.history: deque = deque(maxlen=HISTORY)
+        self.sections: List[Dict] = []
+        self.rerun_id: Optional[str] = None
+        self._started_tracemalloc = False
+        self._rerun_start = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def begin(self, mode: Optional[str] = None):
+        """Start a new rerun, optionally switching mode"""
+        if mode is not None:
+            self.mode = mode
+        self.sections = []
+        self.rerun_id = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        self._rerun_start = time.perf_counter()
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        elif not self.enabled and self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def finish(self) -> List[Dict]:
+        """Close the rerun and add it to the history"""
+        if self.enabled and self.sections:
+            total_ms = (time.perf_counter() - self._rerun_start) * 1000
+            self.history.append({"rerun": self.rerun_id, "total_ms": total_ms, "sections": list(self.sections)})
+        return self.sections
+
+    def _start_profiler(self):
+        if self.mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:  # Optional: fall back to the standard library
+                print("pyinstrument not installed; using cProfile")
+                self.mode = "cprofile"
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+        if self.mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        return None
+
+    def _dump(self, profiler, name: str) -> Optional[str]:
+        os.makedirs(self.dump_dir, exist_ok=True)
+        base = os.path.join(self.dump_dir, f"{self.rerun_id}_{re.sub(r'[^A-Za-z0-9_-]', '_', name)}")
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+                profiler.dump_stats(base + ".prof")
+                return base + ".prof"
+            profiler.stop()
+            with open(base + ".html", "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            return base + ".html"
+        except Exception as e:
+            print(f"Profile dump failed: {e}")
+            return None
+
+    @contextmanager
+    def section(self, name: str):
+        """Profile one tab body"""
+        if not self.enabled:
+            yield
+            return
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        start = time.perf_counter()
+        with span(f"tab.{name}") as attrs:
+            profiler = self._start_profiler()
+            try:
+                yield
+            finally:
+                path = self._dump(profiler, name) if profiler is not None else None
+                current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+                self.sections.append({
+                    "tab": name,
+                    "wall_ms": (time.perf_counter() - start) * 1000,
+                    "queries": attrs.get("queries", 0),
+                    "rows": attrs.get("rows", 0),
+                    "tokens": attrs.get("tokens", 0),
+                    "alloc_mb": max(current - memory_before, 0) / 1e6,
+                    "peak_mb": max(peak - memory_before, 0) / 1e6,
+                    "profile": path
+                })
@@ -0,0 +1,97 @@
+import numpy as np
+from typing import Union
+
+ArrayLike = Union[float, np.ndarray]
+
+# Expected annual returns per risk profile
+RISK_PROFILE_RATES = {"Conservative": 0.03, "Moderate": 0.06, "Aggressive": 0.09}
+DEFAULT_ANNUAL_RATE = 0.05
+
+
+def _monthly_rate(annual_rate: ArrayLike) -> np.ndarray:
+    """Nominal annual rate compounded monthly"""
+    return np.asarray(annual_rate, dtype=np.float64) / 12
+
+
+def future_value(current_savings: ArrayLike, monthly_contribution: ArrayLike,
+                 annual_rate: ArrayLike, months: ArrayLike) -> np.ndarray:
+    """
+    Balance after `months` of end-of-month contributions (closed-form annuity).
+
+    All arguments broadcast, so a grid of scenarios is one call:
+    FV = P(1+r)^n + c((1+r)^n - 1)/r, with FV = P + cn when r == 0.
+    """
+    r = _monthly_rate(annual_rate)
+    n = np.asarray(months, dtype=np.float64)
+    p = np.asarray(current_savings, dtype=np.float64)
+    c = np.asarray(monthly_contribution, dtype=np.float64)
+
+    growth = np.power(1 + r, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = np.where(r == 0, n, np.expm1(n * np.log1p(r)) / np.where(r == 0, 1, r))
+    return p * growth + c * annuity
+
+
+def balance_paths(current_savings: ArrayLike, monthly_contribution: ArrayLike,
+                  annual_rate: ArrayLike, months: int) -> np.ndarray:
+    """
+    Month-by-month balances for month 0..`months`.
+
+    Scenario arguments broadcast together; the month axis is appended last,
+    so scalar inputs give shape (months + 1,).
+    """
+    t = np.arange(months + 1, dtype=np.float64)
+    p, c, rate = np.broadcast_arrays(np.asarray(current_savings, dtype=np.float64),
+                                     np.asarray(monthly_contribution, dtype=np.float64),
+                                     np.asarray(annual_rate, dtype=np.float64))
+    return future_value(p[..., None], c[..., None], rate[..., None], t)
+
+
+def scenario_grid(contributions, annual_rates, horizons_months, current_savings: float = 0.0) -> np.ndarray:
+    """
+    Final balances for every contribution x rate x horizon combination.
+
+    Returns:
+        Array of shape (len(contributions), len(annual_rates), len(horizons_months))
+    """
+    c = np.asarray(contributions, dtype=np.float64)[:, None, None]
+    rate = np.asarray(annual_rates, dtype=np.float64)[None, :, None]
+    n = np.asarray(horizons_months, dtype=np.float64)[None, None, :]
+    return future_value(current_savings, c, rate, n)
+
+
+def months_to_goal(goal_amount: ArrayLike, current_savings: ArrayLike,
+                   monthly_contribution: ArrayLike, annual_rate: ArrayLike) -> np.ndarray:
+    """
+    Whole months until the balance first reaches the goal.
+
+    Solves (1+r)^n = (G*r + c) / (P*r + c) for n; unreachable goals
+    (no contribution and no growth) return inf.
+    """
+    r = _monthly_rate(annual_rate)
+    g = np.asarray(goal_amount, dtype=np.float64)
+    p = np.asarray(current_savings, dtype=np.float64)
+    c = np.asarray(monthly_contribution, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = (g * r + c) / (p * r + c)
+        compounding = np.log(ratio) / np.log1p(r)
+        linear = (g - p) / c
+        n = np.where(r == 0, linear, compounding)
+    n = np.where(np.isfinite(n) & (n >= 0), np.ceil(n - 1e-9), np.inf)
+    return np.where(p >= g, 0.0, n)
+
+
+def required_contribution(goal_amount: ArrayLike, current_savings: ArrayLike,
+                          annual_rate: ArrayLike, months: ArrayLike) -> np.ndarray:
+    """Monthly contribution that reaches the goal in exactly `months` (never negative)"""
+    r = _monthly_rate(annual_rate)
+    g = np.asarray(goal_amount, dtype=np.float64)
+    p = np.asarray(current_savings, dtype=np.float64)
+    n = np.asarray(months, dtype=np.float64)
+
+    shortfall = g - p * np.power(1 + r, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = np.where(r == 0, n, np.expm1(n * np.log1p(r)) / np.where(r == 0, 1, r))
+        contribution = np.where(n > 0, shortfall / annuity, np.inf)
+    return np.where(shortfall <= 0, 0.0, contribution)
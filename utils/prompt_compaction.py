@@ -0,0 +1,150 @@
+"""
+Receipt text compaction and chunking ahead of extraction prompts.
+
+OCR and PDF text carries headers, footers, promo copy and blank lines
+that cost tokens without helping extraction. compact_receipt_text()
+normalizes whitespace, drops boilerplate and repeated page headers
+(never a line with an amount), and for longer documents keeps only the
+merchant header and windows of lines around amounts, dates and totals.
+Documents still over the chunk
+budget are split into chunks (each led by the header) that are extracted
+separately and combined with merge_extractions().
+
+Tokens are counted locally with count_tokens(), an approximation of BPE
+tokenizers: about four letters per token, digits in groups of three,
+and runs of a repeated symbol merged.
+"""
+import math
+import re
+from typing import Dict, List
+
+HEADER_LINES = 3            # leading lines kept as the merchant header
+CONTEXT_LINES = 1           # lines kept either side of an amount or date
+WINDOW_MIN_TOKENS = 400     # shorter documents are only normalized
+CHUNK_TOKENS = 1500
+REPEATED_LINE_MIN = 3       # a line seen this often without an amount is a page header/footer
+
+_PIECE = re.compile(r"[^\W\d_]+|\d+|([^\w\s_]|_)\1*")
+_AMOUNT = re.compile(r"(?<![\d.])[-+]?\d+(?:,\d{3})*[.,]\d{2}(?!\d)|[$€£]\s?\d+")
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+_DATE = re.compile(
+    r"\b(?:\d{4}-\d{2}-\d{2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}"
+    rf"|{_MONTHS}\s+\d{{1,2}},?\s+\d{{4}}|\d{{1,2}}[\s-]{_MONTHS}[\s-]\d{{2,4}})\b",
+    re.IGNORECASE,
+)
+_KEY_LINE = re.compile(r"\b(?:sub-?total|total|tax|vat|amount due|balance|invoice|receipt|date)\b", re.IGNORECASE)
+_BOILERPLATE = re.compile(
+    r"thank you|thanks for|visit us|www\.|https?://|survey|feedback|return policy|returns? (?:within|accepted)"
+    r"|follow us|customer copy|merchant copy|terms (?:and|&) conditions|save up to|coupon|promo"
+    r"|rewards? (?:member|points)|sign up|please (?:come|retain|keep)|have a (?:nice|great)"
+    r"|^page \d+(?: of \d+)?$|^[\W_]+$",
+    re.IGNORECASE,
+)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of `text` without a tokenizer download"""
+    tokens = 0
+    for match in _PIECE.finditer(text or ""):
+        piece = match.group()
+        # Digits group by three; words and runs of one symbol ("-----") by about four
+        tokens += math.ceil(len(piece) / (3 if piece[0].isdigit() else 4))
+    # Roughly one token per line break
+    return tokens + (text or "").count("\n")
+
+
+def normalize_lines(text: str) -> List[str]:
+    """Non-empty lines with runs of whitespace collapsed"""
+    lines = (re.sub(r"\s+", " ", line).strip() for line in (text or "").replace("\r", "\n").splitlines())
+    return [line for line in lines if line]
+
+
+def _is_anchor(line: str) -> bool:
+    return bool(_AMOUNT.search(line) or _DATE.search(line) or _KEY_LINE.search(line))
+
+
+def compact_receipt_text(text: str, window_min_tokens: int = WINDOW_MIN_TOKENS) -> str:
+    """
+    Normalized text without boilerplate and repeated page headers/footers.
+    Past `window_min_tokens`, only the header and the lines around amounts,
+    dates and totals are kept.
+    """
+    lines = normalize_lines(text)
+    counts: Dict[str, int] = {}
+    for line in lines:
+        counts[line.lower()] = counts.get(line.lower(), 0) + 1
+
+    kept, seen = [], set()
+    for line in lines:
+        key = line.lower()
+        # Lines carrying an amount (discounts, promo credits) always stay: the total depends on them
+        has_amount = bool(_AMOUNT.search(line))
+        if _BOILERPLATE.search(line) and not has_amount and not _KEY_LINE.search(line):
+            continue
+        if counts[key] >= REPEATED_LINE_MIN and not has_amount:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(line)
+
+    if count_tokens("\n".join(kept)) > window_min_tokens:
+        keep = set(range(min(HEADER_LINES, len(kept))))
+        for i, line in enumerate(kept):
+            if _is_anchor(line):
+                keep.update(range(max(i - CONTEXT_LINES, 0), min(i + CONTEXT_LINES + 1, len(kept))))
+        kept = [line for i, line in enumerate(kept) if i in keep]
+    return "\n".join(kept)
+
+
+def chunk_receipt_text(text: str, max_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """
+    Split compacted text into chunks of at most about `max_tokens`, each
+    starting with the merchant header so it can be extracted on its own.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    lines = text.split("\n")
+    header, body = lines[:HEADER_LINES], lines[HEADER_LINES:]
+    header_tokens = count_tokens("\n".join(header))
+    chunks, current, used = [], [], header_tokens
+    for line in body:
+        tokens = count_tokens(line) + 1
+        if current and used + tokens > max_tokens:
+            chunks.append("\n".join(header + current))
+            current, used = [], header_tokens
+        current.append(line)
+        used += tokens
+    if current:
+        chunks.append("\n".join(header + current))
+    return chunks
+
+
+def _confidence(field) -> float:
+    return float(field.get("confidence") or 0) if isinstance(field, dict) else 0.0
+
+
+def merge_extractions(parts: List[Dict], chunks: List[str]) -> Dict:
+    """
+    Combine per-chunk extractions of one document: the most confident
+    merchant, date and category, the amount from the last chunk that has a
+    total (totals close a document), and the line items of every chunk.
+    """
+    merged = dict(parts[0])
+    for field in ("merchant", "date", "category"):
+        filled = [p[field] for p in parts if isinstance(p.get(field), dict) and p[field].get("value")]
+        if filled:
+            merged[field] = max(filled, key=_confidence)
+
+    with_total = [p for p, chunk in zip(parts, chunks) if re.search(r"\btotal\b|amount due", chunk, re.IGNORECASE)]
+    candidates = [p["amount"] for p in (with_total or parts)
+                  if isinstance(p.get("amount"), dict) and p["amount"].get("value")]
+    if candidates:
+        merged["amount"] = candidates[-1] if with_total else max(candidates, key=_confidence)
+
+    # Items read from the repeated header are counted once, from the first chunk
+    header = "\n".join(chunks[0].split("\n")[:HEADER_LINES]).lower()
+    merged["line_items"] = [
+        item for i, part in enumerate(parts) for item in part.get("line_items") or []
+        if i == 0 or not (isinstance(item, dict) and str(item.get("description") or "").lower() in header)
+    ]
+    return merged
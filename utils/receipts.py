@@ -0,0 +1,132 @@
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+PREDEFINED_CATEGORIES = ["Meals", "Travel", "Office", "Software", "Rent", "Utilities", "Other"]
+DATE_FORMATS = ['%Y-%m-%d', '%d-%b-%Y', '%d/%m/%Y', '%m/%d/%Y', '%Y/%m/%d']
+
+
+def map_category_to_predefined(category, predefined_categories=PREDEFINED_CATEGORIES):
+    """
+    Maps any category to the most relevant predefined category.
+    Uses keyword matching to find the best fit.
+    """
+    if not category:
+        return "Other"
+    
+    category_lower = category.lower()
+    
+    # Define mapping rules for common categories
+    category_mappings = {
+        # Meals & Food
+        "food": "Meals", "restaurant": "Meals", "dining": "Meals", "cafe": "Meals", 
+        "coffee": "Meals", "lunch": "Meals", "dinner": "Meals", "breakfast": "Meals",
+        "groceries": "Meals", "meal": "Meals", "catering": "Meals",
+        
+        # Travel
+        "travel": "Travel", "transport": "Travel", "uber": "Travel", "lyft": "Travel",
+        "taxi": "Travel", "flight": "Travel", "hotel": "Travel", "airbnb": "Travel",
+        "gas": "Travel", "fuel": "Travel", "parking": "Travel", "rental": "Travel",
+        "car": "Travel", "bus": "Travel", "train": "Travel", "subway": "Travel",
+        
+        # Office & Business
+        "office": "Office", "business": "Office", "work": "Office", "professional": "Office",
+        "meeting": "Office", "conference": "Office", "workspace": "Office", "coworking": "Office",
+        "equipment": "Office", "supplies": "Office", "stationery": "Office",
+        
+        # Software & Technology
+        "software": "Software", "cloud": "Software", "saas": "Software", "subscription": "Software",
+        "app": "Software", "platform": "Software", "service": "Software", "digital": "Software",
+        "online": "Software", "web": "Software", "internet": "Software", "hosting": "Software",
+        "domain": "Software", "website": "Software", "api": "Software", "tool": "Software",
+        "development": "Software", "programming": "Software", "tech": "Software",
+        
+        # Rent & Real Estate
+        "rent": "Rent", "lease": "Rent", "property": "Rent", "real estate": "Rent",
+        "apartment": "Rent", "house": "Rent", "accommodation": "Rent", "lodging": "Rent",
+        
+        # Utilities
+        "utility": "Utilities", "electricity": "Utilities", "water": "Utilities", 
+        "gas": "Utilities", "internet": "Utilities", "phone": "Utilities", 
+        "telephone": "Utilities", "mobile": "Utilities", "cable": "Utilities",
+        "tv": "Utilities", "television": "Utilities", "wifi": "Utilities",
+        "broadband": "Utilities", "energy": "Utilities", "power": "Utilities"
+    }
+    
+    # Check for exact matches first
+    for keyword, mapped_category in category_mappings.items():
+        if keyword in category_lower:
+            return mapped_category
+    
+    # Check if the category is already in predefined list
+    if category in predefined_categories:
+        return category
+    
+    # If no match found, return "Other"
+    return "Other"
+
+
+def parse_receipt_date(value: Optional[str]) -> date:
+    """Parse an extracted receipt date, falling back to today"""
+    if value:
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(str(value), fmt).date()
+            except ValueError:
+                continue
+    return datetime.now().date()
+
+
+def normalize_receipt(receipt: Dict) -> Dict:
+    """
+    Prepare an extracted receipt for storage without a human review step:
+    the category is mapped to a predefined one and the date parsed to ISO.
+    """
+    normalized = dict(receipt)
+    category = dict(receipt.get("category") or {})
+    category["value"] = map_category_to_predefined(str(category.get("value") or "Other"))
+    normalized["category"] = category
+    receipt_date = dict(receipt.get("date") or {})
+    receipt_date["value"] = parse_receipt_date(receipt_date.get("value")).strftime('%Y-%m-%d')
+    normalized["date"] = receipt_date
+    return normalized
+
+
+def is_failed_extraction(receipt: Dict) -> bool:
+    """True for the placeholder TogetherClient returns when extraction failed"""
+    fields = ("amount", "merchant", "date", "category")
+    return not any(float((receipt.get(f) or {}).get("confidence") or 0) for f in fields)
+
+
+def item_key(description: str) -> str:
+    """Grouping key for a line item: lower-case words without punctuation or extra spaces"""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(description or "").lower()).split())
+
+
+def normalize_line_items(line_items) -> List[Dict]:
+    """
+    Clean the model's line items for storage.
+
+    Items without a description or a numeric amount are dropped; quantity
+    defaults to 1 and unit_price is amount / quantity.
+    """
+    normalized = []
+    for item in line_items if isinstance(line_items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        key = item_key(item.get("description"))
+        try:
+            amount = float(item.get("amount"))
+            quantity = float(item.get("quantity") or 1)
+        except (TypeError, ValueError):
+            continue
+        if not key or quantity <= 0:
+            continue
+        normalized.append({
+            "description": str(item["description"]).strip()[:200],
+            "item_key": key,
+            "quantity": quantity,
+            "amount": amount,
+            "unit_price": amount / quantity
+        })
+    return normalized
@@ -0,0 +1,307 @@
+"""
+Full-text search over transactions.
+
+A sidecar SQLite FTS5 index (FINAI_SEARCH_INDEX, default
+.finai/search.sqlite3) holds each transaction's merchant, description and
+line-item text. It works the same with either storage backend: new rows
+are added by the transaction insert listener, and rows written by other
+processes are picked up by a periodic catch-up against the transactions
+table, run in a background thread so a search never waits on the scan.
+
+Every query term matches as a prefix ("star" finds "Starbucks"); terms of
+four or more characters also match indexed words one edit away
+("starbuks"). Results are ranked with BM25, merchant matches weighted
+highest.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+import pandas as pd
+
+from utils.settings import get_setting
+from utils.snowflake_conn import get_conn, register_transaction_listener
+from utils.tracing import annotate, span, traced
+
+DEFAULT_INDEX_PATH = os.path.join(".finai", "search.sqlite3")
+COLUMN_WEIGHTS = (4.0, 1.0, 2.0)   # merchant, description, items
+FUZZY_MIN_LENGTH = 4
+MAX_FUZZY_EXPANSIONS = 20
+CATCH_UP_INTERVAL = 60             # seconds between checks for rows written elsewhere
+BATCH_SIZE = 900                   # ids per IN (...) lookup
+OPTIMIZE_AFTER = 10000             # rows added in one catch-up before merging index segments
+
+RESULT_COLUMNS = ['id', 'date', 'merchant', 'description', 'amount', 'snippet', 'score']
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens, split the way the index tokenizer splits them"""
+    return _WORD.findall(str(text or "").lower())
+
+
+def edit_distance(a: str, b: str, limit: int = 1) -> int:
+    """Optimal string alignment distance, giving up early once it exceeds `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _fuzzy_candidate(term: str) -> bool:
+    # Numbers (invoice ids, amounts) only match exactly or by prefix
+    return len(term) >= FUZZY_MIN_LENGTH and not term.isdigit()
+
+
+def _deletes(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class FuzzyVocabulary:
+    """
+    Indexed words keyed by their single-character deletions, so the words
+    one edit away from a query term are found with a few dict lookups
+    instead of a scan of the vocabulary.
+    """
+
+    def __init__(self):
+        self._terms: Set[str] = set()
+        self._by_delete: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, term: str):
+        if not _fuzzy_candidate(term) or term in self._terms:
+            return
+        self._terms.add(term)
+        for key in _deletes(term) | {term}:
+            self._by_delete[key].add(term)
+
+    def lookup(self, term: str) -> List[str]:
+        """Indexed words within one edit (insert, delete, substitute, transpose) of `term`"""
+        candidates = set()
+        for key in _deletes(term) | {term}:
+            candidates |= self._by_delete.get(key, set())
+        return sorted(c for c in candidates if c != term and edit_distance(term, c) <= 1)
+
+
+class SearchIndex:
+    """Thread-safe FTS5 index of transactions"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_setting("FINAI_SEARCH_INDEX", DEFAULT_INDEX_PATH)
+        if os.path.dirname(os.path.abspath(self.path)):
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._lock = threading.RLock()
+        self._vocabulary: Optional[FuzzyVocabulary] = None
+        self._last_catch_up = 0.0
+        self._catch_up_thread: Optional[threading.Thread] = None
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS doc_ids (transaction_id TEXT PRIMARY KEY)")
+            # Indexed columns first so bm25() weights line up with COLUMN_WEIGHTS
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+                    merchant, description, items,
+                    transaction_id UNINDEXED, date UNINDEXED, amount UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            """)
+            # Distinct indexed words for fuzzy lookups (fts5vocab would rescan the whole index)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM doc_ids").fetchone()[0]
+
+    def add_transactions(self, transactions: Iterable[Dict]) -> int:
+        """
+        Index transactions (dicts as passed to log_transaction, optionally
+        with "line_items" or a pre-joined "items" string). Already indexed
+        ids are skipped. Returns the number of rows added.
+        """
+        documents = {}
+        for t in transactions:
+            if not t.get("id"):
+                continue
+            items = t.get("items")
+            if items is None:
+                items = " ".join(str(i.get("description") or "") for i in t.get("line_items") or []
+                                 if isinstance(i, dict))
+            documents[str(t["id"])] = (str(t.get("merchant") or ""), str(t.get("description") or ""), items,
+                                       str(t["id"]), str(t.get("date") or ""), float(t.get("amount") or 0.0))
+        if not documents:
+            return 0
+
+        with self._lock, self._conn:
+            ids = list(documents)
+            for i in range(0, len(ids), BATCH_SIZE):
+                chunk = ids[i:i + BATCH_SIZE]
+                for (existing,) in self._conn.execute(
+                        f"SELECT transaction_id FROM doc_ids WHERE transaction_id IN ({', '.join('?' * len(chunk))})",
+                        chunk):
+                    del documents[existing]
+            self._conn.executemany("INSERT INTO doc_ids (transaction_id) VALUES (?)", ((tid,) for tid in documents))
+            self._conn.executemany(
+                "INSERT INTO docs (merchant, description, items, transaction_id, date, amount) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                documents.values()
+            )
+            terms = set()
+            for merchant, description, items, *_ in documents.values():
+                terms.update(tokenize(f"{merchant} {description} {items}"))
+            self._conn.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)",
+                                   ((t,) for t in terms if _fuzzy_candidate(t)))
+            if self._vocabulary is not None:
+                for term in terms:
+                    self._vocabulary.add(term)
+        return len(documents)
+
+    def _load_vocabulary(self) -> FuzzyVocabulary:
+        if self._vocabulary is None:
+            vocabulary = FuzzyVocabulary()
+            for (term,) in self._conn.execute("SELECT term FROM terms"):
+                vocabulary.add(term)
+            self._vocabulary = vocabulary
+        return self._vocabulary
+
+    def _match_expression(self, query: str, fuzzy: bool) -> Optional[str]:
+        groups = []
+        for token in tokenize(query):
+            alternatives = [f'"{token}"*']
+            if fuzzy and _fuzzy_candidate(token):
+                alternatives += [f'"{t}"' for t in self._load_vocabulary().lookup(token)[:MAX_FUZZY_EXPANSIONS]]
+            groups.append("(" + " OR ".join(alternatives) + ")")
+        return " AND ".join(groups) if groups else None
+
+    def search(self, query: str, limit: int = 50, fuzzy: bool = True) -> pd.DataFrame:
+        """
+        Ranked transactions matching every term of `query`.
+
+        Returns:
+            DataFrame with RESULT_COLUMNS, best match first; the snippet
+            shows the matched text with [brackets]
+        """
+        self.catch_up_in_background()
+        with span("search.query") as attrs, self._lock:
+            expression = self._match_expression(query, fuzzy)
+            if expression is None:
+                return pd.DataFrame(columns=RESULT_COLUMNS)
+            rows = self._conn.execute(f"""
+                SELECT transaction_id, date, merchant, description, amount,
+                       snippet(docs, -1, '[', ']', '…', 10),
+                       -bm25(docs, {', '.join(str(w) for w in COLUMN_WEIGHTS)}) AS score
+                FROM docs
+                WHERE docs MATCH ?
+                ORDER BY score DESC, date DESC
+                LIMIT ?
+            """, (expression, int(limit))).fetchall()
+            attrs["rows"] = len(rows)
+        df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+        if not df.empty:
+            df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
+        return df
+
+    def catch_up(self, force: bool = False) -> int:
+        """
+        Index transactions written without this process's listener (the
+        ingestion CLI, bulk uploads). Checked at most every
+        CATCH_UP_INTERVAL seconds unless forced.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_catch_up < CATCH_UP_INTERVAL:
+            return 0
+        self._last_catch_up = now
+        try:
+            with span("search.catch_up") as attrs:
+                with get_conn() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT COUNT(*) FROM transactions")
+                    if cursor.fetchone()[0] <= len(self):
+                        return 0
+                with self._lock:
+                    indexed = {row[0] for row in self._conn.execute("SELECT transaction_id FROM doc_ids")}
+                added = self.add_transactions(d for d in _load_documents() if d["id"] not in indexed)
+                if added > OPTIMIZE_AFTER:
+                    # Merge the segments a large load leaves behind so the next query stays fast
+                    with self._lock, self._conn:
+                        self._conn.execute("INSERT INTO docs (docs) VALUES ('optimize')")
+                attrs["rows"] = added
+                return added
+        except Exception as e:
+            print(f"Search index catch-up failed: {e}")
+            return 0
+
+    def catch_up_in_background(self, force: bool = False) -> bool:
+        """
+        Start catch_up() in a daemon thread when it is due and not already
+        running; rows it finds show up in later searches. Returns whether
+        a thread was started.
+        """
+        with self._lock:
+            if self._catch_up_thread is not None and self._catch_up_thread.is_alive():
+                return False
+            if not force and time.monotonic() - self._last_catch_up < CATCH_UP_INTERVAL:
+                return False
+            self._catch_up_thread = threading.Thread(target=self.catch_up, kwargs={"force": True},
+                                                     name="search-catch-up", daemon=True)
+            self._catch_up_thread.start()
+            return True
+
+
+@traced("db.search_documents")
+def _load_documents() -> List[Dict]:
+    """Merchant, description and line-item text of every transaction, in one scan of each table"""
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT transaction_id, description FROM line_items ORDER BY transaction_id, line_no")
+        items = defaultdict(list)
+        for transaction_id, description in cursor.fetchall():
+            items[transaction_id].append(description or "")
+        cursor.execute("SELECT id, date, merchant, description, amount FROM transactions")
+        rows = cursor.fetchall()
+    annotate(rows=len(rows))
+    return [{"id": tid, "date": date, "merchant": merchant, "description": description,
+             "amount": amount, "items": " ".join(items.get(tid, []))}
+            for tid, date, merchant, description, amount in rows]
+
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """
+    Process-wide index, kept current by the transaction insert listener.
+    An empty index is built before first use; a stored one is caught up
+    with the transactions table in the background.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = SearchIndex()
+            register_transaction_listener(index.add_transactions)
+            if len(index):
+                index.catch_up_in_background(force=True)
+            else:
+                index.catch_up(force=True)
+            _index = index
+        return _index
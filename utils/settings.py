@@ -0,0 +1,18 @@
+import os
+
+
+def get_setting(name: str, default=None):
+    """
+    Read a setting from Streamlit secrets, falling back to the environment.
+
+    Works outside `streamlit run` (CLI, benchmarks, worker processes) where
+    secrets may be missing or Streamlit is not installed.
+    """
+    try:
+        import streamlit as st
+        value = st.secrets.get(name)
+    except Exception:
+        value = None
+    if value is None or value == "":
+        value = os.getenv(name, default)
+    return value
@@ -1,18 +1,102 @@
 import os
-import snowflake.connector
-from snowflake.connector.pandas_tools import write_pandas
-from typing import List, Dict, Optional, Tuple, Any
+try:
+    import snowflake.connector
+    from snowflake.connector.pandas_tools import write_pandas
+except ImportError:  # Optional with the local SQLite backend
+    snowflake = None
+from typing import List, Dict, Optional, Tuple, Any, Callable
 import uuid
 from datetime import datetime
 import pandas as pd
 from dotenv import load_dotenv
 import streamlit as st
+from utils.frame_schema import TRANSACTION_SCHEMA, apply_schema
+from utils.local_storage import connect_sqlite, storage_backend
+from utils.receipts import normalize_line_items
+from utils.tracing import traced
 
 # Load environment variables
 load_dotenv()
 
+# Per-table write counters. Derived data (forecasts, projections, reports)
+# is cached against these so it is recomputed only after the rows change.
+_data_generations = {"transactions": 0, "income": 0}
+
+def bump_generation(table: str) -> int:
+    """Record that rows in `table` changed and return its new generation"""
+    _data_generations[table] = _data_generations.get(table, 0) + 1
+    return _data_generations[table]
+
+def data_generation(*tables: str) -> Tuple[int, ...]:
+    """Get the current generation of the given tables (all tables by default)"""
+    tables = tables or tuple(sorted(_data_generations))
+    return tuple(_data_generations.get(t, 0) for t in tables)
+
+# Callbacks run after transactions are committed, so incremental indexes
+# and detectors stay current without rescanning the table.
+_transaction_listeners: List[Callable[[List[Dict]], None]] = []
+
+def register_transaction_listener(listener: Callable[[List[Dict]], None]):
+    """Call `listener(transactions)` after every successful insert"""
+    if listener not in _transaction_listeners:
+        _transaction_listeners.append(listener)
+
+def _notify_transaction_listeners(transactions: List[Dict]):
+    """Fan out committed transactions; a failing listener never fails the write"""
+    for listener in list(_transaction_listeners):
+        try:
+            listener(transactions)
+        except Exception as e:
+            print(f"Transaction listener failed: {e}")
+
+# Callbacks run after category corrections are committed, with
+# (transaction id, category, confidence) tuples, so learners see user fixes.
+_category_listeners: List[Callable[[List[Tuple[str, str, float]]], None]] = []
+
+def register_category_listener(listener: Callable[[List[Tuple[str, str, float]]], None]):
+    """Call `listener(updates)` after every successful category update"""
+    if listener not in _category_listeners:
+        _category_listeners.append(listener)
+
+def _notify_category_listeners(updates: List[Tuple[str, str, float]]):
+    for listener in list(_category_listeners):
+        try:
+            listener(updates)
+        except Exception as e:
+            print(f"Category listener failed: {e}")
+
+LINE_ITEM_INSERT = """
+INSERT INTO line_items (
+    id, transaction_id, line_no, date, merchant,
+    description, item_key, quantity, amount, unit_price
+) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+def _line_item_rows(transactions: List[Dict]) -> List[Tuple]:
+    """Rows for the line_items table, keyed by transaction id and position"""
+    rows = []
+    for t in transactions:
+        for line_no, item in enumerate(normalize_line_items(t.get("line_items"))):
+            rows.append((
+                f"{t['id']}:{line_no}",
+                t["id"],
+                line_no,
+                t.get("date", datetime.utcnow()),
+                t.get("merchant", ""),
+                item["description"],
+                item["item_key"],
+                item["quantity"],
+                item["amount"],
+                item["unit_price"]
+            ))
+    return rows
+
+@traced("db.connect", measure=lambda _: {"queries": 1})  # one connection per query helper
 def get_conn():
-    """Get authenticated Snowflake connection"""
+    """Get authenticated Snowflake connection (or the local SQLite stand-in)"""
+    if storage_backend() == "sqlite":
+        return connect_sqlite()
+
     required_vars = ["SNOWFLAKE_USER", "SNOWFLAKE_PASSWORD", 
                    "SNOWFLAKE_ACCOUNT", "SNOWFLAKE_WAREHOUSE",
                    "SNOWFLAKE_DATABASE", "SNOWFLAKE_SCHEMA"]
@@ -33,6 +117,23 @@ def get_conn():
     except Exception as e:
         raise ConnectionError(f"Snowflake connection failed: {str(e)}")
 
+def transactions_marker(cursor) -> Tuple[int, object]:
+    """
+    Row count and latest category update of transactions. Unlike the data
+    generation it also moves when another process writes the table.
+    """
+    cursor.execute("SELECT COUNT(*), MAX(last_updated) FROM transactions")
+    rows, last_updated = cursor.fetchone()
+    return int(rows or 0), last_updated
+
+def _add_column(conn, table: str, column: str, column_type: str):
+    """Add a column to a table created by an older version (no-op when it exists)"""
+    try:
+        conn.cursor().execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    except Exception as e:
+        if "duplicate" not in str(e).lower() and "already exists" not in str(e).lower():
+            raise
+
 def init_db():
     """Initialize database with proper tables and views"""
     try:
@@ -50,10 +151,92 @@ def init_db():
                 category STRING,
                 category_confidence FLOAT,
                 date_confidence FLOAT,
-                is_reconciled BOOLEAN DEFAULT FALSE
+                is_reconciled BOOLEAN DEFAULT FALSE,
+                canonical_merchant STRING,
+                last_updated TIMESTAMP_NTZ
+            )
+            """)
+            _add_column(conn, "transactions", "canonical_merchant", "STRING")
+            _add_column(conn, "transactions", "last_updated", "TIMESTAMP_NTZ")
+
+            # Raw merchant spellings (normalized) and the merchant they belong to
+            conn.cursor().execute("""
+            CREATE TABLE IF NOT EXISTS merchant_aliases (
+                alias STRING PRIMARY KEY,
+                canonical STRING,
+                score FLOAT,
+                source STRING,
+                created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
             )
             """)
             
+            # Receipt line items, written in the same commit as their transaction
+            conn.cursor().execute("""
+            CREATE TABLE IF NOT EXISTS line_items (
+                id STRING PRIMARY KEY,
+                transaction_id STRING,
+                line_no INTEGER,
+                date TIMESTAMP_NTZ,
+                merchant STRING,
+                description STRING,
+                item_key STRING,
+                quantity FLOAT,
+                amount FLOAT,
+                unit_price FLOAT
+            )
+            """)
+
+            # One row per (merchant, amount bucket) charge series; see utils/subscriptions.py
+            conn.cursor().execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                id STRING PRIMARY KEY,
+                merchant STRING,
+                category STRING,
+                amount_bucket INTEGER,
+                last_amount FLOAT,
+                cadence STRING,
+                interval_days FLOAT,
+                interval_mad FLOAT,
+                occurrences INTEGER,
+                last_date TIMESTAMP_NTZ,
+                next_expected TIMESTAMP_NTZ,
+                intervals STRING,
+                is_recurring BOOLEAN
+            )
+            """)
+
+            # Category budgets, their current-period spend and the alerts they raised; see utils/budgets.py
+            conn.cursor().execute("""
+            CREATE TABLE IF NOT EXISTS budgets (
+                category STRING,
+                period STRING,  -- 'week', 'month', 'quarter', 'year'
+                amount_limit FLOAT,
+                PRIMARY KEY (category, period)
+            )
+            """)
+            conn.cursor().execute("""
+            CREATE TABLE IF NOT EXISTS budget_spend (
+                category STRING,
+                period STRING,
+                period_start TIMESTAMP_NTZ,
+                spent FLOAT,
+                PRIMARY KEY (category, period)
+            )
+            """)
+            conn.cursor().execute("""
+            CREATE TABLE IF NOT EXISTS budget_alerts (
+                id STRING PRIMARY KEY,
+                category STRING,
+                period STRING,
+                period_start TIMESTAMP_NTZ,
+                threshold FLOAT,
+                spent FLOAT,
+                amount_limit FLOAT,
+                transaction_id STRING,
+                created_at TIMESTAMP_NTZ
+            )
+            """)
+
             # Create view for easier querying
             conn.cursor().execute("""
             CREATE OR REPLACE VIEW enriched_transactions AS
@@ -68,7 +251,8 @@ def init_db():
                 category, 
                 category_confidence,
                 date_confidence,
-                is_reconciled
+                is_reconciled,
+                canonical_merchant
             FROM transactions
             ORDER BY date DESC
             """)
@@ -105,12 +289,43 @@ def init_db():
                 FROM income
                 ORDER BY date DESC
             """)
+
+            # One signed stream of every money movement: expenses negative, income positive
+            conn.cursor().execute("""
+            CREATE OR REPLACE VIEW ledger AS
+                SELECT
+                    id,
+                    date,
+                    'expense' AS type,
+                    merchant,
+                    category,
+                    description,
+                    CAST(NULL AS STRING) AS payment_method,
+                    -ABS(amount) AS amount,
+                    CAST(NULL AS BOOLEAN) AS is_taxable,
+                    CAST(NULL AS STRING) AS recurrence
+                FROM transactions
+                UNION ALL
+                SELECT
+                    id,
+                    date,
+                    'income' AS type,
+                    source AS merchant,
+                    category,
+                    description,
+                    payment_method,
+                    ABS(amount) AS amount,
+                    is_taxable,
+                    recurrence
+                FROM income
+            """)
             print("Database initialized successfully")
             
     except Exception as e:
         print(f"Database initialization error: {e}")
         raise
 
+@traced("db.log_transaction", measure=lambda _: {"rows": 1})
 def log_transaction(transaction_data: dict) -> str:
     """Log a transaction with automatic ID generation"""
     if 'id' not in transaction_data:
@@ -129,9 +344,9 @@ def log_transaction(transaction_data: dict) -> str:
                     id, date, merchant, merchant_confidence,
                     description, amount, amount_confidence,
                     category, category_confidence, date_confidence,
-                    is_reconciled
+                    is_reconciled, canonical_merchant
                 ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
                 )
                 """,
                 (
@@ -145,17 +360,24 @@ def log_transaction(transaction_data: dict) -> str:
                     transaction_data.get("category", "Other"),
                     float(transaction_data.get("category_confidence", 1.0)),
                     float(transaction_data.get("date_confidence", 1.0)),
-                    bool(transaction_data.get("is_reconciled", False))
+                    bool(transaction_data.get("is_reconciled", False)),
+                    transaction_data.get("canonical_merchant")
                 )
             )
+            line_items = _line_item_rows([transaction_data])
+            if line_items:
+                cursor.executemany(LINE_ITEM_INSERT, line_items)
             conn.commit()
+            bump_generation("transactions")
             
+        _notify_transaction_listeners([transaction_data])
         return transaction_data['id']
     except Exception as e:
         print(f"Transaction logging failed: {e}")
         raise
 # Add these methods to your Snowflake connector
 
+@traced("db.bulk_log_transactions")
 def bulk_log_transactions(transactions: List[Dict]) -> List[str]:
     """Bulk log transactions with automatic ID generation"""
     if not transactions:
@@ -176,8 +398,8 @@ def bulk_log_transactions(transactions: List[Dict]) -> List[str]:
                 id, date, merchant, merchant_confidence,
                 description, amount, amount_confidence,
                 category, category_confidence, date_confidence,
-                is_reconciled
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                is_reconciled, canonical_merchant
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """
             
             # Prepare all values
@@ -194,20 +416,27 @@ def bulk_log_transactions(transactions: List[Dict]) -> List[str]:
                     t.get("category", "Other"),
                     float(t.get("category_confidence", 1.0)),
                     float(t.get("date_confidence", 1.0)),
-                    bool(t.get("is_reconciled", False))
+                    bool(t.get("is_reconciled", False)),
+                    t.get("canonical_merchant")
                 ))
             
-            # Execute the bulk insert
+            # Execute the bulk insert, then the line items in the same transaction
             cursor.executemany(query, values)
+            line_items = _line_item_rows(transactions)
+            if line_items:
+                cursor.executemany(LINE_ITEM_INSERT, line_items)
             conn.commit()
+            bump_generation("transactions")
             
-            return [t['id'] for t in transactions]
+        _notify_transaction_listeners(transactions)
+        return [t['id'] for t in transactions]
     except Exception as e:
         print(f"Bulk transaction logging failed: {e}")
         raise
 
-def bulk_update_categories(self, updates: List[Tuple[str, str, float]]) -> int:
-    """Bulk update transaction categories"""
+@traced("db.bulk_update_categories", measure=lambda n: {"rows": n})
+def bulk_update_categories(updates: List[Tuple[str, str, float]]) -> int:
+    """Bulk update transaction categories from (id, category, confidence) tuples"""
     if not updates:
         return 0
     
@@ -225,13 +454,17 @@ def bulk_update_categories(self, updates: List[Tuple[str, str, float]]) -> int:
             """
             
             # Execute the bulk update
-            cursor.executemany(query, updates)
+            cursor.executemany(query, [(category, confidence, trans_id)
+                                       for trans_id, category, confidence in updates])
             conn.commit()
-            
-            return cursor.rowcount
+            bump_generation("transactions")
+            updated = cursor.rowcount
+        _notify_category_listeners(list(updates))
+        return updated
     except Exception as e:
         print(f"Bulk update failed: {e}")
         return 0
+@traced("db.get_transactions")
 def get_transactions(limit: int = 100) -> List[Tuple]:
     """Get recent transactions as tuples"""
     try:
@@ -252,20 +485,22 @@ def get_transactions(limit: int = 100) -> List[Tuple]:
         print(f"Failed to fetch transactions: {e}")
         return []
 
+@traced("db.get_transactions_as_dataframe")
 def get_transactions_as_dataframe(limit: int = 100) -> pd.DataFrame:
     """Get transactions as DataFrame"""
     columns = [
         'id', 'date', 'merchant', 'merchant_confidence',
         'description', 'amount', 'amount_confidence',
         'category', 'category_confidence', 'date_confidence',
-        'is_reconciled'
+        'is_reconciled', 'canonical_merchant'
     ]
     
     try:
         with get_conn() as conn:
             cursor = conn.cursor()
+            # Name the columns; SELECT * would follow the table's column order
             cursor.execute(f"""
-                SELECT * FROM enriched_transactions
+                SELECT {', '.join(columns)} FROM enriched_transactions
                 ORDER BY date DESC
                 LIMIT {limit}
             """)
@@ -274,16 +509,19 @@ def get_transactions_as_dataframe(limit: int = 100) -> pd.DataFrame:
             
             # Convert data types
             if not df.empty:
-                df['date'] = pd.to_datetime(df['date'])
+                # Receipt dates may be stored without a time part
+                df['date'] = pd.to_datetime(df['date'], format='mixed')
                 numeric_cols = ['amount', 'amount_confidence', 'merchant_confidence',
                               'category_confidence', 'date_confidence']
                 df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
+                df = apply_schema(df, TRANSACTION_SCHEMA)
                 
             return df
     except Exception as e:
         print(f"Failed to create DataFrame: {e}")
         return pd.DataFrame(columns=columns)
 
+@traced("db.update_transaction_category", measure=None)
 def update_transaction_category(transaction_id: str, 
                              new_category: str,
                              confidence: float = 1.0) -> bool:
@@ -300,21 +538,31 @@ def update_transaction_category(transaction_id: str,
                 """,
                 (new_category, confidence, transaction_id)
             )
-            return True
+            conn.commit()
+            bump_generation("transactions")
+        _notify_category_listeners([(transaction_id, new_category, confidence)])
+        return True
     except Exception as e:
         print(f"Update failed: {e}")
         return False
 
+@traced("db.bulk_upload_transactions", measure=lambda n: {"rows": n})
 def bulk_upload_transactions(df: pd.DataFrame) -> int:
     """Bulk upload transactions from DataFrame"""
     try:
         with get_conn() as conn:
+            if storage_backend() == "sqlite":
+                nrows = conn.write_frame(df, "TRANSACTIONS")
+                bump_generation("transactions")
+                return nrows
             success, _, nrows, _ = write_pandas(
                 conn,
                 df,
                 table_name="TRANSACTIONS",
                 auto_create_table=False
             )
+            if success:
+                bump_generation("transactions")
             return nrows if success else 0
     except Exception as e:
         print(f"Bulk upload failed: {e}")
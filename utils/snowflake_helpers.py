@@ -4,6 +4,9 @@ from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import numpy as np
 from utils.income_manager import IncomeManager
+from utils.merchants import get_merchant_canonicalizer, merchant_key
+from utils.receipts import PREDEFINED_CATEGORIES
+from utils.tracing import traced
 from utils.snowflake_conn import (
     bulk_log_transactions,
     bulk_update_categories,
@@ -43,9 +46,14 @@ def log_receipt_transaction(receipt_data: Dict) -> str:
             "category": receipt_data.get("category", {}).get("value", "Other"),
             "category_confidence": float(receipt_data.get("category", {}).get("confidence", 1.0)),
             "date": receipt_data.get("date", {}).get("value", datetime.utcnow()),
-            "date_confidence": float(receipt_data.get("date", {}).get("confidence", 1.0))
+            "date_confidence": float(receipt_data.get("date", {}).get("confidence", 1.0)),
+            "line_items": receipt_data.get("line_items") or []
         }
-        return log_transaction(transaction)
+        canonicalizer = get_merchant_canonicalizer()
+        transaction["canonical_merchant"] = canonicalizer.canonicalize(transaction["merchant"])
+        transaction_id = log_transaction(transaction)
+        canonicalizer.save()
+        return transaction_id
     except Exception as e:
         print(f"Failed to prepare transaction: {e}")
         raise
@@ -54,7 +62,7 @@ def update_category_interactive(transaction_id: str,
                              new_category: str,
                              confidence: float = 1.0) -> bool:
     """Update category with validation"""
-    valid_categories = ["Meals", "Travel", "Office", "Software", "Rent", "Utilities", "Other"]
+    valid_categories = PREDEFINED_CATEGORIES
     if new_category not in valid_categories:
         raise ValueError(f"Invalid category. Must be one of: {valid_categories}")
     
@@ -69,7 +77,7 @@ def get_categorical_summary(min_confidence: float = 0.7) -> Dict[str, float]:
     # Filter by confidence
     df = df[df['amount_confidence'] >= min_confidence]
     
-    return df.groupby('category')['amount'].sum().to_dict()
+    return df.groupby('category', observed=True)['amount'].sum().to_dict()
 
 def get_questionable_transactions(threshold: float = 0.5) -> pd.DataFrame:
     """Get transactions with low confidence scores"""
@@ -82,10 +90,13 @@ def get_questionable_transactions(threshold: float = 0.5) -> pd.DataFrame:
         (df['category_confidence'] < threshold) |
         (df['merchant_confidence'] < threshold)
     ].sort_values('amount_confidence')
-def log_bulk_receipt_transactions(receipts_data: List[Dict]) -> List[str]:
-    """Log multiple transactions from receipt analysis"""
-    transactions = []
-    for receipt in receipts_data:
+def log_bulk_receipt_transactions(receipts_data: List[Dict]) -> List[Optional[str]]:
+    """
+    Log multiple transactions from receipt analysis. Returns one id per
+    receipt, in order, with None for receipts that could not be prepared.
+    """
+    transactions, positions = [], []
+    for position, receipt in enumerate(receipts_data):
         try:
             transactions.append({
                 "merchant": receipt.get("merchant", {}).get("value", ""),
@@ -96,12 +107,24 @@ def log_bulk_receipt_transactions(receipts_data: List[Dict]) -> List[str]:
                 "category": receipt.get("category", {}).get("value", "Other"),
                 "category_confidence": float(receipt.get("category", {}).get("confidence", 1.0)),
                 "date": receipt.get("date", {}).get("value", datetime.utcnow()),
-                "date_confidence": float(receipt.get("date", {}).get("confidence", 1.0))
+                "date_confidence": float(receipt.get("date", {}).get("confidence", 1.0)),
+                "line_items": receipt.get("line_items") or []
             })
         except Exception as e:
             print(f"Failed to prepare transaction: {e}")
             continue
-    return bulk_log_transactions(transactions)
+        positions.append(position)
+    ids: List[Optional[str]] = [None] * len(receipts_data)
+    if not transactions:
+        return ids
+    canonicalizer = get_merchant_canonicalizer()
+    canonical = canonicalizer.canonicalize_many(t["merchant"] for t in transactions)
+    for t in transactions:
+        t["canonical_merchant"] = canonical[t["merchant"]]
+    for position, transaction_id in zip(positions, bulk_log_transactions(transactions)):
+        ids[position] = transaction_id
+    canonicalizer.save()
+    return ids
 
 class TransactionManager:
     """Wrapper class for transaction operations"""
@@ -117,13 +140,13 @@ class TransactionManager:
     def update_category(trans_id: str, category: str, confidence: float) -> bool:
         return update_category_interactive(trans_id, category, confidence)
     @staticmethod
-    def log_bulk_receipts(data: List[Dict]) -> List[str]:
+    def log_bulk_receipts(data: List[Dict]) -> List[Optional[str]]:
         return log_bulk_receipt_transactions(data)
 
     @staticmethod
     def bulk_update_categories(updates: List[Tuple[str, str, float]]) -> int:
         """Bulk update categories with validation"""
-        valid_categories = ["Meals", "Travel", "Office", "Software", "Rent", "Utilities", "Other"]
+        valid_categories = PREDEFINED_CATEGORIES
         validated_updates = []
         
         for trans_id, category, confidence in updates:
@@ -135,6 +158,7 @@ class TransactionManager:
         return bulk_update_categories(validated_updates)
 
     @staticmethod
+    @traced("report.spending_analytics", measure=None)
     def get_spending_analytics(timeframe: str = 'month') -> Dict:
         """Get spending analytics by timeframe"""
         df = get_recent_transactions(1000)
@@ -154,8 +178,8 @@ class TransactionManager:
         df['weighted_amount'] = df['amount'] * df['amount_confidence']
         
         return {
-            'by_category': df.groupby('category')['weighted_amount'].sum().to_dict(),
-            'by_merchant': df.groupby('merchant')['weighted_amount']
+            'by_category': df.groupby('category', observed=True)['weighted_amount'].sum().to_dict(),
+            'by_merchant': df.groupby(merchant_key(df))['weighted_amount']
                             .sum()
                             .sort_values(ascending=False)
                             .head(10)
@@ -172,6 +196,7 @@ class TransactionManager:
         
         # Filter for last N months
         cutoff = datetime.now() - pd.DateOffset(months=months)
+        expenses['date'] = pd.to_datetime(expenses['date'])
         recent_expenses = expenses[expenses['date'] >= cutoff]
         
         if recent_expenses.empty:
@@ -180,6 +205,7 @@ class TransactionManager:
         return recent_expenses.groupby(recent_expenses['date'].dt.to_period('M'))['amount'].sum().mean()
     # In your TransactionManager class (snowflake_helpers.py)
     @staticmethod
+    @traced("report.combined_financial", measure=None)
     def get_combined_financial_report(time_period: str = 'month', 
                                 custom_start: datetime = None,
                                 custom_end: datetime = None) -> Dict:
@@ -197,22 +223,14 @@ class TransactionManager:
         # Get all expenses
         expense_df = get_transactions_as_dataframe(10000)
         
-        # Get all income with proper column renaming
-        income_df = IncomeManager.get_income_as_dataframe(10000).rename(columns={
-            'SOURCE': 'source',
-            'PAYMENT_METHOD': 'payment_method',
-            'IS_TAXABLE': 'is_taxable',
-            'DESCRIPTION': 'description',
-            'RECURRENCE': 'recurrence',
-            'AMOUNT': 'amount',
-            'CATEGORY': 'category',
-            'ID': 'id',
-            'DATE': 'date'
-        })
+        # Get all income; Snowflake returns upper-case names, relabel without copying data
+        income_df = IncomeManager.get_income_as_dataframe(10000)
+        income_df.columns = [str(col).lower() for col in income_df.columns]
 
         # Convert dates to datetime if they're not already
         if not expense_df.empty:
             expense_df['date'] = pd.to_datetime(expense_df['date'])
+            expense_df['amount'] = expense_df['amount'].abs()  # Convert to positive values
         if not income_df.empty:
             income_df['date'] = pd.to_datetime(income_df['date'])
 
@@ -238,7 +256,6 @@ class TransactionManager:
         if not expense_df.empty:
             expense_df = expense_df[(expense_df['date'] >= cutoff) & 
                                 (expense_df['date'] <= end_date)]
-            expense_df['amount'] = expense_df['amount'].abs()  # Convert to positive values
         
         if not income_df.empty:
             income_df = income_df[(income_df['date'] >= cutoff) & 
@@ -249,13 +266,25 @@ class TransactionManager:
             if df.empty:
                 return {}
             try:
-                return df.groupby(pd.Grouper(key='date', freq='M'))[amount_col] \
+                return df.groupby(pd.Grouper(key='date', freq=pd.offsets.MonthEnd()))[amount_col] \
                     .sum() \
                     .to_dict()
             except Exception as e:
                 print(f"Error calculating monthly trend: {e}")
                 return {}
 
+        def calculate_grouped_monthly_trend(df, group_col, amount_col='amount'):
+            if df.empty:
+                return {}
+            try:
+                grouped = df.groupby([group_col, pd.Grouper(key='date', freq=pd.offsets.MonthEnd())],
+                                     observed=True)[amount_col].sum()
+                return {name: series.droplevel(0).to_dict()
+                        for name, series in grouped.groupby(level=0, observed=True)}
+            except Exception as e:
+                print(f"Error calculating grouped monthly trend: {e}")
+                return {}
+
         # Generate enhanced report structure
         report = {
             'time_period': time_period if not custom_start else 'custom',
@@ -265,27 +294,29 @@ class TransactionManager:
             },
             'income': {
                 'total': float(income_df['amount'].sum()) if not income_df.empty else 0.0,
-                'top_sources': income_df.groupby('source')['amount']
+                'top_sources': income_df.groupby('source', observed=True)['amount']
                                     .sum()
                                     .nlargest(5)
                                     .to_dict() if not income_df.empty else {},
                 'monthly_trend': calculate_monthly_trend(income_df),
+                'monthly_by_source': calculate_grouped_monthly_trend(income_df, 'source'),
                 'average': float(income_df['amount'].mean()) if not income_df.empty else 0.0,
                 'count': len(income_df),
-                'recurrence_breakdown': income_df['recurrence'].value_counts().to_dict() 
+                'recurrence_breakdown': income_df['recurrence'].value_counts().loc[lambda c: c > 0].to_dict() 
                                     if not income_df.empty else {}
             },
             'expenses': {
                 'total': float(expense_df['amount'].sum()) if not expense_df.empty else 0.0,
-                'top_merchants': expense_df.groupby('merchant')['amount']
+                'top_merchants': expense_df.groupby(merchant_key(expense_df))['amount']
                                         .sum()
                                         .nlargest(10)
                                         .to_dict() if not expense_df.empty else {},
-                'category_breakdown': expense_df.groupby('category')['amount']
+                'category_breakdown': expense_df.groupby('category', observed=True)['amount']
                                             .sum()
                                             .sort_values(ascending=False)
                                             .to_dict() if not expense_df.empty else {},
                 'monthly_trend': calculate_monthly_trend(expense_df),
+                'monthly_by_category': calculate_grouped_monthly_trend(expense_df, 'category'),
                 'average': float(expense_df['amount'].mean()) if not expense_df.empty else 0.0,
                 'count': len(expense_df),
                 'confidence_metrics': {
@@ -0,0 +1,401 @@
+"""
+Subscription and recurring-expense detection.
+
+Transactions are grouped by merchant (canonical_merchant where set) and
+amount bucket, so a $15 streaming plan and a $90 one-off at the same
+merchant are separate series. A series is recurring when the median of
+its recent inter-arrival intervals is close to a billing period (weekly
+to annual), their median absolute deviation is small relative to it and
+most intervals lie within that deviation of the median.
+
+Every series is kept in the subscriptions table with its last charge and,
+once periodic, the next expected date. The batch rebuild computes the
+intervals for all series at once; after that the transaction insert
+listener folds each new charge into its series in constant time, so the
+dashboard reads the table instead of scanning history. Rows written
+without the listener (other processes, bulk uploads) are reconciled on
+load and then once a minute: every transaction belongs to exactly one
+series, so the stored occurrences must add up to the transaction count.
+
+
+    python -m utils.subscriptions rebuild
+"""
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.merchants import normalize_merchant
+from utils.snowflake_conn import bump_generation, get_conn, register_transaction_listener
+from utils.tracing import traced
+
+BUCKET_RATIO = 1.2          # amounts within ~20% of each other share a bucket
+HISTORY = 12                # recent intervals a series keeps
+MIN_OCCURRENCES = 4         # three intervals before a series can count as recurring
+CADENCE_TOLERANCE = 0.15    # median interval may miss its billing period by this share
+MAX_RELATIVE_MAD = 0.1      # interval MAD as a share of the median interval
+MIN_MAD_ALLOWANCE = 1.0     # days of jitter always tolerated (weekends, billing runs)
+MIN_REGULAR_SHARE = 0.75    # share of intervals that must sit near the median (MAD ignores outliers)
+RECONCILE_SECONDS = 60      # how often reads check for rows written by other processes
+CADENCES = {"weekly": 7.0, "biweekly": 14.0, "monthly": 30.44, "quarterly": 91.31, "annual": 365.25}
+
+SUBSCRIPTION_COLUMNS = [
+    'id', 'merchant', 'category', 'amount_bucket', 'last_amount', 'cadence',
+    'interval_days', 'interval_mad', 'occurrences', 'last_date', 'next_expected',
+    'intervals', 'is_recurring'
+]
+SUBSCRIPTION_INSERT = f"""
+INSERT INTO subscriptions ({', '.join(SUBSCRIPTION_COLUMNS)})
+VALUES ({', '.join(['%s'] * len(SUBSCRIPTION_COLUMNS))})
+"""
+
+
+def amount_bucket(amount: float) -> int:
+    """Logarithmic amount bucket (same bucket for amounts within BUCKET_RATIO)"""
+    return int(round(math.log(max(abs(float(amount or 0.0)), 0.01)) / math.log(BUCKET_RATIO)))
+
+
+def series_id(merchant: str, bucket: int) -> str:
+    return f"{normalize_merchant(merchant) or str(merchant or '').lower()}|{bucket}"
+
+
+def cadence_label(interval_days: float) -> Optional[str]:
+    """Named billing period within tolerance of the interval, else None"""
+    name, period = min(CADENCES.items(), key=lambda c: abs(c[1] - interval_days))
+    return name if abs(period - interval_days) <= period * CADENCE_TOLERANCE else None
+
+
+def _allowance(median):
+    return np.maximum(MIN_MAD_ALLOWANCE, median * MAX_RELATIVE_MAD)
+
+
+def _periodicity(intervals: np.ndarray):
+    """Median interval, its MAD and whether they describe a recurring charge"""
+    if len(intervals) == 0:
+        return 0.0, 0.0, False
+    median = float(np.median(intervals))
+    deviation = np.abs(intervals - median)
+    mad = float(np.median(deviation))
+    recurring = (len(intervals) + 1 >= MIN_OCCURRENCES
+                 and cadence_label(median) is not None
+                 and mad <= _allowance(median)
+                 and np.mean(deviation <= _allowance(median)) >= MIN_REGULAR_SHARE)
+    return median, mad, recurring
+
+
+def _row(sid: str, merchant: str, category: str, bucket: int, last_amount: float,
+         occurrences: int, last_date: pd.Timestamp, intervals: List[float]) -> Dict:
+    median, mad, recurring = _periodicity(np.asarray(intervals, dtype=float))
+    return {
+        'id': sid, 'merchant': merchant, 'category': category, 'amount_bucket': bucket,
+        'last_amount': float(last_amount), 'cadence': cadence_label(median) if recurring else None,
+        'interval_days': median, 'interval_mad': mad, 'occurrences': int(occurrences),
+        'last_date': last_date,
+        'next_expected': (last_date + pd.Timedelta(days=median)).floor('s') if recurring else None,
+        'intervals': [round(float(i), 3) for i in intervals[-HISTORY:]], 'is_recurring': bool(recurring)
+    }
+
+
+def detect_subscriptions(transactions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Batch detection over a transaction history.
+
+    Args:
+        transactions: DataFrame with date, merchant, amount, category and
+            optionally canonical_merchant
+
+    Returns:
+        DataFrame with SUBSCRIPTION_COLUMNS, one row per series
+    """
+    if transactions.empty:
+        return pd.DataFrame(columns=SUBSCRIPTION_COLUMNS)
+    df = pd.DataFrame({
+        'date': pd.to_datetime(transactions['date'], format='mixed'),
+        'merchant': transactions['merchant'].astype(object),
+        'amount': transactions['amount'].astype(float).abs(),
+        'category': transactions['category'].astype(object),
+    })
+    if 'canonical_merchant' in transactions.columns:
+        canonical = transactions['canonical_merchant'].astype(object)
+        df['merchant'] = canonical.where(canonical.notna(), df['merchant'])
+    df['amount_bucket'] = np.round(np.log(np.maximum(df['amount'].to_numpy(), 0.01))
+                                   / math.log(BUCKET_RATIO)).astype(int)
+    df['key'] = df['merchant'].map(lambda m: normalize_merchant(m) or str(m or '').lower())
+    df = df.sort_values(['key', 'amount_bucket', 'date'], kind='stable').reset_index(drop=True)
+
+    # Inter-arrival intervals in days, NaN at the first charge of each series
+    group = df.groupby(['key', 'amount_bucket'], sort=False).ngroup().to_numpy()
+    days = df['date'].to_numpy().astype('datetime64[s]').astype(np.int64) / 86400.0
+    interval = np.round(np.diff(days, prepend=np.nan), 3)
+    interval[np.r_[True, group[1:] != group[:-1]]] = np.nan
+    df['interval'] = interval
+
+    # Periodicity from each series' most recent HISTORY intervals, as the incremental path sees it
+    recent = df[df['interval'].notna()].groupby(group[df['interval'].notna()], sort=False).tail(HISTORY)
+    recent_group = group[recent.index]
+    median = recent.groupby(recent_group)['interval'].median()
+    group_median = median.reindex(recent_group).to_numpy()
+    deviation = (recent['interval'] - group_median).abs()
+    mad = deviation.groupby(recent_group).median()
+    regular = (deviation <= _allowance(group_median)).groupby(recent_group).mean()
+    history = recent.groupby(recent_group)['interval'].agg(list)
+
+    series = df.groupby(group, sort=False).agg(
+        key=('key', 'last'), merchant=('merchant', 'last'), category=('category', 'last'),
+        amount_bucket=('amount_bucket', 'last'), last_amount=('amount', 'last'),
+        occurrences=('date', 'size'), last_date=('date', 'last'))
+    series['interval_days'] = median.reindex(series.index).fillna(0.0)
+    series['interval_mad'] = mad.reindex(series.index).fillna(0.0)
+    series['intervals'] = history.reindex(series.index).map(lambda i: i if isinstance(i, list) else [])
+    cadence = series['interval_days'].map(cadence_label)
+    series['is_recurring'] = (
+        (series['occurrences'] >= MIN_OCCURRENCES)
+        & cadence.notna()
+        & (series['interval_mad'] <= _allowance(series['interval_days']))
+        & (regular.reindex(series.index).fillna(0.0) >= MIN_REGULAR_SHARE)
+    )
+    series['id'] = series['key'] + '|' + series['amount_bucket'].astype(str)
+    series['cadence'] = cadence.where(series['is_recurring'])
+    series['next_expected'] = (series['last_date'] + pd.to_timedelta(series['interval_days'], unit='D')) \
+        .dt.floor('s').where(series['is_recurring'])
+    return series[SUBSCRIPTION_COLUMNS].reset_index(drop=True)
+
+
+def _to_db_row(row: Dict) -> tuple:
+    values = []
+    for col in SUBSCRIPTION_COLUMNS:
+        value = row[col]
+        if col == 'intervals':
+            value = json.dumps([round(float(i), 3) for i in value])
+        elif isinstance(value, pd.Timestamp):
+            value = value.floor('s').to_pydatetime()
+        elif value is not None and not isinstance(value, str) and pd.isna(value):
+            value = None
+        elif isinstance(value, np.generic):
+            value = value.item()
+        values.append(value)
+    return tuple(values)
+
+
+class SubscriptionDetector:
+    """
+    In-memory copy of the subscriptions table, updated per transaction.
+
+    Each series keeps its last charge and its recent intervals, so a new
+    charge costs one dict lookup, a median over at most HISTORY values and
+    a one-row upsert. Charges dated before a series' last charge (a
+    back-dated receipt) re-run detection for that series only.
+    """
+
+    def __init__(self):
+        self._series: Dict[str, Dict] = {}
+        self._reconciled_at = 0.0
+        self._lock = threading.RLock()
+
+    @traced("db.load_subscriptions")
+    def load(self) -> "SubscriptionDetector":
+        """Read the stored series"""
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(SUBSCRIPTION_COLUMNS)} FROM subscriptions")
+            rows = cursor.fetchall()
+        with self._lock:
+            for values in rows:
+                row = dict(zip(SUBSCRIPTION_COLUMNS, values))
+                row['last_date'] = pd.to_datetime(row['last_date'], format='mixed')
+                row['intervals'] = json.loads(row['intervals'] or '[]')
+                self._series[row['id']] = row
+        return self
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    @traced("db.rebuild_subscriptions", measure=lambda n: {"rows": n})
+    def rebuild(self) -> int:
+        """Detect every series from the full history and replace the table"""
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT date, merchant, canonical_merchant, amount, category FROM transactions")
+            history = pd.DataFrame(cursor.fetchall(),
+                                   columns=['date', 'merchant', 'canonical_merchant', 'amount', 'category'])
+        series = detect_subscriptions(history)
+        rows = series.to_dict('records')
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM subscriptions")
+            if rows:
+                cursor.executemany(SUBSCRIPTION_INSERT, [_to_db_row(r) for r in rows])
+            conn.commit()
+        with self._lock:
+            self._series = {r['id']: r for r in rows}
+        bump_generation("subscriptions")
+        return len(rows)
+
+    @traced("db.reconcile_subscriptions", measure=lambda n: {"rows": n})
+    def reconcile(self) -> int:
+        """
+        Fold in transactions the listener never saw. Rows dated after the
+        latest stored charge are observed in date order; when that does
+        not account for every transaction (back-dated or deleted rows), the
+        table is rebuilt. Returns the transactions folded in.
+        """
+        with self._lock:
+            self._reconciled_at = time.monotonic()
+            seen = sum(int(r['occurrences']) for r in self._series.values())
+            watermark = max((r['last_date'] for r in self._series.values()), default=None)
+            with get_conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT COUNT(*) FROM transactions")
+                total = int(cursor.fetchone()[0] or 0)
+                if total == seen:
+                    return 0
+                newer = []
+                if watermark is not None and total > seen:
+                    cursor.execute("""
+                        SELECT date, merchant, canonical_merchant, amount, category FROM transactions
+                        WHERE date > %s ORDER BY date
+                    """, [watermark.to_pydatetime()])
+                    columns = ['date', 'merchant', 'canonical_merchant', 'amount', 'category']
+                    newer = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            if seen + len(newer) != total:
+                self.rebuild()
+                return total
+            self.observe(newer)
+            return len(newer)
+
+    def _current(self):
+        if time.monotonic() - self._reconciled_at >= RECONCILE_SECONDS:
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"Reconciling subscriptions failed: {e}")
+
+    def _history_row(self, merchant: str, bucket: int) -> Optional[Dict]:
+        """Re-detect one series from its stored transactions"""
+        key = normalize_merchant(merchant) or str(merchant or '').lower()
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT date, merchant, canonical_merchant, amount, category FROM transactions
+                WHERE COALESCE(canonical_merchant, merchant) = %s
+            """, [merchant])
+            history = pd.DataFrame(cursor.fetchall(),
+                                   columns=['date', 'merchant', 'canonical_merchant', 'amount', 'category'])
+        series = detect_subscriptions(history)
+        series = series[series['id'] == f"{key}|{bucket}"]
+        return series.iloc[0].to_dict() if not series.empty else None
+
+    def observe(self, transactions: Iterable[Dict]) -> int:
+        """Fold committed transactions into their series; returns series updated"""
+        changed: Dict[str, Dict] = {}
+        with self._lock:
+            for t in transactions:
+                merchant = t.get('canonical_merchant') or t.get('merchant') or ''
+                amount = abs(float(t.get('amount', 0.0) or 0.0))
+                day = pd.Timestamp(t.get('date') or datetime.utcnow())
+                bucket = amount_bucket(amount)
+                sid = series_id(merchant, bucket)
+                current = self._series.get(sid)
+                if current is None:
+                    row = _row(sid, merchant, t.get('category') or 'Other', bucket, amount, 1, day, [])
+                elif day >= current['last_date']:
+                    interval = round((day - current['last_date']).total_seconds() / 86400.0, 3)
+                    row = _row(sid, merchant, t.get('category') or current['category'], bucket, amount,
+                               current['occurrences'] + 1, day, (current['intervals'] + [interval])[-HISTORY:])
+                else:
+                    row = self._history_row(merchant, bucket)
+                    if row is None:
+                        continue
+                self._series[sid] = row
+                changed[sid] = row
+        if changed:
+            self._save(list(changed.values()))
+        return len(changed)
+
+    def _save(self, rows: List[Dict]):
+        try:
+            with get_conn() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("DELETE FROM subscriptions WHERE id = %s", [(r['id'],) for r in rows])
+                cursor.executemany(SUBSCRIPTION_INSERT, [_to_db_row(r) for r in rows])
+                conn.commit()
+            bump_generation("subscriptions")
+        except Exception as e:
+            print(f"Saving subscriptions failed: {e}")
+
+    def subscriptions(self, include_lapsed: bool = False, now: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Recurring series, soonest next charge first.
+
+        A series lapses when its next charge is more than one full period
+        overdue; lapsed series are left out unless `include_lapsed`.
+        """
+        self._current()
+        with self._lock:
+            rows = [r for r in self._series.values() if r['is_recurring']]
+        columns = ['merchant', 'category', 'cadence', 'last_amount', 'interval_days',
+                   'occurrences', 'last_date', 'next_expected', 'monthly_cost', 'is_lapsed']
+        if not rows:
+            return pd.DataFrame(columns=columns)
+        df = pd.DataFrame(rows)
+        df['next_expected'] = pd.to_datetime(df['next_expected'], format='mixed')
+        now = pd.Timestamp(now or datetime.utcnow())
+        df['is_lapsed'] = df['next_expected'] + pd.to_timedelta(df['interval_days'], unit='D') < now
+        df['monthly_cost'] = df['last_amount'] * CADENCES['monthly'] / df['interval_days']
+        if not include_lapsed:
+            df = df[~df['is_lapsed']]
+        return df[columns].sort_values('next_expected').reset_index(drop=True)
+
+
+_detector: Optional[SubscriptionDetector] = None
+_detector_lock = threading.Lock()
+
+
+def get_subscription_detector() -> SubscriptionDetector:
+    """
+    Process-wide detector: loaded from the subscriptions table (rebuilt
+    from history when the table is empty, reconciled with transactions
+    written since otherwise) and then kept current by the transaction
+    insert listener. Get it before logging transactions.
+    """
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            detector = SubscriptionDetector()
+            try:
+                if not len(detector.load()):
+                    detector.rebuild()
+                else:
+                    detector.reconcile()
+            except Exception as e:
+                print(f"Loading subscriptions failed: {e}")
+            register_transaction_listener(detector.observe)
+            _detector = detector
+        return _detector
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Subscription detection")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Re-detect every series from the transaction history")
+    sub.add_parser("list", help="Print active subscriptions")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        detector = SubscriptionDetector()
+        detector.rebuild()
+        print(f"{len(detector.subscriptions())} active subscriptions in {len(detector)} series")
+    else:
+        print(get_subscription_detector().subscriptions().to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
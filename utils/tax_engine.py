@@ -0,0 +1,233 @@
+"""
+Bracket-based income tax estimates from the ledger.
+
+Bracket tables and per-category deduction rules are data, not code: the
+defaults below (single-filer US federal brackets) can be replaced with a
+JSON file named by FINAI_TAX_TABLES:
+
+    {
+        "years": {"2025": {"standard_deduction": 15000,
+                           "brackets": [[0, 0.10], [11925, 0.12], ...]}},
+        "deductions": {"Meals": {"share": 0.5, "note": "..."}}
+    }
+
+Deductions and taxable income are computed with column operations over a
+whole year's ledger, and tax with one array operation over every income
+being evaluated (years, or year-to-date quarters). Reports are cached per
+ledger generation for at most REPORT_TTL seconds, which bounds how stale
+they get when another process (ingest_receipts.py) writes the database.
+"""
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.ledger import get_ledger
+from utils.settings import get_setting
+from utils.snowflake_conn import data_generation
+from utils.tracing import traced
+
+# Lower bound of each bracket and its marginal rate
+DEFAULT_TAX_YEARS = {
+    2024: {"standard_deduction": 14600.0,
+           "brackets": [(0, 0.10), (11600, 0.12), (47150, 0.22), (100525, 0.24),
+                        (191950, 0.32), (243725, 0.35), (609350, 0.37)]},
+    2025: {"standard_deduction": 15000.0,
+           "brackets": [(0, 0.10), (11925, 0.12), (48475, 0.22), (103350, 0.24),
+                        (197300, 0.32), (250525, 0.35), (626350, 0.37)]},
+}
+DEFAULT_DEDUCTION_RULES = {
+    "Office": {"share": 1.0, "note": "100% deductible for home office"},
+    "Software": {"share": 1.0, "note": "100% deductible if used for business"},
+    "Travel": {"share": 1.0, "note": "100% deductible for business travel"},
+    "Meals": {"share": 0.5, "note": "50% deductible for business meals"},
+}
+# Estimated-tax periods: (end month, end day, due month, due day, annualization factor)
+QUARTERS = [(3, 31, 4, 15, 4.0), (5, 31, 6, 15, 2.4), (8, 31, 9, 15, 1.5), (12, 31, 1, 15, 1.0)]
+LEDGER_LIMIT = 1000000
+SCHEDULE_COLUMNS = ['quarter', 'period_end', 'due_date', 'ytd_taxable_income', 'annualized_tax',
+                    'cumulative_due', 'installment']
+COMPARISON_COLUMNS = ['year', 'income', 'deductions', 'taxable_income', 'tax', 'effective_rate']
+_CACHE_SIZE = 16
+REPORT_TTL = 300            # seconds, as for the tabs' cached loaders
+_report_cache: "OrderedDict[Hashable, Tuple[float, Dict]]" = OrderedDict()
+
+
+def load_tax_tables(path: Optional[str] = None) -> Dict:
+    """Default tables, overridden by the JSON file at `path` / FINAI_TAX_TABLES"""
+    tables = {"years": dict(DEFAULT_TAX_YEARS), "deductions": dict(DEFAULT_DEDUCTION_RULES)}
+    path = path or get_setting("FINAI_TAX_TABLES")
+    if path:
+        try:
+            with open(path) as f:
+                custom = json.load(f)
+            tables["years"].update({int(y): t for y, t in custom.get("years", {}).items()})
+            tables["deductions"].update(custom.get("deductions", {}))
+        except Exception as e:
+            print(f"Loading tax tables from {path} failed: {e}")
+    return tables
+
+
+def year_table(tables: Dict, year: int) -> Dict:
+    """Table for `year`, else the latest earlier one (or the earliest known)"""
+    known = sorted(tables["years"])
+    earlier = [y for y in known if y <= year]
+    return tables["years"][earlier[-1] if earlier else known[0]]
+
+
+def bracket_tax(taxable_income, table: Dict) -> np.ndarray:
+    """Tax on each taxable income (array-like) under one bracket table"""
+    income = np.atleast_1d(np.asarray(taxable_income, dtype=float))
+    lowers = np.array([b[0] for b in table["brackets"]], dtype=float)
+    rates = np.array([b[1] for b in table["brackets"]], dtype=float)
+    widths = np.append(np.diff(lowers), np.inf)
+    in_bracket = np.clip(income[:, None] - lowers[None, :], 0.0, widths[None, :])
+    return in_bracket @ rates
+
+
+def marginal_rate(taxable_income: float, table: Dict) -> float:
+    lowers = np.array([b[0] for b in table["brackets"]], dtype=float)
+    index = max(int(np.searchsorted(lowers, taxable_income, side="right")) - 1, 0)
+    return float(table["brackets"][index][1])
+
+
+def apply_rules(ledger: pd.DataFrame, rules: Dict) -> pd.DataFrame:
+    """
+    Ledger with taxable_income and deductible columns, from the type,
+    category, is_taxable and signed amount columns.
+    """
+    shares = pd.Series({c: float(r.get("share", 0.0)) for c, r in rules.items()}, dtype=float)
+    is_income = (ledger['type'] == 'income').to_numpy()
+    amount = ledger['amount'].abs().to_numpy(dtype=float)
+    taxable = ledger['is_taxable'].astype('boolean').fillna(True).to_numpy(dtype=bool)
+    share = ledger['category'].astype(object).map(shares).fillna(0.0).to_numpy(dtype=float)
+    return ledger.assign(
+        taxable_income=np.where(is_income & taxable, amount, 0.0),
+        deductible=np.where(is_income, 0.0, amount * share),
+        expense=np.where(is_income, 0.0, amount),
+    )
+
+
+def annual_summary(ledger: pd.DataFrame, year: int, tables: Dict) -> Dict:
+    """Income, deductions and estimated tax for one year of ledger rows"""
+    table = year_table(tables, year)
+    rows = apply_rules(ledger, tables["deductions"])
+    expenses = rows[rows['type'] == 'expense']
+    by_category = expenses.groupby(expenses['category'].astype(object)) \
+        .agg(spent=('expense', 'sum'), deductible=('deductible', 'sum')).reset_index()
+    by_category['share'] = by_category['category'].map(
+        lambda c: float(tables["deductions"].get(c, {}).get("share", 0.0)))
+    by_category['note'] = by_category['category'].map(
+        lambda c: tables["deductions"].get(c, {}).get("note", "Not deductible"))
+
+    income = float(rows['taxable_income'].sum())
+    total_income = float(rows.loc[rows['type'] == 'income', 'amount'].abs().sum())
+    deductions = float(rows['deductible'].sum())
+    taxable_income = max(income - deductions - table["standard_deduction"], 0.0)
+    tax = float(bracket_tax(taxable_income, table)[0])
+    return {
+        'year': year,
+        'income': income,
+        'non_taxable_income': max(total_income - income, 0.0),
+        'expenses': float(rows['expense'].sum()),
+        'deductions': deductions,
+        'standard_deduction': float(table["standard_deduction"]),
+        'taxable_income': taxable_income,
+        'tax': tax,
+        'effective_rate': tax / income if income else 0.0,
+        'marginal_rate': marginal_rate(taxable_income, table),
+        'by_category': by_category.sort_values('deductible', ascending=False).reset_index(drop=True),
+    }
+
+
+def quarterly_schedule(ledger: pd.DataFrame, year: int, tables: Dict) -> pd.DataFrame:
+    """
+    Estimated-tax installments by the annualized income method: each
+    period's year-to-date taxable income is annualized, taxed, and the
+    cumulative share due (25/50/75/100%) of that is required, capped at
+    the regular installments (the same shares of the full-year tax). The
+    installment is the cumulative requirement less what the earlier
+    installments covered.
+    """
+    table = year_table(tables, year)
+    rows = apply_rules(ledger, tables["deductions"])
+    dates = pd.to_datetime(rows['date']).to_numpy()
+    net = (rows['taxable_income'] - rows['deductible']).to_numpy(dtype=float)
+    ends = np.array([np.datetime64(date(year, m, d)) + np.timedelta64(1, 'D')
+                     for m, d, *_ in QUARTERS], dtype='datetime64[ns]')
+    ytd = (dates[None, :] < ends[:, None]).astype(float) @ net
+    factors = np.array([q[4] for q in QUARTERS])
+    annualized = np.maximum(ytd * factors - table["standard_deduction"], 0.0)
+    annualized_tax = bracket_tax(annualized, table)
+    shares = np.array([0.25, 0.5, 0.75, 1.0])
+    # Front-loaded income must not schedule more than the year's tax: cap at the regular installments
+    regular = annualized_tax[-1] * shares
+    cumulative = np.minimum(np.maximum.accumulate(annualized_tax * shares), regular)
+    installment = np.diff(cumulative, prepend=0.0)
+    return pd.DataFrame({
+        'quarter': [f"Q{i + 1}" for i in range(len(QUARTERS))],
+        'period_end': [date(year, m, d) for m, d, *_ in QUARTERS],
+        'due_date': [date(year + (dm == 1), dm, dd) for _, _, dm, dd, _ in QUARTERS],
+        'ytd_taxable_income': ytd,
+        'annualized_tax': annualized_tax,
+        'cumulative_due': cumulative,
+        'installment': installment,
+    }, columns=SCHEDULE_COLUMNS)
+
+
+def compare_years(ledger: pd.DataFrame, years: Sequence[int], tables: Dict) -> pd.DataFrame:
+    """Income, deductions and tax side by side for several years"""
+    rows = apply_rules(ledger, tables["deductions"])
+    year = pd.to_datetime(rows['date']).dt.year
+    totals = rows.groupby(year)[['taxable_income', 'deductible']].sum().reindex(years, fill_value=0.0)
+    income = totals['taxable_income'].to_numpy()
+    deductions = totals['deductible'].to_numpy()
+    standard = np.array([year_table(tables, y)["standard_deduction"] for y in years], dtype=float)
+    taxable = np.maximum(income - deductions - standard, 0.0)
+    # Years sharing a table are taxed in one call
+    year_tables = [year_table(tables, y) for y in years]
+    tax = np.zeros(len(years))
+    for table in {id(t): t for t in year_tables}.values():
+        mask = np.array([t is table for t in year_tables])
+        tax[mask] = bracket_tax(taxable[mask], table)
+    return pd.DataFrame({
+        'year': list(years), 'income': income, 'deductions': deductions, 'taxable_income': taxable,
+        'tax': tax, 'effective_rate': np.divide(tax, income, out=np.zeros_like(tax), where=income > 0),
+    }, columns=COMPARISON_COLUMNS)
+
+
+@traced("report.tax", measure=None)
+def tax_report(year: Optional[int] = None, compare: int = 3, tables: Optional[Dict] = None) -> Dict:
+    """
+    Tax summary and quarterly schedule for `year` (default: this year, to
+    date) and a comparison with the `compare` - 1 years before it.
+
+    Cached per ledger generation, so it is recomputed after transactions
+    or income change in this process, or after REPORT_TTL seconds.
+    """
+    year = year or datetime.now().year
+    tables = tables or load_tax_tables()
+    years = list(range(year - compare + 1, year + 1))
+    key = (data_generation("transactions", "income"), year, compare, json.dumps(tables, sort_keys=True))
+    if key in _report_cache:
+        created, report = _report_cache[key]
+        if time.monotonic() - created < REPORT_TTL:
+            _report_cache.move_to_end(key)
+            return report
+        del _report_cache[key]
+
+    ledger = get_ledger(LEDGER_LIMIT, start=datetime(years[0], 1, 1), end=datetime(year, 12, 31, 23, 59, 59))
+    this_year = ledger[pd.to_datetime(ledger['date']).dt.year == year] if not ledger.empty else ledger
+    report = {
+        'summary': annual_summary(this_year, year, tables),
+        'quarterly': quarterly_schedule(this_year, year, tables),
+        'comparison': compare_years(ledger, years, tables),
+    }
+    _report_cache[key] = (time.monotonic(), report)
+    while len(_report_cache) > _CACHE_SIZE:
+        _report_cache.popitem(last=False)
+    return report
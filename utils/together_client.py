@@ -1,9 +1,7 @@
 import os
 import json
 import base64
-import streamlit as st
 from typing import List, Optional, Dict, Tuple
-from together import Together
 import tempfile
 import pytesseract
 from PIL import Image
@@ -11,22 +9,68 @@ import io
 import pdf2image
 import PyPDF2
 import csv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.category_classifier import categorize_receipt
+from utils.llm_routes import RouteTable, get_route_table
+from utils.llm_transport import LLMTransport, LLMTransportError, create_transport
+from utils.prompt_compaction import CHUNK_TOKENS, chunk_receipt_text, compact_receipt_text, count_tokens, \
+    merge_extractions
+from utils.settings import get_setting
+from utils.tracing import annotate, span, traced
+
+MAX_CHUNK_WORKERS = 4   # concurrent extraction requests for one long document
+RECEIPT_PROMPT = """Very carefully analyze this receipt and extract structured data. Follow these rules:
+
+FIRST determine if this is actually a receipt (look for totals, items, prices, etc.)
+If it's a receipt, extract these details with HIGH accuracy:
+Analyze the receipt one by one and extract structured data for each of the receipts:
+1. Total amount (with confidence score 0-1)
+2. Merchant name (with confidence)
+3. Transaction date (YYYY-MM-DD format)
+4. Category (with confidence)
+5. Line items (description, amount, quantity)
+
+Categories: [Meals, Travel, Office, Software, Rent, Utilities, Other]
+
+Respond with this exact JSON structure:
+{
+    "amount": {"value": float, "confidence": float},
+    "merchant": {"value": str, "confidence": float},
+    "date": {"value": str, "confidence": float},
+    "category": {"value": str, "confidence": float},
+    "description": str,
+    "line_items": [
+        {
+            "description": str,
+            "amount": float,
+            "quantity": int
+        }
+    ]
+}"""
+
 
 class TogetherClient:
     """Unified Together.ai client for all AI operations"""
     
-    def __init__(self):
-        api_key = st.secrets.get("TOGETHER_API_KEY")
-        if not api_key:
-            raise ValueError("TOGETHER_API_KEY not found in environment variables")
-        self.client = Together(api_key=api_key)
+    def __init__(self, transport: Optional[LLMTransport] = None, routes: Optional[RouteTable] = None):
+        # Live API by default; FINAI_LLM_TRANSPORT selects mock / record / replay
+        self.transport = transport or create_transport()
+        # Model, token cap, latency budget and fallbacks per task (FINAI_LLM_ROUTES)
+        self.routes = routes or get_route_table()
+        # Receipt text past this many (locally counted) tokens is extracted in chunks
+        self.chunk_tokens = int(get_setting("FINAI_RECEIPT_CHUNK_TOKENS", CHUNK_TOKENS))
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
         pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'  # Update path as needed
 
     def _extract_text_from_pdf(self, pdf_bytes: bytes) -> str:
         """Extract text directly from PDF without using OCR"""
         try:
-            with io.BytesIO(pdf_bytes) as pdf_file:
+            with span("ocr.pdf_text", bytes=len(pdf_bytes)) as attrs, io.BytesIO(pdf_bytes) as pdf_file:
                 reader = PyPDF2.PdfReader(pdf_file)
+                attrs["pages"] = len(reader.pages)
                 text = "\n".join([page.extract_text() for page in reader.pages])
                 return text.strip() if text else ""
         except Exception as e:
@@ -36,8 +80,9 @@ class TogetherClient:
     def _extract_text_from_image(self, image_bytes: bytes) -> str:
         """Extract text from image using OCR"""
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            return pytesseract.image_to_string(image)
+            with span("ocr.image", bytes=len(image_bytes)):
+                image = Image.open(io.BytesIO(image_bytes))
+                return pytesseract.image_to_string(image)
         except Exception as e:
             print(f"Image OCR error: {e}")
             return ""
@@ -72,6 +117,7 @@ class TogetherClient:
             print(f"CSV processing error: {e}")
             return []
 
+    @traced("llm.process_receipt", measure=None)
     def process_receipt(self, file_bytes: Optional[bytes] = None, text: str = "", file_type: str = None) -> Dict:
         """
         Process receipt from various formats with OCR fallback
@@ -89,65 +135,63 @@ class TogetherClient:
             elif file_type == 'txt':
                 extracted_text = file_bytes.decode('utf-8', errors='ignore')
         
-        # Prepare the prompt
-        prompt = """Very carefully analyze this receipt and extract structured data. Follow these rules:
-
-FIRST determine if this is actually a receipt (look for totals, items, prices, etc.)
-If it's a receipt, extract these details with HIGH accuracy:
-Analyze the receipt one by one and extract structured data for each of the receipts:
-1. Total amount (with confidence score 0-1)
-2. Merchant name (with confidence)
-3. Transaction date (YYYY-MM-DD format)
-4. Category (with confidence)
-5. Line items (description, amount, quantity)
-
-Categories: [Meals, Travel, Office, Software, Rent, Utilities, Other]
-
-Respond with this exact JSON structure:
-{
-    "amount": {"value": float, "confidence": float},
-    "merchant": {"value": str, "confidence": float},
-    "date": {"value": str, "confidence": float},
-    "category": {"value": str, "confidence": float},
-    "description": str,
-    "line_items": [
-        {
-            "description": str,
-            "amount": float,
-            "quantity": int
-        }
-    ]
-}"""
+        # Send only the useful lines; documents over the chunk budget are map-reduced
+        with span("llm.compact_receipt") as attrs:
+            compacted = compact_receipt_text(extracted_text)
+            chunks = chunk_receipt_text(compacted, self.chunk_tokens)
+            attrs.update(raw_tokens=count_tokens(extracted_text), kept_tokens=count_tokens(compacted),
+                         chunks=len(chunks))
 
         try:
-            messages = [{
-                "role": "user",
-                "content": prompt + f"\n\nExtracted Receipt Text:\n{extracted_text}"
-            }]
-
-            # Include image data if available (for better accuracy)
-            if file_bytes and file_type in ['jpg', 'jpeg', 'png']:
-                encoded_image = base64.b64encode(file_bytes).decode('utf-8')
-                messages.append({
-                    "role": "user",
-                    "content": f"data:image/{file_type};base64,{encoded_image}"
-                })
-
-            response = self.client.chat.completions.create(
-                model="mistralai/Mistral-7B-Instruct-v0.1",
-                messages=messages,
-                temperature=0.1,
-                response_format={"type": "json_object"},
-                max_tokens=2000
-            )
-
-            result = json.loads(response.choices[0].message.content)
-            return self._validate_response(result, extracted_text)
+            if len(chunks) == 1:
+                # Include image data if available (for better accuracy)
+                image = file_bytes if file_bytes and file_type in ['jpg', 'jpeg', 'png'] else None
+                result = self._extract_receipt(chunks[0], image, file_type)
+            else:
+                result = self._extract_chunks(chunks, extracted_text)
+            # The local classifier decides the category; the LLM's is the low-confidence fallback
+            return categorize_receipt(self._validate_response(result, extracted_text))
 
         except Exception as e:
             print(f"Processing error: {e}")
             return self._error_response(extracted_text)
 
+    def _extract_receipt(self, receipt_text: str, image: Optional[bytes] = None, file_type: str = None) -> Dict:
+        """One extraction request for (part of) a receipt"""
+        messages = [{
+            "role": "user",
+            "content": RECEIPT_PROMPT + f"\n\nExtracted Receipt Text:\n{receipt_text}"
+        }]
+        if image:
+            encoded_image = base64.b64encode(image).decode('utf-8')
+            messages.append({
+                "role": "user",
+                "content": f"data:image/{file_type};base64,{encoded_image}"
+            })
+        response = self._routed(
+            "extract",
+            messages=messages,
+            temperature=0.1,
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response.choices[0].message.content)
+
+    def _extract_chunks(self, chunks: List[str], original_text: str) -> Dict:
+        """Map: extract each chunk concurrently. Reduce: merge the parts into one receipt."""
+        def extract(chunk: str) -> Optional[Dict]:
+            try:
+                return self._validate_response(self._extract_receipt(chunk), original_text)
+            except Exception as e:
+                print(f"Chunk extraction failed: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_CHUNK_WORKERS)) as pool:
+            parts = list(pool.map(extract, chunks))
+        extracted = [(part, chunk) for part, chunk in zip(parts, chunks) if part is not None]
+        if not extracted:
+            raise LLMTransportError(f"All {len(chunks)} chunks failed")
+        return merge_extractions([p for p, _ in extracted], [c for _, c in extracted])
+
     def process_bulk_receipts(self, files: List[Tuple[bytes, str]] = None, texts: List[str] = None, csv_files: Optional[List[bytes]] = None, pdf_files: Optional[List[bytes]] = None) -> List[Dict]:
         """
         Process multiple receipts in bulk
@@ -189,35 +233,88 @@ Respond with this exact JSON structure:
         
         return results
 
-    def generate_text(self, prompt: str, temperature: float = 0.3, max_tokens: int = 1000) -> str:
-        """Generate text using Together.ai"""
+    @traced("llm.generate_text", measure=None)
+    def generate_text(self, prompt: str, temperature: float = 0.3, max_tokens: Optional[int] = None,
+                      task: str = "advise") -> str:
+        """Generate text using Together.ai (max_tokens defaults to the route's)"""
         try:
-            response = self.client.chat.completions.create(
-                model="mistralai/Mistral-7B-Instruct-v0.1",
+            response = self._routed(
+                task,
+                max_tokens=max_tokens,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=temperature,
-                max_tokens=max_tokens
+                temperature=temperature
             )
             return response.choices[0].message.content
         except Exception as e:
             print(f"Text generation error: {e}")
             return ""
 
-    def generate_json(self, prompt: str, temperature: float = 0.1) -> Dict:
+    @traced("llm.generate_json", measure=None)
+    def generate_json(self, prompt: str, temperature: float = 0.1, task: str = "risk-json") -> Dict:
         """Generate JSON response using Together.ai"""
         try:
-            response = self.client.chat.completions.create(
-                model="mistralai/Mistral-7B-Instruct-v0.1",
+            response = self._routed(
+                task,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
-                response_format={"type": "json_object"},
-                max_tokens=2000
+                response_format={"type": "json_object"}
             )
             return json.loads(response.choices[0].message.content)
         except Exception as e:
             print(f"JSON generation error: {e}")
             return {}
 
+    def _routed(self, task: str, max_tokens: Optional[int] = None, **request):
+        """
+        Send a request on a task's route: its model first, then each fallback
+        on failure, all within the route's latency budget.
+        """
+        route = self.routes.route(task)
+        deadline = time.perf_counter() + float(route["timeout"])
+        last_error = None
+        for model in self.routes.models(task):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            start = time.perf_counter()
+            try:
+                with span(f"llm.route.{task}", model=model):
+                    response = self._complete(model=model, max_tokens=max_tokens or route["max_tokens"],
+                                              timeout=remaining, **request)
+            except Exception as e:
+                self.routes.record(task, model, time.perf_counter() - start, error=True)
+                print(f"Route {task}: {model} failed: {e}")
+                last_error = e
+                continue
+            self.routes.record(task, model, time.perf_counter() - start)
+            return response
+        raise last_error or LLMTransportError(f"Route {task} ran out of its {route['timeout']}s budget")
+
+    def _complete(self, timeout: Optional[float] = None, **request):
+        """Send one completion request through the transport and account for its tokens"""
+        with span("llm.request", model=request.get("model"), transport=getattr(self.transport, "name", None)):
+            response = self.transport.create(timeout=timeout, **request)
+            self._record_usage(response)
+        return response
+
+    def _record_usage(self, response):
+        """Accumulate token counts reported by the API (safe across threads)"""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = (getattr(usage, "prompt_tokens", 0) or 0) if usage is not None else 0
+        completion_tokens = (getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+        with self._usage_lock:
+            self.usage["requests"] += 1
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+        annotate(tokens=prompt_tokens + completion_tokens)
+
+    def usage_snapshot(self) -> Dict[str, int]:
+        """Copy of the request and token counters"""
+        with self._usage_lock:
+            snapshot = dict(self.usage)
+        snapshot["total_tokens"] = snapshot["prompt_tokens"] + snapshot["completion_tokens"]
+        return snapshot
+
     def _validate_response(self, data: Dict, original_desc: str) -> Dict:
         """Ensure response meets expected format"""
         validated = {
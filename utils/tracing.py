@@ -0,0 +1,253 @@
+"""
+Lightweight in-process tracing.
+
+Spans time a block of work and carry row, byte and token counts:
+
+    with span("db.get_income") as s:
+        rows = cursor.fetchall()
+        s["rows"] = len(rows)
+
+    @traced("report.combined")
+    def build_report(...): ...
+
+Finished spans go to a bounded ring buffer for the debug panel; per-span
+totals and a latency histogram are kept for the Prometheus text endpoint
+(FINAI_METRICS_PORT). Counts of a nested span roll up into its parent,
+so a report span shows the rows and tokens of the queries and
+completions beneath it. Set FINAI_TRACING=0 to disable.
+"""
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from utils.settings import get_setting
+
+RING_SIZE = 2000
+COUNTERS = ("rows", "bytes", "tokens", "queries")
+# Upper bounds (seconds) of the Prometheus latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = str(get_setting("FINAI_TRACING", "1")).lower() not in ("0", "false", "off")
+_spans: deque = deque(maxlen=RING_SIZE)
+_totals: Dict[str, Dict] = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(value: bool):
+    global _enabled
+    _enabled = bool(value)
+
+
+def _stack() -> List[Dict]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def annotate(**counts):
+    """Add rows/bytes/tokens to the innermost open span on this thread"""
+    stack = _stack()
+    if stack:
+        for key, value in counts.items():
+            stack[-1][key] = stack[-1].get(key, 0) + (value or 0)
+
+
+def _record(name: str, start: float, duration: float, attrs: Dict, error: Optional[str]):
+    record = {"name": name, "start": start, "duration_ms": duration * 1000,
+              "thread": threading.current_thread().name, "error": error, **attrs}
+    with _lock:
+        _spans.append(record)
+        totals = _totals.get(name)
+        if totals is None:
+            totals = _totals[name] = {"count": 0, "errors": 0, "seconds": 0.0,
+                                      "buckets": [0] * len(BUCKETS), **{c: 0 for c in COUNTERS}}
+        totals["count"] += 1
+        totals["seconds"] += duration
+        totals["errors"] += error is not None
+        for counter in COUNTERS:
+            totals[counter] += attrs.get(counter, 0) or 0
+        for i, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                totals["buckets"][i] += 1
+                break
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block of work.
+
+    Yields a dict of attributes; set "rows", "bytes" or "tokens" (or any
+    other key) on it and they are stored with the span.
+    """
+    if not _enabled:
+        yield dict(attrs)
+        return
+    stack = _stack()
+    # Filled in by the block and by child spans; keyword attrs are merged on record
+    current = {}
+    stack.append(current)
+    start_wall, start = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield current
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        if stack:
+            # Roll counts up so a parent reports the work done beneath it
+            annotate(**{c: current[c] for c in COUNTERS if isinstance(current.get(c), (int, float))})
+        _record(name, start_wall, duration, {**attrs, **current}, error)
+
+
+def result_size(result) -> Dict[str, int]:
+    """Row and byte counts of a query result (DataFrame, list of rows or dict)"""
+    if isinstance(result, pd.DataFrame):
+        return {"rows": len(result), "bytes": int(result.memory_usage(index=False).sum())}
+    if isinstance(result, (list, tuple)):
+        return {"rows": len(result)}
+    return {}
+
+
+def traced(name: Optional[str] = None, measure: Optional[Callable] = result_size):
+    """
+    Decorator form of span(). `measure(result)` returns counts to attach
+    (rows and bytes of the returned frame or list by default).
+    """
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with span(span_name) as attrs:
+                result = fn(*args, **kwargs)
+                if measure is not None:
+                    for key, value in measure(result).items():
+                        attrs.setdefault(key, value)
+                return result
+        return wrapper
+    return decorator
+
+
+def recent_spans(limit: int = 200, prefix: str = "") -> List[Dict]:
+    """Newest finished spans first"""
+    with _lock:
+        spans = list(_spans)
+    return [s for s in reversed(spans) if s["name"].startswith(prefix)][:limit]
+
+
+def spans_since(start: float) -> List[Dict]:
+    """Spans that started at or after a time.time() timestamp"""
+    with _lock:
+        return [s for s in _spans if s["start"] >= start]
+
+
+def summary() -> pd.DataFrame:
+    """Per-span totals plus p50/p95 latency over the spans still in the buffer"""
+    with _lock:
+        totals = {name: dict(t) for name, t in _totals.items()}
+        spans = list(_spans)
+    columns = ["span", "count", "errors", "total_ms", "p50_ms", "p95_ms"] + list(COUNTERS)
+    if not totals:
+        return pd.DataFrame(columns=columns)
+    durations = pd.DataFrame(spans, columns=["name", "duration_ms"]).groupby("name")["duration_ms"]
+    p50, p95 = durations.quantile(0.5), durations.quantile(0.95)
+    rows = [{"span": name, "count": t["count"], "errors": t["errors"], "total_ms": t["seconds"] * 1000,
+             "p50_ms": p50.get(name), "p95_ms": p95.get(name), **{c: t[c] for c in COUNTERS}}
+            for name, t in totals.items()]
+    return pd.DataFrame(rows, columns=columns).sort_values("total_ms", ascending=False)
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _totals.clear()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text() -> str:
+    """All span totals in the Prometheus text exposition format"""
+    with _lock:
+        totals = {name: dict(t, buckets=list(t["buckets"])) for name, t in sorted(_totals.items())}
+    lines = ["# HELP finai_span_duration_seconds Duration of traced operations",
+             "# TYPE finai_span_duration_seconds histogram"]
+    for name, t in totals.items():
+        cumulative = 0
+        for bound, count in zip(BUCKETS, t["buckets"]):
+            cumulative += count
+            lines.append(f'finai_span_duration_seconds_bucket{{span="{_label(name)}",le="{bound}"}} {cumulative}')
+        lines.append(f'finai_span_duration_seconds_bucket{{span="{_label(name)}",le="+Inf"}} {t["count"]}')
+        lines.append(f'finai_span_duration_seconds_sum{{span="{_label(name)}"}} {t["seconds"]:.6f}')
+        lines.append(f'finai_span_duration_seconds_count{{span="{_label(name)}"}} {t["count"]}')
+    for metric, key, help_text in (("errors", "errors", "Traced operations that raised"),
+                                   ("rows", "rows", "Rows read or written"),
+                                   ("bytes", "bytes", "Bytes processed"),
+                                   ("tokens", "tokens", "LLM tokens used"),
+                                   ("queries", "queries", "Database round trips")):
+        lines.append(f"# HELP finai_span_{metric}_total {help_text}")
+        lines.append(f"# TYPE finai_span_{metric}_total counter")
+        for name, t in totals.items():
+            lines.append(f'finai_span_{metric}_total{{span="{_label(name)}"}} {t[key]}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_metrics_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics once per process on FINAI_METRICS_PORT (or `port`).
+
+    Returns None when no port is configured.
+    """
+    global _metrics_server
+    port = port or get_setting("FINAI_METRICS_PORT")
+    if not port:
+        return None
+    with _metrics_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except OSError as e:
+                print(f"Metrics server failed to start: {e}")
+                return None
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+        return _metrics_server